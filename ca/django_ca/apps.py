@@ -18,3 +18,6 @@ from django.utils.translation import gettext_lazy as _
 class DjangoCAConfig(AppConfig):
     name = 'django_ca'
     verbose_name = _('Certificate Authority')
+
+    def ready(self):
+        from . import receivers  # NOQA: imported to connect signal receivers
@@ -148,9 +148,21 @@ _CA_CRL_PROFILES = {
         'expires': 86400,
         'scope': 'ca',
         'encodings': ['PEM', 'DER', ],
-    }
+    },
 }
 
+# Delta CRLs are only generated if a lifetime is configured
+CA_DELTA_CRL_EXPIRES = getattr(settings, 'CA_DELTA_CRL_EXPIRES', None)
+if CA_DELTA_CRL_EXPIRES:
+    for _scope in ['user', 'ca']:
+        _CA_CRL_PROFILES['%s-delta' % _scope] = {
+            'algorithm': 'SHA512',
+            'expires': CA_DELTA_CRL_EXPIRES,
+            'scope': _scope,
+            'delta': True,
+            'encodings': ['PEM', 'DER', ],
+        }
+
 CA_DEFAULT_SUBJECT = getattr(settings, 'CA_DEFAULT_SUBJECT', {})
 
 # Add ability just override/add some profiles
@@ -172,8 +184,14 @@ CA_DEFAULT_ENCODING = getattr(settings, 'CA_DEFAULT_ENCODING', Encoding.PEM)
 CA_DEFAULT_EXPIRES = getattr(settings, 'CA_DEFAULT_EXPIRES', 730)
 CA_DEFAULT_PROFILE = getattr(settings, 'CA_DEFAULT_PROFILE', 'webserver')
 CA_NOTIFICATION_DAYS = getattr(settings, 'CA_NOTIFICATION_DAYS', [14, 7, 3, 1, ])
+CA_CACHE_CHUNK_SIZE = getattr(settings, 'CA_CACHE_CHUNK_SIZE', 512 * 1024)
 CA_CRL_PROFILES = getattr(settings, 'CA_CRL_PROFILES', _CA_CRL_PROFILES)
+CA_CRL_REGENERATION_DELAY = getattr(settings, 'CA_CRL_REGENERATION_DELAY', 60)
+CA_KEY_CACHE_TIMEOUT = getattr(settings, 'CA_KEY_CACHE_TIMEOUT', None)
+CA_KEY_POOL_SIZE = getattr(settings, 'CA_KEY_POOL_SIZE', 0)
+CA_LOCAL_CACHE_SIZE = getattr(settings, 'CA_LOCAL_CACHE_SIZE', 32 * 1024 * 1024)
 CA_PASSWORDS = getattr(settings, 'CA_PASSWORDS', {})
+CA_OCSP_INDEX_DIR = getattr(settings, 'CA_OCSP_INDEX_DIR', None)
 
 # Undocumented options, e.g. to share values between different parts of code
 CA_MIN_KEY_SIZE = getattr(settings, 'CA_MIN_KEY_SIZE', 2048)
@@ -0,0 +1,38 @@
+# This file is part of django-ca (https://github.com/mathiasertl/django-ca).
+#
+# django-ca is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# django-ca is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with django-ca.  If not,
+# see <http://www.gnu.org/licenses/>.
+
+from django.core.management.base import CommandError
+
+from ... import ca_settings
+from ...models import CertificateAuthority
+from ..base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Build the OCSP status index used by OCSP responders (see CA_OCSP_INDEX_DIR)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'serial', nargs='*',
+            help="Build the index for the given CAs. If omitted, build the index for all CAs.")
+
+    def handle(self, serial, **options):
+        if not ca_settings.CA_OCSP_INDEX_DIR:
+            raise CommandError('CA_OCSP_INDEX_DIR is not configured.')
+
+        qs = CertificateAuthority.objects.all()
+        if serial:
+            qs = qs.filter(serial__in=serial)
+
+        for ca in qs:
+            ca.build_ocsp_index()
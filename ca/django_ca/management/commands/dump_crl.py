@@ -32,6 +32,10 @@ class Command(BaseCommand):
         parser.add_argument(
             '-s', '--scope', choices=['ca', 'user', 'attribute'],
             help='Limit the scope for the CRL (default: %(default)s).')
+        parser.add_argument(
+            '--delta', action='store_true', default=False,
+            help="Generate a delta CRL containing only certificates revoked since the last published "
+                 "complete CRL.")
         self.add_algorithm(parser)
         self.add_format(parser)
         self.add_ca(parser, allow_disabled=True)
@@ -48,12 +52,16 @@ class Command(BaseCommand):
             'algorithm': options['algorithm'],
             'password': options['password'],
             'scope': options['scope'],
+            'delta': options['delta'],
         }
 
         # See if we can work with the private key
         ca = options['ca']
         self.test_private_key(ca, options['password'])
 
+        if options['delta'] and ca.get_base_crl(scope=options['scope']) is None:
+            raise CommandError('Cannot generate a delta CRL before a complete CRL for the same scope.')
+
         try:
             crl = ca.get_crl(**kwargs).public_bytes(options['format'])
         except Exception as e:  # pragma: no cover
@@ -0,0 +1,79 @@
+# This file is part of django-ca (https://github.com/mathiasertl/django-ca).
+#
+# django-ca is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# django-ca is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with django-ca.  If not,
+# see <http://www.gnu.org/licenses/>.
+
+
+import json
+import os
+import tempfile
+from datetime import datetime
+
+from cryptography.hazmat.primitives.serialization import Encoding
+
+from django.core.management.base import CommandError
+
+from ...models import CertificateAuthority
+from ...responder import MANIFEST
+from ...responder import SNAPSHOT_VERSION
+from ...responder import get_ca_paths
+from ...responder import publish_snapshot
+from ...utils import read_file
+from ..base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = """Export a snapshot of certificate statuses, OCSP responder keys and CA certificates that can be
+served by the standalone OCSP responder (python -m django_ca.responder)."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Directory to export the snapshot to.")
+        parser.add_argument(
+            'serial', nargs='*',
+            help="Export the given CAs. If omitted, export all CAs that have an OCSP responder key.")
+
+    def handle(self, path, serial, **options):
+        qs = CertificateAuthority.objects.all()
+        if serial:
+            qs = qs.filter(serial__in=[s.replace(':', '') for s in serial])
+
+        # NOTE: The snapshot is only used by responders once it is published, so it can be written in place.
+        os.makedirs(path, exist_ok=True)
+        prefix = 'snapshot-%s-' % datetime.utcnow().strftime('%Y%m%d%H%M%S')
+        snapshot = tempfile.mkdtemp(prefix=prefix, dir=path)
+        os.chmod(snapshot, 0o755)
+
+        exported = []
+        for ca in qs:
+            try:
+                responder_key = read_file('ocsp/%s.key' % ca.serial.replace(':', ''))
+                responder_cert = read_file('ocsp/%s.pem' % ca.serial.replace(':', ''))
+            except Exception:
+                self.stderr.write('%s: OCSP responder key not found, skipping.' % ca.serial)
+                continue
+
+            ca_path, key_path, cert_path = get_ca_paths(snapshot, ca.serial)
+            for file_path, data in [(ca_path, ca.x509.public_bytes(Encoding.PEM)),
+                                    (key_path, responder_key), (cert_path, responder_cert)]:
+                with open(file_path, 'wb') as stream:
+                    stream.write(data)
+            os.chmod(key_path, 0o600)
+            ca.build_ocsp_index(directory=snapshot)
+            exported.append(ca.serial)
+
+        if not exported:
+            os.rmdir(snapshot)
+            raise CommandError('No CA with an OCSP responder key found.')
+
+        with open(os.path.join(snapshot, MANIFEST), 'w') as stream:
+            json.dump({'version': SNAPSHOT_VERSION, 'cas': exported}, stream)
+
+        publish_snapshot(path, snapshot)
@@ -11,6 +11,14 @@
 # You should have received a copy of the GNU General Public License along with django-ca.  If not,
 # see <http://www.gnu.org/licenses/>.
 
+import itertools
+import json
+import os
+import sys
+import tarfile
+
+from cryptography.hazmat.primitives.serialization import Encoding
+
 from django.core.management.base import CommandError
 from django.utils import timezone
 
@@ -19,6 +27,7 @@ from ...extensions import SubjectAlternativeName
 from ...management.base import BaseSignCommand
 from ...models import Certificate
 from ...models import Watcher
+from ...profiles import profiles
 from ...subject import Subject
 
 
@@ -62,6 +71,17 @@ https://django-ca.readthedocs.io/en/latest/extensions.html for more information.
         self.add_format(parser, opts=['--csr-format'],
                         help_text='Format of the CSR ("ASN1" is an alias for "DER", default: %(default)s)')
 
+        group = parser.add_argument_group(
+            'Batch mode',
+            """Sign many CSRs at once. --csr names a directory of CSRs, a tar file or a file with one JSON
+            object per line (with the key "csr" and optionally "name", "subject" and "alt"). A tar file or
+            JSON is read from stdin if --csr is omitted or "-". The subject of every certificate is based on
+            the subject of its CSR. Certificates are written as JSON, one line per certificate.""")
+        group.add_argument('--batch', choices=['dir', 'tar', 'json'],
+                           help='Read CSRs from a directory, a tar file or JSON.')
+        group.add_argument('--workers', type=int, metavar='N',
+                           help='Number of CSRs signed in parallel (default: number of CPUs + 4).')
+
         self.add_profile(parser, """Sign certificate based on the given profile. A profile only sets the the
                          default values, options like --key-usage still override the profile.""")
 
@@ -92,6 +112,9 @@ https://django-ca.readthedocs.io/en/latest/extensions.html for more information.
             if options[ext.key]:
                 kwargs['extensions'].append(options[ext.key])
 
+        if options['batch']:
+            return self.handle_batch(ca, watchers, kwargs, options)
+
         if 'CN' not in kwargs['subject'] and not options[SubjectAlternativeName.key]:
             raise CommandError("Must give at least a CN in --subject or one or more --alt arguments.")
 
@@ -118,3 +141,141 @@ https://django-ca.readthedocs.io/en/latest/extensions.html for more information.
                 f.write(cert.pub)
         else:
             self.stdout.write(cert.pub)
+
+    def read_dir(self, path):
+        """Yield name and data of all CSRs in a directory."""
+        for name in sorted(os.listdir(path)):
+            filename = os.path.join(path, name)
+            if name.startswith('.') or not os.path.isfile(filename):
+                continue
+            try:
+                with open(filename, 'rb') as stream:
+                    data = {'csr': stream.read()}
+            except OSError as e:  # e.g. permission denied, reported like any other invalid CSR
+                data = {'error': e}
+            yield name, data
+
+    def read_tar(self, path):
+        """Yield name and data of all CSRs in a (possibly compressed) tar file."""
+        if path is None or path == '-':
+            tar = tarfile.open(fileobj=getattr(sys.stdin, 'buffer', sys.stdin), mode='r|*')
+        else:
+            tar = tarfile.open(path, mode='r|*')
+
+        with tar:
+            for member in tar:
+                if member.isfile():
+                    yield member.name, {'csr': tar.extractfile(member).read()}
+
+    def read_json(self, path):
+        """Yield name and data of all CSRs in a file with one JSON object per line."""
+        if path is None or path == '-':
+            lines = sys.stdin
+        else:
+            lines = open(path)
+
+        try:
+            for lineno, line in enumerate(lines, 1):
+                if not line.strip():
+                    continue
+
+                name = 'line %s' % lineno
+                try:
+                    data = json.loads(line)
+                    name = data.get('name', name)
+                except Exception as e:
+                    data = {'error': e}
+                yield name, data
+        finally:
+            if lines is not sys.stdin:
+                lines.close()
+
+    def handle_batch(self, ca, watchers, kwargs, options):
+        profile = profiles[options['profile']]
+        csr_format = kwargs.pop('csr_format')
+        base_subject = kwargs.pop('subject')
+        base_extensions = {e.key: e for e in kwargs.pop('extensions')}
+
+        if options['batch'] == 'dir':
+            if options['csr'] is None:
+                raise CommandError('--csr is required when reading CSRs from a directory.')
+            items = self.read_dir(options['csr'])
+        elif options['batch'] == 'tar':
+            items = self.read_tar(options['csr'])
+        else:
+            items = self.read_json(options['csr'])
+            csr_format = Encoding.PEM  # JSON can only contain PEM encoded CSRs
+
+        workers = options['workers'] or min(32, (os.cpu_count() or 1) + 4)
+
+        def prepare(data):
+            if 'error' in data:
+                raise data['error']
+            csr = Certificate.objects.parse_csr(data['csr'], csr_format=csr_format)
+
+            subject = Subject(csr.subject)
+            subject.update(base_subject)
+            subject.update(Subject(data.get('subject')))
+
+            extensions = dict(base_extensions)
+            if data.get('alt'):
+                extensions[SubjectAlternativeName.key] = SubjectAlternativeName({'value': data['alt']})
+            return csr, subject, extensions
+
+        if options['out']:
+            stream = open(options['out'], 'w')
+        else:
+            stream = self.stdout
+
+        total = failed = 0
+        try:
+            # CSRs are signed in chunks, so that certificates are written before all CSRs are read
+            while True:
+                try:
+                    chunk = list(itertools.islice(items, workers * 10))
+                except (OSError, tarfile.TarError) as e:
+                    raise CommandError(e)
+                if not chunk:
+                    break
+
+                results = []
+                for _name, data in chunk:
+                    try:
+                        results.append(prepare(data))
+                    except Exception as e:
+                        results.append(e)
+
+                # Certificates are signed in a pool of threads, but signals are sent from this thread
+                valid = [i for i, r in enumerate(results) if not isinstance(r, Exception)]
+                if valid:
+                    certs = Certificate.objects.create_certs(
+                        ca, [results[i] for i in valid], profile=profile, workers=workers,
+                        return_exceptions=True, **kwargs)
+                    for i, cert in zip(valid, certs):
+                        results[i] = cert
+
+                for (name, _data), cert in zip(chunk, results):
+                    total += 1
+                    if not isinstance(cert, Exception):
+                        try:
+                            cert.watchers.add(*watchers)
+                        except Exception as e:
+                            cert = e
+
+                    if isinstance(cert, Exception):
+                        failed += 1
+                        self.stderr.write('%s: %s' % (name, cert))
+                        continue
+
+                    line = json.dumps({'name': name, 'serial': cert.serial, 'pub': cert.pub})
+                    if options['out']:
+                        stream.write('%s\n' % line)
+                    else:
+                        stream.write(line)
+                    stream.flush()
+        finally:
+            if options['out']:
+                stream.close()
+
+        if failed:
+            raise CommandError('%s of %s CSRs could not be signed.' % (failed, total))
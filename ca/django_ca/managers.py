@@ -12,6 +12,7 @@
 # see <http://www.gnu.org/licenses/>.
 
 import pathlib
+from concurrent.futures import ThreadPoolExecutor
 
 from cryptography import x509
 from cryptography.hazmat.backends import default_backend
@@ -22,6 +23,7 @@ from cryptography.x509.oid import AuthorityInformationAccessOID
 
 from django.core.files.base import ContentFile
 from django.db import models
+from django.db import transaction
 from django.urls import reverse
 from django.utils.encoding import force_bytes
 from django.utils.encoding import force_text
@@ -34,9 +36,11 @@ from .profiles import Profile
 from .profiles import profiles
 from .signals import post_create_ca
 from .signals import post_issue_cert
+from .signals import post_issue_certs
 from .signals import pre_create_ca
 from .subject import Subject
 from .utils import ca_storage
+from .utils import format_crl_urls
 from .utils import generate_private_key
 from .utils import get_cert_builder
 from .utils import int_to_hex
@@ -46,8 +50,10 @@ from .utils import validate_key_parameters
 
 
 class CertificateManagerMixin(object):
-    def get_common_extensions(self, issuer_url=None, crl_url=None, ocsp_url=None):
+    def get_common_extensions(self, issuer_url=None, crl_url=None, ocsp_url=None, crl_partition=None):
         extensions = []
+        if crl_url:
+            crl_url = format_crl_urls(crl_url, partition=crl_partition)
         if crl_url:
             urls = [x509.UniformResourceIdentifier(force_text(c)) for c in crl_url]
             dps = [x509.DistributionPoint(full_name=[c], relative_name=None, crl_issuer=None, reasons=None)
@@ -245,7 +251,12 @@ class CertificateAuthorityManager(CertificateManagerMixin, models.Manager):
             aki = parent.get_authority_key_identifier()
         builder = builder.add_extension(aki, critical=False)
 
-        for critical, ext in self.get_common_extensions(ca_issuer_url, ca_crl_url, ca_ocsp_url):
+        crl_partition = None
+        if parent is not None:
+            crl_partition = parent.get_crl_partition(serial, scope='ca')
+
+        for critical, ext in self.get_common_extensions(ca_issuer_url, ca_crl_url, ca_ocsp_url,
+                                                        crl_partition=crl_partition):
             builder = builder.add_extension(ext, critical=critical)
 
         if name_constraints:
@@ -336,3 +347,133 @@ class CertificateManager(CertificateManagerMixin, models.Manager):
         post_issue_cert.send(sender=self.model, cert=c)
 
         return c
+
+    def create_certs(self, ca, items, csr_format=Encoding.PEM, profile=None, autogenerated=None, workers=None,
+                     batch_size=500, return_exceptions=False, **kwargs):
+        """Create and sign many certificates with the same profile at once.
+
+        The result is the same as calling :py:meth:`create_cert` for every item, but the profile is resolved
+        and the private key of the CA is loaded only once. Certificates are signed in a pool of threads and
+        saved with a single :py:meth:`~django:django.db.models.query.QuerySet.bulk_create`. If signing any
+        certificate fails, no certificate is saved, unless `return_exceptions` is ``True``.
+
+        The :py:func:`~django_ca.signals.pre_issue_cert` signal is sent for every certificate in the calling
+        thread before any certificate is signed. The :py:func:`~django_ca.signals.post_issue_cert` signal is
+        sent for every certificate after all certificates are saved, followed by a single
+        :py:func:`~django_ca.signals.post_issue_certs` signal.
+
+        Parameters
+        ----------
+
+        ca : :py:class:`~django_ca.models.CertificateAuthority`
+            The certificate authority to sign the certificates with.
+        items : list of tuple
+            A list of ``(csr, subject, extensions)`` tuples. The values are passed to
+            :py:func:`Profiles.create_cert() <django_ca.profiles.Profile.create_cert>` for every certificate.
+        csr_format : :py:class:`~cg:cryptography.hazmat.primitives.serialization.Encoding`, optional
+            The format of CSRs that are not yet a
+            :py:class:`~cg:cryptography.x509.CertificateSigningRequest`. The default is ``PEM``.
+        profile : str or :py:class:`~django_ca.profiles.Profile`, optional
+            The name of a profile or a manually created :py:class:`~django_ca.profiles.Profile` instance. If
+            not given, the profile configured by :ref:`CA_DEFAULT_PROFILE <settings-ca-default-profile>` is
+            used.
+        autogenerated : bool, optional
+            Override the profiles ``autogenerated`` flag.
+        workers : int, optional
+            Number of threads used for signing certificates. The default is chosen by
+            :py:class:`~concurrent.futures.ThreadPoolExecutor`.
+        batch_size : int, optional
+            Number of certificates saved per database query.
+        return_exceptions : bool, optional
+            If ``True``, a certificate that cannot be created does not prevent other certificates from being
+            saved. The exception is returned in place of the certificate instead. If saving the certificates
+            fails, they are saved one by one to find out which certificates could not be saved.
+        **kwargs
+            All other keyword arguments are passed to :py:func:`Profiles.create_cert()
+            <django_ca.profiles.Profile.create_cert>` for every certificate.
+
+        Returns
+        -------
+
+        list of :py:class:`~django_ca.models.Certificate`
+            The new certificates, in the same order as `items`. If `return_exceptions` is ``True``, the list
+            contains exceptions for certificates that could not be created.
+        """
+
+        if not isinstance(profile, Profile):
+            profile = profiles[profile]
+        if autogenerated is None:
+            autogenerated = profile.autogenerated
+
+        # Load the private key and parse the certificate of the CA before any thread uses it
+        private_key = ca.key(kwargs.get('password'))
+        ca.x509  # NOQA: parses the certificate
+
+        # Certificates are prepared in this thread, so receivers of the pre_issue_cert signal are never called
+        # from the threads that sign certificates.
+        prepared = []
+        for csr, subject, extensions in items:
+            try:
+                csr = self.parse_csr(csr, csr_format=csr_format)
+                builder, algorithm = profile.prepare_cert(ca, csr, subject=subject, extensions=extensions,
+                                                          **kwargs)
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                prepared.append(e)
+            else:
+                prepared.append((csr, builder, algorithm))
+
+        def sign(item):
+            if isinstance(item, Exception):
+                return item
+
+            csr, builder, algorithm = item
+            c = self.model(ca=ca, csr=csr.public_bytes(Encoding.PEM).decode('utf-8'), profile=profile.name,
+                           autogenerated=autogenerated)
+            try:
+                c.x509 = builder.sign(private_key=private_key, algorithm=algorithm, backend=default_backend())
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                return e
+            return c
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(sign, prepared))
+        certs = [c for c in results if not isinstance(c, Exception)]
+
+        try:
+            # A savepoint, so that the current transaction can still be used if saving fails
+            with transaction.atomic():
+                self.bulk_create(certs, batch_size=batch_size)
+        except Exception:
+            if not return_exceptions:
+                raise
+
+            for i, c in enumerate(results):
+                if isinstance(c, Exception):
+                    continue
+
+                c.pk = None  # might have been set by a batch that was rolled back
+                try:
+                    with transaction.atomic():
+                        c.save()
+                except Exception as e:
+                    results[i] = e
+            certs = [c for c in results if not isinstance(c, Exception)]
+        else:
+            # Not all database backends set the primary key in bulk_create()
+            if certs and certs[0].pk is None:
+                pks = {}
+                for i in range(0, len(certs), batch_size):
+                    serials = [c.serial for c in certs[i:i + batch_size]]
+                    pks.update(self.filter(serial__in=serials).values_list('serial', 'pk'))
+                for c in certs:
+                    c.pk = pks[c.serial]
+
+        for c in certs:
+            post_issue_cert.send(sender=self.model, cert=c)
+        post_issue_certs.send(sender=self.model, certs=certs)
+
+        return results
@@ -0,0 +1,58 @@
+# Generated by Django 3.0.6 on 2026-10-16 21:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+import json
+
+from django.utils.dateparse import parse_datetime
+
+
+def crl_number_to_model(apps, schema_editor):
+    CertificateAuthority = apps.get_model('django_ca', 'CertificateAuthority')
+    CRLNumber = apps.get_model('django_ca', 'CRLNumber')
+
+    for ca in CertificateAuthority.objects.all():
+        data = json.loads(ca.crl_number or '{}')
+        base = data.get('base', {})
+        for scope, number in data.get('scope', {}).items():
+            kwargs = {}
+            if scope in base:
+                kwargs['base_number'] = base[scope]['number']
+                kwargs['base_last_update'] = parse_datetime(base[scope]['last_update'])
+            CRLNumber.objects.create(ca=ca, scope=scope, number=int(number), **kwargs)
+
+
+def crl_number_to_json(apps, schema_editor):
+    CertificateAuthority = apps.get_model('django_ca', 'CertificateAuthority')
+
+    for ca in CertificateAuthority.objects.all():
+        data = {'scope': {}}
+        for crl_number in ca.crl_numbers.all():
+            data['scope'][crl_number.scope] = crl_number.number
+        ca.crl_number = json.dumps(data)
+        ca.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_ca', '0019_certificate_autogenerated'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CRLNumber',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(help_text='Scope or counter of the CRL.', max_length=32)),
+                ('number', models.PositiveIntegerField(default=0, help_text='The CRL number of the next CRL.')),
+                ('base_number', models.PositiveIntegerField(blank=True, help_text='CRL number of the last complete CRL.', null=True)),
+                ('base_last_update', models.DateTimeField(blank=True, help_text='When the last complete CRL was generated.', null=True)),
+                ('ca', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='crl_numbers', to='django_ca.CertificateAuthority', verbose_name='Certificate Authority')),
+            ],
+            options={
+                'unique_together': {('ca', 'scope')},
+            },
+        ),
+        migrations.RunPython(crl_number_to_model, crl_number_to_json),
+    ]
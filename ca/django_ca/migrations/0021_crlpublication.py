@@ -0,0 +1,34 @@
+# Generated by Django 3.0.6 on 2026-10-16 21:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_ca', '0020_crlnumber'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CRLPublication',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(help_text='Scope or counter of the CRL.', max_length=32)),
+                ('delta', models.BooleanField(default=False, help_text='If this is a delta CRL.')),
+                ('number', models.PositiveIntegerField(help_text='The CRL number.')),
+                ('algorithm', models.CharField(help_text='The hash algorithm used to sign the CRL.', max_length=16)),
+                ('last_update', models.DateTimeField(help_text='When the CRL was generated.')),
+                ('next_update', models.DateTimeField(help_text='When the CRL expires.')),
+                ('path', models.CharField(help_text='Path to the CRL (in DER format).', max_length=256)),
+                ('full_name', models.TextField(blank=True, default='', help_text='Full name in the Issuing Distribution Point extension.')),
+                ('relative_name', models.CharField(blank=True, default='', help_text='Relative name in the Issuing Distribution Point extension.', max_length=256)),
+                ('freshest_crl', models.TextField(blank=True, default='', help_text='Where delta CRLs can be retrieved.')),
+                ('ca', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='crl_publications', to='django_ca.CertificateAuthority', verbose_name='Certificate Authority')),
+            ],
+            options={
+                'unique_together': {('ca', 'scope', 'number')},
+            },
+        ),
+    ]
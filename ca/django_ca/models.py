@@ -17,6 +17,7 @@ import hashlib
 import itertools
 import json
 import logging
+import os
 import random
 import re
 from datetime import datetime
@@ -40,6 +41,7 @@ from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.core.files.base import ContentFile
 from django.db import models
+from django.db import transaction
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.encoding import force_bytes
@@ -73,22 +75,36 @@ from .extensions import UnrecognizedExtension
 from .extensions import get_extension_name
 from .managers import CertificateAuthorityManager
 from .managers import CertificateManager
+from .ocsp import get_cert_id
+from .ocsp import get_response
+from .ocsp import responder_cache
 from .querysets import CertificateAuthorityQuerySet
 from .querysets import CertificateQuerySet
 from .signals import post_revoke_cert
 from .signals import pre_revoke_cert
+from .status_index import StatusIndex
+from .status_index import get_index_path
 from .subject import Subject
 from .utils import add_colons
 from .utils import ca_storage
+from .utils import format_crl_urls
+from .utils import format_general_name
 from .utils import format_name
+from .utils import format_relative_name
 from .utils import generate_private_key
 from .utils import get_crl_cache_key
+from .utils import get_crl_counter
+from .utils import get_ocsp_response_cache_key
+from .utils import get_revoked_certificate
+from .utils import get_serial_partition
 from .utils import int_to_hex
+from .utils import key_cache
 from .utils import multiline_url_validator
 from .utils import parse_encoding
 from .utils import parse_general_name
 from .utils import parse_hash_algorithm
 from .utils import read_file
+from .utils import set_chunked_cache
 from .utils import validate_key_parameters
 
 log = logging.getLogger(__name__)
@@ -259,21 +275,8 @@ class X509CertMixin(models.Model):
         if self.revoked is False:
             raise ValueError('Certificate is not revoked.')
 
-        revoked_cert = x509.RevokedCertificateBuilder().serial_number(
-            self.x509.serial_number).revocation_date(self.revoked_date)
-
-        reason = self.get_revocation_reason()
-        if reason != x509.ReasonFlags.unspecified:
-            # RFC 5270, 5.3.1: "reason code CRL entry extension SHOULD be absent instead of using the
-            # unspecified (0) reasonCode value"
-            revoked_cert = revoked_cert.add_extension(x509.CRLReason(reason), critical=False)
-
-        compromised = self.get_compromised_time()
-        if compromised:
-            # RFC 5280, 5.3.2 says that this extension MUST be non-critical
-            revoked_cert = revoked_cert.add_extension(x509.InvalidityDate(compromised), critical=False)
-
-        return revoked_cert.build(default_backend())
+        return get_revoked_certificate(self.x509.serial_number, self.revoked_date, self.revoked_reason,
+                                       self.compromised)
 
     @property
     def hpkp_pin(self):
@@ -311,6 +314,12 @@ class X509CertMixin(models.Model):
         self.compromised = compromised
         self.save()
 
+        # A pre-generated OCSP response would still report the certificate as valid. It is deleted only once
+        # the revocation is committed, as cache_ocsp_responses() might otherwise cache a new one before that.
+        cache_key = self.ocsp_response_cache_key
+        if cache_key is not None:
+            transaction.on_commit(lambda: cache.delete(cache_key))
+
         post_revoke_cert.send(sender=self.__class__, cert=self)
 
     @property
@@ -511,6 +520,8 @@ class CertificateAuthority(X509CertMixin):
     crl_url = models.TextField(blank=True, default='', validators=[multiline_url_validator],
                                verbose_name=_('CRL URLs'),
                                help_text=_("URLs, one per line, where you can retrieve the CRL."))
+    # NOTE: no longer used, CRL numbers are now stored in CRLNumber. This field will be removed in django-ca
+    #       1.18.0.
     crl_number = models.TextField(
         default='{"scope": {}}', blank=True, verbose_name=_('CRL Number'), validators=[json_validator],
         help_text=_("Data structure to store the CRL number (see RFC 5280, 5.2.3) depending on the scope.")
@@ -525,10 +536,18 @@ class CertificateAuthority(X509CertMixin):
     _key = None
 
     def key(self, password):
+        """Get the private key of this CA.
+
+        The key is loaded only once per instance. If :ref:`CA_KEY_CACHE_TIMEOUT
+        <settings-ca-key-cache-timeout>` is set, it is also cached in the memory of the current process (see
+        :py:class:`~django_ca.utils.KeyCache`).
+        """
         if self._key is None:
-            key_data = read_file(self.private_key_path)
+            def load():
+                key_data = read_file(self.private_key_path)
+                return load_pem_private_key(key_data, password, default_backend())
 
-            self._key = load_pem_private_key(key_data, password, default_backend())
+            self._key = key_cache.get(self.serial, self.private_key_path, password, load)
         return self._key
 
     @property
@@ -538,7 +557,30 @@ class CertificateAuthority(X509CertMixin):
         else:
             return ca_storage.exists(self.private_key_path)
 
-    def cache_crls(self, password=None, algorithm=None):
+    def cache_crls(self, password=None, algorithm=None, scopes=None, force=False, partitions=None):
+        """Generate the CRLs configured in :ref:`CA_CRL_PROFILES <settings-ca-crl-profiles>` and store them
+        in the cache.
+
+        All encodings of a CRL are stored in the cache at once, so they always contain the same CRL. Large
+        CRLs are split into chunks, see :py:func:`~django_ca.utils.set_chunked_cache`.
+
+        Parameters
+        ----------
+
+        password : bytes, optional
+            Password used to load the private key of the certificate authority. The default is to use
+            :ref:`CA_PASSWORDS <settings-ca-passwords>`.
+        algorithm : :py:class:`~cg:cryptography.hazmat.primitives.hashes.Hash`, optional
+            Override the hash algorithm configured in the profiles.
+        scopes : list of str, optional
+            Only generate CRLs for the given scopes. CRLs for all scopes (scope ``None``) are always
+            generated.
+        force : bool, optional
+            Generate CRLs even if they are already cached, e.g. because a certificate was revoked.
+        partitions : list of int, optional
+            Only generate the given partitions of partitioned CRLs, e.g. the partition that contains a
+            certificate that was revoked. CRLs that are not partitioned are always generated.
+        """
         password = password or self.get_password()
         ca_key = self.key(password)
         if isinstance(ca_key, dsa.DSAPrivateKey) and algorithm is None:
@@ -555,25 +597,174 @@ class CertificateAuthority(X509CertMixin):
             scope = overrides.get('scope', config.get('scope'))
             full_name = overrides.get('full_name', config.get('full_name'))
             relative_name = overrides.get('relative_name', config.get('relative_name'))
+            freshest_crl = overrides.get('freshest_crl', config.get('freshest_crl'))
+            delta = overrides.get('delta', config.get('delta', False))
             encodings = overrides.get('encodings', config.get('encodings', ['DER', ]))
-            crl = None  # only compute crl when it is actually needed
 
-            for encoding in encodings:
-                encoding = parse_encoding(encoding)
-                cache_key = get_crl_cache_key(self.serial, algorithm, encoding, scope=scope)
+            if scopes is not None and scope is not None and scope not in scopes:
+                continue
+
+            # delta CRLs are partitioned like the complete CRLs they refer to
+            crl_partitions = [None]
+            if self.get_crl_partitions(scope=scope) > 1:
+                crl_partitions = range(self.get_crl_partitions(scope=scope))
+                if partitions is not None:
+                    crl_partitions = [p for p in crl_partitions if p in partitions]
+
+            for partition in crl_partitions:
+                if delta and self.get_base_crl(scope=scope, partition=partition) is None:
+                    continue  # no complete CRL that a delta CRL could refer to
 
+                cache_keys = {}
+                for encoding in encodings:
+                    encoding = parse_encoding(encoding)
+                    cache_keys[encoding] = get_crl_cache_key(self.serial, algorithm, encoding, scope=scope,
+                                                             delta=delta, partition=partition)
+
+                # only compute crl when it is actually needed
+                if force is False and len(cache.get_many(cache_keys.values())) == len(cache_keys):
+                    continue
+
+                cache_expires = expires
                 if expires >= 600:  # pragma: no branch
                     # for longer expiries we substract a random value so that regular CRL regeneration is
                     # distributed a bit
                     cache_expires = expires - random.randint(1, 5) * 60
 
-                if cache.get(cache_key) is None:
-                    if crl is None:
-                        crl = self.get_crl(expires=expires, algorithm=algorithm, password=password,
-                                           scope=scope, full_name=full_name, relative_name=relative_name)
+                # delta CRLs are short-lived, so only complete CRLs are stored
+                crl = self.get_crl(expires=expires, algorithm=algorithm, password=password, scope=scope,
+                                   full_name=full_name, relative_name=relative_name,
+                                   freshest_crl=freshest_crl, delta=delta, partition=partition,
+                                   publish=not delta)
+                encoded_crls = {cache_key: crl.public_bytes(enc) for enc, cache_key in cache_keys.items()}
+                set_chunked_cache(encoded_crls, cache_expires)
+
+    def get_crl_partitions(self, scope='user'):
+        """Get the number of CRL partitions for the given scope.
+
+        The number is configured with the ``partitions`` option of complete CRLs in :ref:`CA_CRL_PROFILES
+        <settings-ca-crl-profiles>`. ``1`` means that CRLs for this scope are not partitioned.
+        """
+        for config in ca_settings.CA_CRL_PROFILES.values():
+            overrides = config.get('OVERRIDES', {}).get(self.serial, {})
+            if overrides.get('skip') or overrides.get('delta', config.get('delta', False)):
+                continue
+            if overrides.get('scope', config.get('scope')) != scope:
+                continue
 
-                    encoded_crl = crl.public_bytes(encoding)
-                    cache.set(cache_key, encoded_crl, cache_expires)
+            partitions = overrides.get('partitions', config.get('partitions', 1))
+            if partitions > 1:
+                return partitions
+        return 1
+
+    def get_crl_partition(self, serial, scope='user'):
+        """Get the CRL partition for the certificate with the given serial.
+
+        Returns ``None`` if CRLs for the given scope are not partitioned, see :py:meth:`get_crl_partitions`.
+        """
+        partitions = self.get_crl_partitions(scope=scope)
+        if partitions == 1:
+            return None
+        return get_serial_partition(serial, partitions)
+
+    def get_crl_urls(self, partition=None):
+        """Get the CRL URLs of this CA for the given partition.
+
+        The ``{partition}`` placeholder in URLs is replaced with the partition. If `partition` is ``None``,
+        URLs with a placeholder are skipped.
+        """
+        return format_crl_urls([url.strip() for url in self.crl_url.split()], partition=partition)
+
+    def cache_ocsp_responses(self, expires=86400):
+        """Pre-generate OCSP responses for all certificates issued by this CA.
+
+        Responses are signed with the key and certificate created by :py:meth:`generate_ocsp_key` and stored
+        in the cache, where the generic OCSP view uses them to answer requests that don't include a nonce.
+        Responses are only signed again if they are missing or if less then half of their lifetime is left,
+        so this method can be called frequently.
+
+        Parameters
+        ----------
+
+        expires : int, optional
+            Number of seconds until the responses expire. The default is one day.
+        """
+        serial = self.serial.replace(':', '')
+        responder_key = load_pem_private_key(read_file('ocsp/%s.key' % serial), None, default_backend())
+        responder_cert = x509.load_pem_x509_certificate(read_file('ocsp/%s.pem' % serial), default_backend())
+        refresh = datetime.utcnow() + timedelta(seconds=expires / 2)
+
+        for scope, qs in [('user', self.certificate_set), ('ca', self.children)]:
+            certs = qs.filter(expires__gt=timezone.now()).iterator()
+
+            while True:
+                chunk = {get_ocsp_response_cache_key(self.serial, c.serial, scope=scope): c
+                         for c in itertools.islice(certs, 500)}
+                if not chunk:
+                    break
+
+                cached = cache.get_many(chunk.keys())
+                responses = {}
+                for cache_key, cert in chunk.items():
+                    responder_serial, next_update, _der = cached.get(cache_key, (None, None, None))
+                    if responder_serial == responder_cert.serial_number and next_update > refresh:
+                        continue
+
+                    cert_id = get_cert_id(self, cert.x509.serial_number)
+                    response = get_response([(cert_id, cert)], responder_key, responder_cert, expires=expires)
+                    next_update = response.response_data['responses'][0]['next_update'].native
+                    responses[cache_key] = (responder_cert.serial_number, next_update.replace(tzinfo=None),
+                                            response.dump())
+                cache.set_many(responses, expires)
+
+                # A certificate might have been revoked after it was loaded. Revocations committed from now on
+                # delete the response themselves, but responses for earlier revocations are deleted here.
+                good = [c.serial for k, c in chunk.items() if k in responses and not c.revoked]
+                if good:
+                    revoked = qs.filter(serial__in=good, revoked=True).values_list('serial', flat=True)
+                    cache.delete_many([get_ocsp_response_cache_key(self.serial, s, scope=scope)
+                                       for s in revoked])
+
+    def build_ocsp_index(self, directory=None):
+        """Build the OCSP status index for this CA in `directory`.
+
+        The index contains the status of all certificates and child CAs issued by this CA. It is updated
+        automatically when certificates are issued or revoked, but should be rebuilt regularly so that updates
+        are merged into the (faster) base file.
+
+        Parameters
+        ----------
+
+        directory : str, optional
+            The directory where to store the index. The default is the value of the :ref:`CA_OCSP_INDEX_DIR
+            <settings-ca-ocsp-index-dir>` setting.
+        """
+        if directory is None:
+            directory = ca_settings.CA_OCSP_INDEX_DIR
+        if not directory:
+            raise ValueError('CA_OCSP_INDEX_DIR is not configured.')
+        os.makedirs(directory, exist_ok=True)
+
+        for scope, qs in [('user', self.certificate_set), ('ca', self.children)]:
+            index = StatusIndex(get_index_path(directory, self.serial, scope=scope))
+            certs = qs.values_list('serial', 'revoked', 'revoked_date', 'revoked_reason')
+
+            # NOTE: The query is lazy, so it only runs once build() holds the write lock of the index.
+            index.build((int(serial.replace(':', ''), 16), revoked_date if revoked else None, reason)
+                        for serial, revoked, revoked_date, reason in certs.iterator())
+
+    def get_ocsp_key_parameters(self, password=None, key_size=None, key_type=None, ecc_curve=None):
+        """Get the parameters for the private key used by :py:meth:`generate_ocsp_key`.
+
+        If `key_type` is not given, OCSP keys for CAs with a DSA key also use DSA. Parameters are validated
+        with :py:func:`~django_ca.utils.validate_key_parameters`, so unset values use the defaults.
+        """
+        if key_type is None:
+            ca_key = self.key(password or self.get_password())
+            if isinstance(ca_key, dsa.DSAPrivateKey):
+                key_type = 'DSA'
+
+        return validate_key_parameters(key_size, key_type, ecc_curve)
 
     def generate_ocsp_key(self, profile='ocsp', expires=3, algorithm=None, password=None,
                           key_size=None, key_type=None, ecc_curve=None, autogenerated=True):
@@ -605,13 +796,11 @@ class CertificateAuthority(X509CertMixin):
             invoked in an automated cron-like fashion.
         """
         password = password or self.get_password()
-        if key_type is None:
-            ca_key = self.key(password)
-            if isinstance(ca_key, dsa.DSAPrivateKey):
-                key_type = 'DSA'
-                algorithm = 'SHA1'
+        if key_type is None and isinstance(self.key(password), dsa.DSAPrivateKey):
+            algorithm = 'SHA1'
 
-        key_size, key_type, ecc_curve = validate_key_parameters(key_size, key_type, ecc_curve)
+        key_size, key_type, ecc_curve = self.get_ocsp_key_parameters(
+            password=password, key_size=key_size, key_type=key_type, ecc_curve=ecc_curve)
         if isinstance(expires, int):
             expires = timedelta(days=expires)
         algorithm = parse_hash_algorithm(algorithm)
@@ -639,6 +828,10 @@ class CertificateAuthority(X509CertMixin):
                     stream.write(contents)
             else:
                 ca_storage.save(path, ContentFile(contents))
+
+        # Responders in other processes notice the new files by their modification time, but make sure that
+        # this process never uses the old key, even if the storage backend has only a coarse resolution.
+        responder_cache.clear(private_path, cert_path)
         return private_path, cert_path, cert
 
     def get_authority_key_identifier(self):
@@ -658,13 +851,31 @@ class CertificateAuthority(X509CertMixin):
             value=self.get_authority_key_identifier()
         ))
 
-    def get_crl(self, expires=86400, algorithm=None, password=None, scope=None, counter=None, **kwargs):
+    def get_base_crl(self, scope=None, counter=None, partition=None):
+        """Get the CRL number and the time of the last published complete CRL for the given scope.
+
+        This is the base CRL that delta CRLs generated with ``get_crl(delta=True)`` refer to. The `scope`,
+        `counter` and `partition` parameters have the same meaning as for :py:meth:`get_crl`.
+
+        Returns
+        -------
+
+        tuple or None
+            A tuple of the CRL number and a datetime, or ``None`` if no complete CRL was published yet.
+        """
+        if counter is None:
+            counter = get_crl_counter(scope, partition)
+        return self.crl_numbers.filter(scope=counter, base_number__isnull=False).values_list(
+            'base_number', 'base_last_update').first()
+
+    def get_crl(self, expires=86400, algorithm=None, password=None, scope=None, counter=None, delta=False,
+                partition=None, publish=False, **kwargs):
         """Generate a Certificate Revocation List (CRL).
 
         The ``full_name`` and ``relative_name`` parameters describe how to retrieve the CRL and are used in
         the `Issuing Distribution Point extension <https://tools.ietf.org/html/rfc5280.html#section-5.2.5>`_.
-        The former defaults to the ``crl_url`` field, pass ``None`` to not include the value. At most one of
-        the two may be set.
+        The former defaults to the ``crl_url`` field (see :py:meth:`get_crl_urls`), pass ``None`` to not
+        include the value. At most one of the two may be set.
 
         Parameters
         ----------
@@ -684,12 +895,27 @@ class CertificateAuthority(X509CertMixin):
         counter : str, optional
             Override the counter-variable for the CRL Number extension. Passing the same key to multiple
             invocations will yield a different sequence then what would ordinarily be returned. The default is
-            to use the scope as the key.
+            to use the scope (and partition) as the key.
+        delta : bool, optional
+            Generate a `delta CRL <https://tools.ietf.org/html/rfc5280.html#section-5.2.4>`_ that contains
+            only certificates revoked since the last complete CRL for the same scope was published. Raises
+            ``ValueError`` if no complete CRL was published yet.
+        partition : int, optional
+            Generate the CRL for the given partition, containing only certificates with a serial in this
+            partition (see :ref:`crl-partitions`). Raises ``ValueError`` if the partition is out of range. If
+            CRLs for the scope are not partitioned, the only valid partition is ``0``.
+        publish : bool, optional
+            Store the CRL and record it as :py:class:`CRLPublication`, replacing previously stored CRLs for
+            the same scope. Only published complete CRLs are used as base for delta CRLs.
+            :py:meth:`cache_crls` publishes complete CRLs.
         full_name : list of str or :py:class:`~cg:cryptography.x509.GeneralName`, optional
             List of general names to use in the Issuing Distribution Point extension. If not passed, use
             ``crl_url`` if set.
         relative_name : :py:class:`~cg:cryptography.x509.RelativeDistinguishedName`, optional
             Used in Issuing Distribution Point extension, retrieve the CRL relative to the issuer.
+        freshest_crl : list of str or :py:class:`~cg:cryptography.x509.GeneralName`, optional
+            List of general names where delta CRLs can be retrieved, added to complete CRLs in the Freshest
+            CRL extension.
 
         Returns
         -------
@@ -701,6 +927,12 @@ class CertificateAuthority(X509CertMixin):
         if scope is not None and scope not in ['ca', 'user', 'attribute']:
             raise ValueError('Scope must be either None, "ca", "user" or "attribute"')
 
+        partitions = 1
+        if partition is not None:
+            partitions = self.get_crl_partitions(scope=scope)
+            if partition < 0 or partition >= partitions:
+                raise ValueError('%s: Partition must be between 0 and %s.' % (partition, partitions - 1))
+
         now = now_builder = timezone.now()
         algorithm = parse_hash_algorithm(algorithm)
 
@@ -709,17 +941,11 @@ class CertificateAuthority(X509CertMixin):
         else:
             now_builder = datetime.utcnow()
 
-        builder = x509.CertificateRevocationListBuilder()
-        builder = builder.issuer_name(self.x509.subject)
-        builder = builder.last_update(now_builder)
-        builder = builder.next_update(now_builder + timedelta(seconds=expires))
-
         if kwargs.get('full_name'):
             full_name = kwargs['full_name']
             full_name = [parse_general_name(n) for n in full_name]
-        elif self.crl_url:
-            crl_url = [url.strip() for url in self.crl_url.split()]
-            full_name = [x509.UniformResourceIdentifier(c) for c in crl_url]
+        elif self.get_crl_urls(partition=partition):
+            full_name = [x509.UniformResourceIdentifier(c) for c in self.get_crl_urls(partition=partition)]
         else:
             full_name = None
 
@@ -734,24 +960,43 @@ class CertificateAuthority(X509CertMixin):
             'relative_name': kwargs.get('relative_name'),
         }
 
-        ca_qs = self.children.filter(expires__gt=now).revoked()
-        cert_qs = self.certificate_set.filter(expires__gt=now).revoked()
+        if counter is None:
+            counter = get_crl_counter(scope, partition)
+
+        ca_qs = self.children.filter(expires__gt=now)
+        cert_qs = self.certificate_set.filter(expires__gt=now)
+
+        if delta:
+            base = self.get_base_crl(counter=counter)
+            if base is None:
+                raise ValueError('Cannot generate a delta CRL before a complete CRL for the same scope.')
+            base_crl_number, base_last_update = base
+
+            # Only include certificates revoked since the base CRL was generated
+            ca_qs = ca_qs.filter(revoked_date__gte=base_last_update)
+            cert_qs = cert_qs.filter(revoked_date__gte=base_last_update)
 
+        revocation_kwargs = {'partition': partition, 'partitions': partitions}
         if scope == 'ca':
-            certs = ca_qs
+            revoked_certs = ca_qs.revocations(**revocation_kwargs)
             idp_kwargs['only_contains_ca_certs'] = True
         elif scope == 'user':
-            certs = cert_qs
+            revoked_certs = cert_qs.revocations(**revocation_kwargs)
             idp_kwargs['only_contains_user_certs'] = True
         elif scope == 'attribute':
             # sorry, nothing we support right now
-            certs = []
+            revoked_certs = []
             idp_kwargs['only_contains_attribute_certs'] = True
         else:
-            certs = itertools.chain(ca_qs, cert_qs)
+            revoked_certs = itertools.chain(ca_qs.revocations(**revocation_kwargs),
+                                            cert_qs.revocations(**revocation_kwargs))
 
-        for cert in certs:
-            builder = builder.add_revoked_certificate(cert.get_revocation())
+        # NOTE: add_revoked_certificate() copies the list of revoked certificates every time, so we pass the
+        #       complete list to the constructor to build large CRLs in linear time.
+        builder = x509.CertificateRevocationListBuilder(revoked_certificates=list(revoked_certs))
+        builder = builder.issuer_name(self.x509.subject)
+        builder = builder.last_update(now_builder)
+        builder = builder.next_update(now_builder + timedelta(seconds=expires))
 
         # We can only add the IDP extension if one of these properties is set, see RFC 5280, 5.2.5.
         add_idp = idp_kwargs['only_contains_attribute_certs'] or idp_kwargs['only_contains_user_certs'] \
@@ -767,19 +1012,35 @@ class CertificateAuthority(X509CertMixin):
         except x509.ExtensionNotFound:
             pass
 
-        # Add the CRLNumber extension (RFC 5280, 5.2.3)
-        if counter is None:
-            counter = scope or 'all'
-        crl_number_data = json.loads(self.crl_number)
-        crl_number = int(crl_number_data['scope'].get(counter, 0))
-        builder = builder.add_extension(x509.CRLNumber(crl_number=crl_number), critical=False)
+        # Load the private key first, so that we do not use up a CRL number if loading fails
+        private_key = self.key(password)
 
-        # increase crl_number for the given scope and save
-        crl_number_data['scope'][counter] = crl_number + 1
-        self.crl_number = json.dumps(crl_number_data)
-        self.save()
+        # Add the CRLNumber extension (RFC 5280, 5.2.3). Complete and delta CRLs share one sequence.
+        crl_number = CRLNumber.increment(self, counter)
+        builder = builder.add_extension(x509.CRLNumber(crl_number=crl_number), critical=False)
 
-        return builder.sign(private_key=self.key(password), algorithm=algorithm, backend=default_backend())
+        if delta:
+            # Add the DeltaCRLIndicator extension (RFC 5280, 5.2.4)
+            builder = builder.add_extension(x509.DeltaCRLIndicator(base_crl_number), critical=True)
+        elif kwargs.get('freshest_crl'):
+            # Add the FreshestCRL extension (RFC 5280, 5.2.6)
+            dpoint = x509.DistributionPoint(
+                full_name=[parse_general_name(n) for n in kwargs['freshest_crl']], relative_name=None,
+                reasons=None, crl_issuer=None)
+            builder = builder.add_extension(x509.FreshestCRL([dpoint]), critical=False)
+
+        crl = builder.sign(private_key=private_key, algorithm=algorithm, backend=default_backend())
+        if publish:
+            CRLPublication.publish(self, crl, scope=counter, delta=delta, last_update=now,
+                                   next_update=now + timedelta(seconds=expires), full_name=full_name,
+                                   relative_name=kwargs.get('relative_name'),
+                                   freshest_crl=None if delta else kwargs.get('freshest_crl'))
+
+        # Only published CRLs are recorded as base for delta CRLs, as clients could otherwise not retrieve the
+        # complete CRL that a delta CRL refers to.
+        if publish and not delta:
+            CRLNumber.set_base(self, counter, crl_number, now)
+        return crl
 
     def get_password(self):
         return ca_settings.CA_PASSWORDS.get(self.serial)
@@ -852,6 +1113,13 @@ class CertificateAuthority(X509CertMixin):
         verbose_name = _('Certificate Authority')
         verbose_name_plural = _('Certificate Authorities')
 
+    @property
+    def ocsp_response_cache_key(self):
+        """Cache key of a pre-generated OCSP response for this CA, ``None`` if it is a root CA."""
+        if self.parent_id is None:
+            return None
+        return get_ocsp_response_cache_key(self.parent.serial, self.serial, scope='ca')
+
     def __str__(self):
         return self.name
 
@@ -884,5 +1152,134 @@ class Certificate(X509CertMixin):
 
         return self.ca.root
 
+    @property
+    def ocsp_response_cache_key(self):
+        """Cache key of a pre-generated OCSP response for this certificate."""
+        return get_ocsp_response_cache_key(self.ca.serial, self.serial)
+
     def __str__(self):
         return self.cn
+
+
+class CRLNumber(models.Model):
+    """CRL number (see RFC 5280, 5.2.3) of a certificate authority for one scope.
+
+    Every scope (or counter, see :py:meth:`CertificateAuthority.get_crl`) has its own row, so CRLs for
+    different scopes can be generated in parallel without writing to the certificate authority itself.
+    """
+
+    ca = models.ForeignKey(CertificateAuthority, on_delete=models.CASCADE, related_name='crl_numbers',
+                           verbose_name=_('Certificate Authority'))
+    scope = models.CharField(max_length=32, help_text=_('Scope or counter of the CRL.'))
+    number = models.PositiveIntegerField(default=0, help_text=_('The CRL number of the next CRL.'))
+    base_number = models.PositiveIntegerField(
+        null=True, blank=True, help_text=_('CRL number of the last complete CRL.'))
+    base_last_update = models.DateTimeField(
+        null=True, blank=True, help_text=_('When the last complete CRL was generated.'))
+
+    class Meta:
+        unique_together = (('ca', 'scope'), )
+
+    @classmethod
+    def increment(cls, ca, scope):
+        """Get the next CRL number for the given CA and scope.
+
+        The number is incremented atomically in the database, so concurrent calls never return the same
+        number.
+        """
+        with transaction.atomic():
+            # NOTE: The UPDATE locks the row until the end of the transaction, so no other transaction can
+            #       increment the number before we read it.
+            qs = cls.objects.filter(ca=ca, scope=scope)
+            if qs.update(number=models.F('number') + 1) == 0:  # first CRL for this scope
+                _obj, created = cls.objects.get_or_create(ca=ca, scope=scope, defaults={'number': 1})
+                if created:
+                    return 0
+                qs.update(number=models.F('number') + 1)  # created by a concurrent transaction
+            return qs.values_list('number', flat=True).get() - 1
+
+    @classmethod
+    def set_base(cls, ca, scope, number, last_update):
+        """Record the complete CRL with the given number as base CRL for delta CRLs.
+
+        The base CRL is only updated if `number` is newer than the current base CRL.
+        """
+        cls.objects.filter(ca=ca, scope=scope).filter(
+            models.Q(base_number__isnull=True) | models.Q(base_number__lt=number)
+        ).update(base_number=number, base_last_update=last_update)
+
+    def __str__(self):
+        return '%s: %s' % (self.scope, self.number)
+
+
+class CRLPublication(models.Model):
+    """A CRL that was published by :py:meth:`CertificateAuthority.get_crl`.
+
+    The CRL itself is stored (in DER format) using the storage backend configured with :ref:`CA_FILE_STORAGE
+    <settings-ca-file-storage>`, so it can be served even after the cache was cleared.
+    """
+
+    ca = models.ForeignKey(CertificateAuthority, on_delete=models.CASCADE, related_name='crl_publications',
+                           verbose_name=_('Certificate Authority'))
+    scope = models.CharField(max_length=32, help_text=_('Scope or counter of the CRL.'))
+    delta = models.BooleanField(default=False, help_text=_('If this is a delta CRL.'))
+    number = models.PositiveIntegerField(help_text=_('The CRL number.'))
+    algorithm = models.CharField(max_length=16, help_text=_('The hash algorithm used to sign the CRL.'))
+    last_update = models.DateTimeField(help_text=_('When the CRL was generated.'))
+    next_update = models.DateTimeField(help_text=_('When the CRL expires.'))
+    path = models.CharField(max_length=256, help_text=_('Path to the CRL (in DER format).'))
+    full_name = models.TextField(blank=True, default='',
+                                 help_text=_('Full name in the Issuing Distribution Point extension.'))
+    relative_name = models.CharField(
+        max_length=256, blank=True, default='',
+        help_text=_('Relative name in the Issuing Distribution Point extension.'))
+    freshest_crl = models.TextField(blank=True, default='',
+                                    help_text=_('Where delta CRLs can be retrieved.'))
+
+    class Meta:
+        unique_together = (('ca', 'scope', 'number'), )
+
+    @classmethod
+    def get_name_fields(cls, full_name=None, relative_name=None, freshest_crl=None):
+        """Get the values for the ``full_name``, ``relative_name`` and ``freshest_crl`` fields.
+
+        Parameters have the same meaning as for :py:meth:`CertificateAuthority.get_crl`, so the values can
+        be used to look up a CRL with the same extensions.
+        """
+        return {
+            'full_name': '\n'.join(format_general_name(parse_general_name(n)) for n in full_name or []),
+            'relative_name': format_relative_name(relative_name) if relative_name else '',
+            'freshest_crl': '\n'.join(format_general_name(parse_general_name(n)) for n in freshest_crl or []),
+        }
+
+    @classmethod
+    def publish(cls, ca, crl, scope, delta, last_update, next_update, full_name=None, relative_name=None,
+                freshest_crl=None):
+        """Store the given :py:class:`~cg:cryptography.x509.CertificateRevocationList` and record it.
+
+        Previously published CRLs of the same kind are superseded by the new CRL, so they are removed.
+        """
+
+        number = crl.extensions.get_extension_for_class(x509.CRLNumber).value.crl_number
+        algorithm = crl.signature_hash_algorithm.name
+        names = cls.get_name_fields(full_name=full_name, relative_name=relative_name,
+                                    freshest_crl=freshest_crl)
+        path = 'crl/%s/%s-%s%s.der' % (ca.serial, scope, number, '-delta' if delta else '')
+        path = ca_storage.save(path, ContentFile(crl.public_bytes(Encoding.DER)))
+        publication = cls.objects.create(ca=ca, scope=scope, delta=delta, number=number, algorithm=algorithm,
+                                         last_update=last_update, next_update=next_update, path=path,
+                                         **names)
+
+        superseded = cls.objects.filter(ca=ca, scope=scope, delta=delta, algorithm=algorithm,
+                                        number__lt=number, **names)
+        for old_path in superseded.values_list('path', flat=True):
+            ca_storage.delete(old_path)
+        superseded.delete()
+        return publication
+
+    def read(self):
+        """Read the CRL (in DER format) from the storage backend."""
+        return read_file(self.path)
+
+    def __str__(self):
+        return '%s: %s' % (self.scope, self.number)
@@ -11,16 +11,279 @@
 # You should have received a copy of the GNU General Public License along with django-ca.  If not,
 # see <http://www.gnu.org/licenses/>.
 
+import logging
+from datetime import datetime
 from datetime import timedelta
 
+import pytz
+
+from asn1crypto import ocsp as asn1_ocsp
+from asn1crypto import x509 as asn1_x509
+from asn1crypto.core import Null
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import dsa
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.serialization import Encoding
+from cryptography.x509 import ocsp
+
 from django.utils import timezone
 
 from .constants import ReasonFlags
 
+log = logging.getLogger(__name__)
+
 # We need a two-letter year, otherwise OCSP doesn't work
 date_format = '%y%m%d%H%M%SZ'
 
 
+class ResponderCache:
+    """Process-wide cache for loaded OCSP responder keys and certificates.
+
+    Every value is stored together with a version, usually the modification time of the file it was loaded
+    from. If the version changes (e.g. because :py:meth:`CertificateAuthority.generate_ocsp_key
+    <django_ca.models.CertificateAuthority.generate_ocsp_key>` wrote a new key), the value is loaded again, so
+    worker processes never have to be restarted when keys are rotated.
+    """
+
+    def __init__(self):
+        self._entries = {}
+
+    def get(self, key, version, load):
+        """Get the value for `key`, calling `load` if it is not cached or the version has changed.
+
+        If `version` is ``None``, the value is never cached.
+        """
+        if version is None:
+            return load()
+
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+
+        value = load()
+        self._entries[key] = (version, value)
+        return value
+
+    def clear(self, *keys):
+        """Remove the given keys from the cache, or clear the whole cache if no keys are given."""
+
+        if not keys:
+            self._entries = {}
+
+        for key in keys:
+            self._entries.pop(key, None)
+
+
+responder_cache = ResponderCache()
+
+
+def get_issuer_hashes(cert):
+    """Get the issuer name and key hashes identifying `cert` as issuer in OCSP requests.
+
+    Returns a dictionary mapping the hash algorithm (``"sha1"`` and ``"sha256"``) to a tuple of the name and
+    key hash.
+    """
+    issuer = asn1_x509.Certificate.load(cert.public_bytes(Encoding.DER))
+    return {algorithm: (getattr(issuer.subject, algorithm), getattr(issuer.public_key, algorithm))
+            for algorithm in ('sha1', 'sha256')}
+
+
+def get_cert_id(ca, serial_number):
+    """Get the SHA1-based ``CertID`` identifying a certificate issued by `ca` in OCSP requests/responses.
+
+    Parameters
+    ----------
+
+    ca : :py:class:`~django_ca.models.CertificateAuthority`
+        The CA that issued the certificate.
+    serial_number : int
+        The serial of the certificate.
+
+    Returns
+    -------
+
+    :py:class:`asn1crypto.ocsp.CertId`
+    """
+    name_hash, key_hash = get_issuer_hashes(ca.x509)['sha1']
+    return asn1_ocsp.CertId({
+        'hash_algorithm': {'algorithm': 'sha1'},
+        'issuer_name_hash': name_hash,
+        'issuer_key_hash': key_hash,
+        'serial_number': serial_number,
+    })
+
+
+def match_issuer(cert_id, issuer_hashes):
+    """Return ``True`` if the issuer name and key hashes in `cert_id` match `issuer_hashes` (as returned by
+    :py:func:`get_issuer_hashes`).
+
+    Only SHA1 and SHA256 hashes are supported, ``False`` is returned for any other hash algorithm.
+    """
+    algorithm = cert_id['hash_algorithm']['algorithm'].native
+    return issuer_hashes.get(algorithm) == (cert_id['issuer_name_hash'].native,
+                                            cert_id['issuer_key_hash'].native)
+
+
+def _sign(private_key, data):
+    if isinstance(private_key, rsa.RSAPrivateKey):
+        return 'sha256_rsa', private_key.sign(data, padding.PKCS1v15(), hashes.SHA256())
+    elif isinstance(private_key, dsa.DSAPrivateKey):
+        return 'sha256_dsa', private_key.sign(data, hashes.SHA256())
+    elif isinstance(private_key, ec.EllipticCurvePrivateKey):
+        return 'sha256_ecdsa', private_key.sign(data, ec.ECDSA(hashes.SHA256()))
+    raise ValueError('Unsupported private key type: %s' % type(private_key).__name__)
+
+
+def get_response(certs, responder_key, responder_cert, expires=86400, nonce=None):
+    """Get a signed OCSP response with the status of all given certificates.
+
+    All statuses are covered by a single signature, so answering an OCSP request for multiple certificates is
+    not more expensive than answering a request for a single one.
+
+    Parameters
+    ----------
+
+    certs : list of tuple
+        A list of ``(cert_id, cert)`` tuples. ``cert_id`` is the :py:class:`asn1crypto.ocsp.CertId` as sent
+        in the request (or as returned by :py:func:`get_cert_id`), ``cert`` is the
+        :py:class:`~django_ca.models.Certificate` or :py:class:`~django_ca.models.CertificateAuthority`.
+    responder_key
+        The private key used for signing the response.
+    responder_cert : :py:class:`~cg:cryptography.x509.Certificate`
+        The certificate of the OCSP responder, added to the response.
+    expires : int, optional
+        Number of seconds until the response expires.
+    nonce : :py:class:`asn1crypto.core.OctetString`, optional
+        The nonce of the request, if any.
+
+    Returns
+    -------
+
+    :py:class:`asn1crypto.ocsp.OCSPResponse`
+    """
+    # GeneralizedTime in OCSP responses should not include fractional seconds
+    now = datetime.now(pytz.utc).replace(microsecond=0)
+    next_update = now + timedelta(seconds=expires)
+
+    responses = []
+    for cert_id, cert in certs:
+        if cert.revoked:
+            status = asn1_ocsp.CertStatus(name='revoked', value={
+                'revocation_time': pytz.utc.localize(cert.get_revocation_time()).replace(microsecond=0),
+                'revocation_reason': cert.revoked_reason,
+            })
+        else:
+            status = asn1_ocsp.CertStatus(name='good', value=Null())
+
+        responses.append({
+            'cert_id': cert_id,
+            'cert_status': status,
+            'this_update': now,
+            'next_update': next_update,
+        })
+
+    # We (so far) always use delegate certificates, so the responder certificate is added to the response.
+    responder = asn1_x509.Certificate.load(responder_cert.public_bytes(Encoding.DER))
+    response_data = asn1_ocsp.ResponseData({
+        'responder_id': asn1_ocsp.ResponderId(name='by_key', value=responder.public_key.sha1),
+        'produced_at': now,
+        'responses': responses,
+    })
+    if nonce is not None:
+        response_data['response_extensions'] = [{'extn_id': 'nonce', 'critical': False, 'extn_value': nonce}]
+
+    signature_algorithm, signature = _sign(responder_key, response_data.dump())
+    return asn1_ocsp.OCSPResponse({
+        'response_status': 'successful',
+        'response_bytes': {
+            'response_type': 'basic_ocsp_response',
+            'response': asn1_ocsp.BasicOCSPResponse({
+                'tbs_response_data': response_data,
+                'signature_algorithm': {'algorithm': signature_algorithm},
+                'signature': signature,
+                'certs': [responder],
+            }),
+        },
+    })
+
+
+class OCSPResponder:
+    """Base class implementing the processing of OCSP requests.
+
+    This class does not depend on Django, so it can be used both by :py:class:`~django_ca.views.OCSPView` and
+    by the standalone responder in :py:mod:`django_ca.responder`. Subclasses have to implement
+    ``get_issuer()``, ``get_scope()``, ``get_certs()``, ``get_cached_response()``, ``get_responder_key()``,
+    ``get_responder_cert()`` and ``http_response()``.
+    """
+
+    expires = 600
+    """Time in seconds that the responses remain valid."""
+
+    log = log
+    """Logger used for messages about invalid requests."""
+
+    def fail(self, status=ocsp.OCSPResponseStatus.INTERNAL_ERROR):
+        return self.http_response(
+            ocsp.OCSPResponseBuilder.build_unsuccessful(status).public_bytes(Encoding.DER)
+        )
+
+    def malformed_request(self):
+        return self.fail(ocsp.OCSPResponseStatus.MALFORMED_REQUEST)
+
+    def process_ocsp_request(self, data):
+        try:
+            ocsp_req = asn1_ocsp.OCSPRequest.load(data, strict=True)
+            cert_ids = [r['req_cert'] for r in ocsp_req['tbs_request']['request_list']]
+            serials = ['%X' % cert_id['serial_number'].native for cert_id in cert_ids]
+            critical_extensions = ocsp_req.critical_extensions
+            nonce = ocsp_req.nonce_value
+        except Exception as e:
+            self.log.exception(e)
+            return self.malformed_request()
+
+        if not cert_ids:
+            return self.malformed_request()
+
+        # Fail if there are any critical extensions that we do not understand
+        if critical_extensions - {'nonce'}:
+            return self.malformed_request()
+
+        ca = self.get_issuer(cert_ids)
+        if ca is None:
+            return self.fail()
+
+        # Requests without a nonce can be answered with a pre-generated response (see RFC 5019). They are
+        # generated with SHA1 hashes, so they only match requests that use SHA1 as well.
+        algorithm = cert_ids[0]['hash_algorithm']['algorithm'].native
+        if nonce is None and len(cert_ids) == 1 and algorithm == 'sha1':
+            response = self.get_cached_response(ca, serials[0])
+            if response is not None:
+                return self.http_response(response)
+
+        certs = self.get_certs(ca, serials)
+        if len(certs) != len(set(serials)):
+            if self.get_scope() == 'ca':
+                self.log.warning('OCSP request for unknown CA received.')
+            else:
+                self.log.warning('OCSP request for unknown cert received.')
+            return self.fail()
+
+        # get key/cert for OCSP responder
+        try:
+            responder_key = self.get_responder_key()
+            responder_cert = self.get_responder_cert()
+        except Exception:
+            self.log.error('Could not read responder key/cert.')
+            return self.fail()
+
+        # One response covering all requested certificates
+        response = get_response([(cert_id, certs[serial]) for cert_id, serial in zip(cert_ids, serials)],
+                                responder_key, responder_cert, expires=self.expires, nonce=nonce)
+        return self.http_response(response.dump())
+
+
 def get_index(ca):
     now = timezone.now()
     yesterday = now - timedelta(seconds=86400)
@@ -87,6 +87,15 @@ class Profile(object):
         # set some sane extension defaults
         self.extensions.setdefault(BasicConstraints.key, BasicConstraints())
 
+        # Compiled templates for CAs this profile was used with, see get_template()
+        self._templates = {}
+
+    def __getstate__(self):
+        # Compiled templates are never copied or pickled, they are compiled again on demand
+        state = self.__dict__.copy()
+        state['_templates'] = {}
+        return state
+
     def __eq__(self, o):
         if isinstance(o, (Profile, DefaultProfileProxy)) is False:
             return False
@@ -183,6 +192,30 @@ class Profile(object):
             The signed certificate.
         """
 
+        builder, algorithm = self.prepare_cert(
+            ca, csr, subject=subject, expires=expires, algorithm=algorithm, extensions=extensions,
+            cn_in_san=cn_in_san, add_crl_url=add_crl_url, add_ocsp_url=add_ocsp_url,
+            add_issuer_url=add_issuer_url, add_issuer_alternative_name=add_issuer_alternative_name,
+            password=password)
+        return builder.sign(private_key=ca.key(password), algorithm=algorithm, backend=default_backend())
+
+    def prepare_cert(self, ca, csr, subject=None, expires=None, algorithm=None, extensions=None,
+                     cn_in_san=None, add_crl_url=None, add_ocsp_url=None, add_issuer_url=None,
+                     add_issuer_alternative_name=None, password=None):
+        """Prepare a certificate like :py:meth:`create_cert`, but do not sign it.
+
+        Parameters are the same as for :py:meth:`create_cert`. The
+        :py:func:`~django_ca.signals.pre_issue_cert` signal is sent by this method, so the certificate can be
+        signed in a different thread.
+
+        Returns
+        -------
+
+        tuple
+            A tuple of the :py:class:`~cg:cryptography.x509.CertificateBuilder` and the hash algorithm to sign
+            the certificate with.
+        """
+
         # Compute default values
         if extensions is None:
             extensions = {}
@@ -203,14 +236,44 @@ class Profile(object):
         if add_issuer_alternative_name is None:
             add_issuer_alternative_name = self.add_issuer_alternative_name
 
-        cert_extensions = deepcopy(self.extensions)
-        cert_extensions.update(extensions)
-        cert_extensions = {k: v for k, v in cert_extensions.items() if v is not None}
-        cert_subject = deepcopy(self.subject)
-
-        issuer_name = self._update_from_ca(
-            ca, cert_extensions, add_crl_url=add_crl_url, add_ocsp_url=add_ocsp_url,
-            add_issuer_url=add_issuer_url, add_issuer_alternative_name=add_issuer_alternative_name)
+        # The serial is generated here, as it determines the CRL partition of the certificate
+        serial = x509.random_serial_number()
+        template = self.get_template(
+            ca, add_crl_url=add_crl_url, add_ocsp_url=add_ocsp_url, add_issuer_url=add_issuer_url,
+            add_issuer_alternative_name=add_issuer_alternative_name, partition=ca.get_crl_partition(serial))
+        issuer_name = template.issuer_name
+
+        # Extensions of the template are shared by all certificates, so they are only ever replaced (and never
+        # modified) here. Passed extensions that the CA adds values to are updated just like in the template.
+        cert_extensions = dict(template.extensions)
+        ca_extensions = {}
+        for key, extension in extensions.items():
+            if key in ProfileTemplate.ca_extensions:
+                if extension is not None:
+                    ca_extensions[key] = deepcopy(extension)
+            elif extension is None:
+                cert_extensions.pop(key, None)
+            else:
+                cert_extensions[key] = extension
+
+        ca_overrides = ProfileTemplate.ca_extensions.intersection(extensions)
+        if ca_overrides:
+            self._update_from_ca(
+                ca, ca_extensions, add_crl_url=add_crl_url, add_ocsp_url=add_ocsp_url,
+                add_issuer_url=add_issuer_url, add_issuer_alternative_name=add_issuer_alternative_name,
+                serial=serial)
+            for key in ca_overrides:
+                if key in ca_extensions:
+                    cert_extensions[key] = ca_extensions[key]
+                else:
+                    cert_extensions.pop(key, None)
+
+        # The SubjectAlternativeName might be updated with the CommonName below
+        san_key = SubjectAlternativeName.key
+        if template.is_shared(san_key, cert_extensions):
+            cert_extensions[san_key] = deepcopy(cert_extensions[san_key])
+
+        cert_subject = self.subject.copy()
 
         if not isinstance(subject, Subject):
             subject = Subject(subject)  # NOTE: also accepts None
@@ -231,28 +294,59 @@ class Profile(object):
                                       extensions[SubjectAlternativeName.key].value):
             raise ValueError("Must name at least a CN or a subjectAlternativeName.")
 
+        # Receivers may modify extensions, so they must never see the extensions shared by the template
+        if pre_issue_cert.has_listeners(self.__class__):
+            cert_extensions = {k: deepcopy(v) if template.is_shared(k, cert_extensions) else v
+                               for k, v in cert_extensions.items()}
         pre_issue_cert.send(sender=self.__class__, ca=ca, csr=csr, expires=expires, algorithm=algorithm,
                             subject=cert_subject, extensions=cert_extensions, password=password)
 
         public_key = csr.public_key()
-        builder = get_cert_builder(expires)
+        builder = get_cert_builder(expires, serial=serial)
         builder = builder.public_key(public_key)
         builder = builder.issuer_name(issuer_name)
         builder = builder.subject_name(cert_subject.name)
 
         for key, extension in cert_extensions.items():
-            builder = builder.add_extension(**extension.for_builder())
+            if template.is_shared(key, cert_extensions):
+                builder = builder.add_extension(**template.for_builder[key])
+            else:
+                builder = builder.add_extension(**extension.for_builder())
 
         # Add the SubjectKeyIdentifier
         if SubjectKeyIdentifier.key not in cert_extensions:
             builder = builder.add_extension(x509.SubjectKeyIdentifier.from_public_key(public_key),
                                             critical=False)
 
-        return builder.sign(private_key=ca.key(password), algorithm=algorithm, backend=default_backend())
+        return builder, algorithm
 
     def copy(self):
         return deepcopy(self)
 
+    def get_template(self, ca, add_crl_url=None, add_ocsp_url=None, add_issuer_url=None,
+                     add_issuer_alternative_name=None, partition=None):
+        """Get the compiled :py:class:`~django_ca.profiles.ProfileTemplate` for the given CA.
+
+        Templates are compiled once for every CA and combination of parameters and reused by later calls.
+        A template is compiled again if any relevant field of the CA or the extensions or issuer name of this
+        profile have changed since it was compiled, even if extensions were modified in place.
+        """
+        key = (add_crl_url, add_ocsp_url, add_issuer_url, add_issuer_alternative_name, partition)
+        version = (ca.pub, ca.crl_url, ca.ocsp_url, ca.issuer_url, ca.issuer_alt_name)
+
+        ca_version, templates = self._templates.get(ca.serial, (None, None))
+        if ca_version != version:
+            templates = {}
+            self._templates[ca.serial] = (version, templates)
+
+        template = templates.get(key)
+        if template is None or template.is_stale(self):
+            template = ProfileTemplate(
+                self, ca, add_crl_url=add_crl_url, add_ocsp_url=add_ocsp_url, add_issuer_url=add_issuer_url,
+                add_issuer_alternative_name=add_issuer_alternative_name, partition=partition)
+            templates[key] = template
+        return template
+
     def serialize(self):
         """Function to serialize a profile.
 
@@ -269,21 +363,26 @@ class Profile(object):
         return data
 
     def _update_from_ca(self, ca, extensions, add_crl_url=None, add_ocsp_url=None, add_issuer_url=None,
-                        add_issuer_alternative_name=None):
+                        add_issuer_alternative_name=None, serial=None, partition=None):
         """Update data from the given CA.
 
         * Sets the AuthorityKeyIdentifier extension
         * Sets the OCSP url if add_ocsp_url is True
-        * Sets a CRL URL if add_crl_url is True
+        * Sets a CRL URL if add_crl_url is True (for the CRL partition of `serial` or the given `partition`,
+          if CRLs are partitioned)
         * Adds an IssuerAlternativeName if add_issuer_alternative_name is True
 
         """
         extensions.setdefault(AuthorityKeyIdentifier.key, ca.get_authority_key_identifier_extension())
 
-        if add_crl_url is not False and ca.crl_url:
+        if partition is None and serial is not None:
+            partition = ca.get_crl_partition(serial)
+        crl_urls = ca.get_crl_urls(partition=partition)
+
+        if add_crl_url is not False and crl_urls:
             extensions.setdefault(CRLDistributionPoints.key, CRLDistributionPoints())
             extensions[CRLDistributionPoints.key].value.append(DistributionPoint({
-                'full_name': [url.strip() for url in ca.crl_url.split()],
+                'full_name': crl_urls,
             }))
 
         if add_ocsp_url is not False and ca.ocsp_url:
@@ -320,6 +419,41 @@ class Profile(object):
                 subject['CN'] = cn
 
 
+class ProfileTemplate:
+    """The precompiled part of certificates issued by a given CA using a profile.
+
+    A template holds the extensions of the profile with all values from the CA already added, as well as the
+    arguments for the certificate builder for every extension. Extensions in a template are shared by all
+    certificates created from it and must never be modified. Templates are created and cached by
+    :py:meth:`Profile.get_template() <django_ca.profiles.Profile.get_template>`.
+    """
+
+    ca_extensions = frozenset([AuthorityKeyIdentifier.key, AuthorityInformationAccess.key,
+                               CRLDistributionPoints.key, IssuerAlternativeName.key])
+    """Keys of extensions that get values from the CA."""
+
+    def __init__(self, profile, ca, add_crl_url=None, add_ocsp_url=None, add_issuer_url=None,
+                 add_issuer_alternative_name=None, partition=None):
+        # Copies of the profile values the template was compiled from, to detect changes of the profile
+        self.profile_extensions = deepcopy(profile.extensions)
+        self.profile_issuer_name = deepcopy(profile.issuer_name)
+        self.extensions = {k: deepcopy(v) for k, v in profile.extensions.items() if v is not None}
+        self.issuer_name = profile._update_from_ca(
+            ca, self.extensions, add_crl_url=add_crl_url, add_ocsp_url=add_ocsp_url,
+            add_issuer_url=add_issuer_url, add_issuer_alternative_name=add_issuer_alternative_name,
+            partition=partition)
+        self.for_builder = {k: e.for_builder() for k, e in self.extensions.items()}
+
+    def is_stale(self, profile):
+        """Return ``True`` if extensions or issuer name of `profile` changed since it was compiled."""
+        return self.profile_extensions != profile.extensions or \
+            self.profile_issuer_name != profile.issuer_name
+
+    def is_shared(self, key, extensions):
+        """Return ``True`` if the extension for `key` in `extensions` is the one from this template."""
+        return key in self.extensions and extensions.get(key) is self.extensions[key]
+
+
 def get_profile(name=None):
     """Get profile by the given name.
 
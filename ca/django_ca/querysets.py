@@ -15,6 +15,9 @@ from django.db import models
 from django.db.models import Q
 from django.utils import timezone
 
+from .utils import get_revoked_certificate
+from .utils import get_serial_partition
+
 
 class DjangoCAMixin(object):
     def get_by_serial_or_cn(self, identifier):
@@ -39,6 +42,20 @@ class DjangoCAMixin(object):
 
         return self.filter(revoked=True)
 
+    def revocations(self, chunk_size=2000, partition=None, partitions=1):
+        """Get a :py:class:`~cg:cryptography.x509.RevokedCertificate` for every revoked certificate.
+
+        Unlike calling ``get_revocation()`` for every certificate, this loads only the required fields from
+        the database (in chunks of `chunk_size` rows) and does not parse any certificates. If `partition` is
+        given, only certificates in this CRL partition (out of `partitions`) are returned.
+        """
+        qs = self.revoked().values_list('serial', 'revoked_date', 'revoked_reason', 'compromised')
+        for serial, revoked_date, reason, compromised in qs.iterator(chunk_size=chunk_size):
+            serial = int(serial.replace(':', ''), 16)
+            if partition is not None and get_serial_partition(serial, partitions) != partition:
+                continue
+            yield get_revoked_certificate(serial, revoked_date, reason, compromised)
+
 
 class CertificateAuthorityQuerySet(models.QuerySet, DjangoCAMixin):
     def disabled(self):
@@ -0,0 +1,105 @@
+# This file is part of django-ca (https://github.com/mathiasertl/django-ca).
+#
+# django-ca is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# django-ca is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with django-ca.  If not,
+# see <http://www.gnu.org/licenses/>.
+
+"""Signal receivers used by django-ca itself, connected when the app is ready."""
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from . import ca_settings
+from . import tasks
+from .models import CertificateAuthority
+from .registry import ca_registry
+from .signals import post_create_ca
+from .signals import post_issue_cert
+from .signals import post_revoke_cert
+from .status_index import get_status_index
+from .utils import key_cache
+
+
+def _update_status_index(ca, cert, scope):
+    if not ca_settings.CA_OCSP_INDEX_DIR:
+        return
+
+    index = get_status_index(ca_settings.CA_OCSP_INDEX_DIR, ca.serial, scope=scope)
+    args = (cert.x509.serial_number, cert.get_revocation_time(), cert.revoked_reason)
+
+    # Only update the index once the change is committed: A status written for a transaction that is rolled
+    # back would remain in the index, and an index built before the commit would not contain the change.
+    transaction.on_commit(lambda: index.update(*args))
+
+
+@receiver(post_create_ca, dispatch_uid='django_ca_status_index_create_ca')
+def update_status_index_on_create_ca(sender, ca, **kwargs):
+    if ca.parent is not None:
+        _update_status_index(ca.parent, ca, scope='ca')
+
+
+@receiver(post_issue_cert, dispatch_uid='django_ca_status_index_issue_cert')
+def update_status_index_on_issue_cert(sender, cert, **kwargs):
+    _update_status_index(cert.ca, cert, scope='user')
+
+
+@receiver(post_revoke_cert, dispatch_uid='django_ca_status_index_revoke_cert')
+def update_status_index_on_revoke_cert(sender, cert, **kwargs):
+    if isinstance(cert, CertificateAuthority):
+        if cert.parent is not None:
+            _update_status_index(cert.parent, cert, scope='ca')
+    else:
+        _update_status_index(cert.ca, cert, scope='user')
+
+
+@receiver(post_revoke_cert, dispatch_uid='django_ca_regenerate_crls_revoke_cert')
+def regenerate_crls_on_revoke_cert(sender, cert, **kwargs):
+    delay = ca_settings.CA_CRL_REGENERATION_DELAY
+    if delay is None or ca_settings.CA_USE_CELERY is False:
+        return
+
+    if isinstance(cert, CertificateAuthority):
+        if cert.parent is None:
+            return
+        ca, scope = cert.parent, 'ca'
+    else:
+        ca, scope = cert.ca, 'user'
+
+    # Only regenerate the CRL partition that contains the certificate
+    cache_key = 'crl_regeneration_%s_%s' % (ca.serial, scope)
+    task_kwargs = {'scopes': [scope], 'force': True}
+    partition = ca.get_crl_partition(cert.serial, scope=scope)
+    if partition is not None:
+        cache_key += '_%s' % partition
+        task_kwargs['partitions'] = [partition]
+
+    def schedule():
+        # Only the first revocation within `delay` seconds schedules a task. Certificates revoked later are
+        # included in the CRL generated by that task, as it loads revoked certificates only when it runs.
+        if cache.add(cache_key, True, delay):
+            tasks.cache_crl.apply_async((ca.serial, ), task_kwargs, countdown=delay)
+
+    # The task must not run before the revocation is committed, or it would generate a CRL without it
+    transaction.on_commit(schedule)
+
+
+@receiver(post_save, sender=CertificateAuthority, dispatch_uid='django_ca_registry_save_ca')
+@receiver(post_delete, sender=CertificateAuthority, dispatch_uid='django_ca_registry_delete_ca')
+def invalidate_ca_registry(sender, **kwargs):
+    ca_registry.invalidate()
+
+
+@receiver(post_save, sender=CertificateAuthority, dispatch_uid='django_ca_key_cache_save_ca')
+@receiver(post_delete, sender=CertificateAuthority, dispatch_uid='django_ca_key_cache_delete_ca')
+def clear_key_cache(sender, instance, **kwargs):
+    key_cache.clear(instance.serial)
@@ -0,0 +1,153 @@
+# This file is part of django-ca (https://github.com/mathiasertl/django-ca).
+#
+# django-ca is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# django-ca is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with django-ca.  If not,
+# see <http://www.gnu.org/licenses/>.
+
+"""Process-local registry of certificate authorities used by views that are called very frequently.
+
+Certificate authorities are few and change rarely, so views like the OCSP responder do not have to query the
+database and parse the certificate on every request. The registry is loaded on first use and invalidated
+whenever a certificate authority is saved or deleted. Processes detect changes made by other processes
+through a version stored in the Django cache, so all nodes must use a shared cache backend.
+"""
+
+import threading
+import uuid
+from collections import namedtuple
+
+from cryptography.hazmat.primitives.serialization import Encoding
+
+from django.core.cache import cache
+
+from .models import CertificateAuthority
+from .ocsp import get_issuer_hashes
+
+VERSION_CACHE_KEY = 'ca_registry_version'
+
+_State = namedtuple('_State', ['version', 'entries', 'by_serial', 'by_issuer_hash'])
+
+
+class RegisteredCA:
+    """A certificate authority as stored in the registry.
+
+    All attributes are computed once when the registry is loaded.
+    """
+
+    def __init__(self, ca):
+        self.ca = ca
+        self.x509 = ca.x509
+        self.der = self.x509.public_bytes(Encoding.DER)
+        self.issuer_hashes = get_issuer_hashes(self.x509)
+        self.authority_key_identifier = ca.get_authority_key_identifier()
+
+
+class CARegistry:
+    """Registry of all certificate authorities, see the module documentation for details."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = None
+
+    def _get_state(self):
+        # NOTE: The version is retrieved *before* loading certificate authorities, so a change made while
+        #       loading is detected the next time the registry is used.
+        version = cache.get(VERSION_CACHE_KEY)
+        state = self._state
+        if version is not None and state is not None and state.version == version:
+            return state
+
+        with self._lock:
+            if version is None:  # first use or evicted from the cache, so we cannot know if anything changed
+                version = uuid.uuid4().hex
+                if not cache.add(VERSION_CACHE_KEY, version, None):
+                    version = cache.get(VERSION_CACHE_KEY, version)
+
+            state = self._state
+            if state is None or state.version != version:
+                entries = [RegisteredCA(ca) for ca in CertificateAuthority.objects.all()]
+                by_serial = {entry.ca.serial: entry for entry in entries}
+                by_issuer_hash = {}
+                for entry in entries:
+                    for algorithm, hashes in entry.issuer_hashes.items():
+                        by_issuer_hash.setdefault((algorithm, ) + hashes, entry)
+
+                state = _State(version, entries, by_serial, by_issuer_hash)
+                self._state = state
+        return state
+
+    def get(self, serial):
+        """Get the :py:class:`RegisteredCA` for the CA with the given serial (without colons).
+
+        Raises ``CertificateAuthority.DoesNotExist`` if there is no such CA.
+        """
+        try:
+            return self._get_state().by_serial[serial]
+        except KeyError:
+            raise CertificateAuthority.DoesNotExist('%s: Certificate authority not found.' % serial)
+
+    def get_by_serial_or_cn(self, identifier):
+        """Same as :py:meth:`CertificateAuthorityQuerySet.get_by_serial_or_cn
+        <django_ca.querysets.CertificateAuthorityQuerySet.get_by_serial_or_cn>`, but returns a
+        :py:class:`RegisteredCA`."""
+
+        identifier = identifier.strip()
+        serial = identifier.upper()
+
+        # NOTE: see CertificateAuthorityQuerySet.get_by_serial_or_cn()
+        if identifier != '0':
+            serial = serial.lstrip('0')
+        serial = serial.replace(':', '')
+
+        entries = self._get_state().entries
+        matches = [e for e in entries if e.ca.serial == serial or e.ca.cn == identifier]
+        if not matches:
+            matches = [e for e in entries if e.ca.serial.startswith(serial) or e.ca.cn == identifier]
+
+        if not matches:
+            raise CertificateAuthority.DoesNotExist('%s: Certificate authority not found.' % identifier)
+        elif len(matches) > 1:
+            raise CertificateAuthority.MultipleObjectsReturned(
+                '%s: Found %s certificate authorities.' % (identifier, len(matches)))
+        return matches[0]
+
+    def get_by_issuer_hash(self, algorithm, name_hash, key_hash):
+        """Get the :py:class:`RegisteredCA` identified by the issuer name and key hash of a ``CertID`` in an
+        OCSP request.
+
+        `algorithm` is the name of the hash algorithm (``"sha1"`` or ``"sha256"``). Raises
+        ``CertificateAuthority.DoesNotExist`` if there is no such CA.
+        """
+        try:
+            return self._get_state().by_issuer_hash[(algorithm, name_hash, key_hash)]
+        except KeyError:
+            raise CertificateAuthority.DoesNotExist('Certificate authority with the given hashes not found.')
+
+    def get_entry(self, ca):
+        """Get the :py:class:`RegisteredCA` for the given :py:class:`~django_ca.models.CertificateAuthority`.
+
+        If `ca` was not loaded from the registry (e.g. because a view overrides ``get_ca()``), a new instance
+        is returned that is not stored in the registry.
+        """
+        state = self._state
+        if state is not None:
+            entry = state.by_serial.get(ca.serial)
+            if entry is not None and entry.ca is ca:
+                return entry
+        return RegisteredCA(ca)
+
+    def invalidate(self):
+        """Invalidate the registry in this and all other processes."""
+
+        self._state = None
+        cache.set(VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+
+
+ca_registry = CARegistry()
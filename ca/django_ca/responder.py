@@ -0,0 +1,311 @@
+# This file is part of django-ca (https://github.com/mathiasertl/django-ca).
+#
+# django-ca is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# django-ca is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with django-ca.  If not,
+# see <http://www.gnu.org/licenses/>.
+
+"""Standalone OCSP responder serving responses from a snapshot created by ``manage.py export_ocsp_snapshot``.
+
+The responder needs neither a database nor a configured Django project, start it with::
+
+    python -m django_ca.responder /var/lib/django-ca/ocsp-snapshot --port 8080
+
+A snapshot directory contains one subdirectory per exported snapshot and a symlink called ``current``
+pointing to the most recent one. The responder checks the symlink on every request and loads a new snapshot
+completely before using it, so snapshots can be updated at any time without restarting the responder.
+"""
+
+import argparse
+import asyncio
+import base64
+import binascii
+import json
+import logging
+import os
+import shutil
+import time
+from email.utils import formatdate
+from urllib.parse import unquote
+
+from asn1crypto import ocsp as asn1_ocsp
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives.serialization import load_pem_private_key
+from cryptography.x509 import load_pem_x509_certificate
+
+from .ocsp import OCSPResponder
+from .ocsp import get_issuer_hashes
+from .status_index import StatusIndex
+from .status_index import get_index_path
+
+log = logging.getLogger(__name__)
+
+CURRENT = 'current'
+MANIFEST = 'manifest.json'
+SNAPSHOT_VERSION = 1
+
+MAX_REQUEST_SIZE = 65536
+STATUS_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                  413: 'Payload Too Large'}
+
+
+def get_ca_paths(path, serial):
+    """Get the paths of the CA certificate, responder key and responder certificate of the CA with the given
+    serial in the snapshot stored at `path`."""
+
+    serial = serial.replace(':', '')
+    return (os.path.join(path, '%s.pem' % serial), os.path.join(path, '%s.responder.key' % serial),
+            os.path.join(path, '%s.responder.pem' % serial))
+
+
+def publish_snapshot(directory, path):
+    """Make the snapshot at `path` (a subdirectory of `directory`) the current snapshot.
+
+    The ``current`` symlink is replaced atomically. Older snapshots, except for the previous one (that might
+    still be used by a responder that has not yet seen the new snapshot), are removed.
+    """
+    current = os.path.join(directory, CURRENT)
+    previous = os.path.realpath(current) if os.path.islink(current) else None
+
+    tmp_link = '%s.tmp' % current
+    if os.path.lexists(tmp_link):
+        os.unlink(tmp_link)
+    os.symlink(os.path.basename(path), tmp_link)
+    os.replace(tmp_link, current)
+
+    keep = {os.path.realpath(path), previous}
+    for name in os.listdir(directory):
+        snapshot = os.path.join(directory, name)
+        if name != CURRENT and os.path.isdir(snapshot) and os.path.realpath(snapshot) not in keep:
+            shutil.rmtree(snapshot)
+
+
+class SnapshotCA:
+    """A certificate authority loaded from a snapshot."""
+
+    def __init__(self, path, serial):
+        ca_path, key_path, cert_path = get_ca_paths(path, serial)
+
+        self.serial = serial
+        with open(ca_path, 'rb') as stream:
+            self.x509 = load_pem_x509_certificate(stream.read(), default_backend())
+        with open(key_path, 'rb') as stream:
+            self.responder_key = load_pem_private_key(stream.read(), None, default_backend())
+        with open(cert_path, 'rb') as stream:
+            self.responder_cert = load_pem_x509_certificate(stream.read(), default_backend())
+
+        self.issuer_hashes = get_issuer_hashes(self.x509)
+        self.indexes = [StatusIndex(get_index_path(path, serial, scope=scope)) for scope in ('user', 'ca')]
+
+
+class Snapshot:
+    """A snapshot stored at `path`."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MANIFEST)) as stream:
+            manifest = json.load(stream)
+        if manifest.get('version') != SNAPSHOT_VERSION:
+            raise ValueError('%s: Unsupported snapshot version.' % path)
+
+        self.cas = [SnapshotCA(path, serial) for serial in manifest['cas']]
+        self.by_issuer_hash = {}
+        for ca in self.cas:
+            for algorithm, hashes in ca.issuer_hashes.items():
+                self.by_issuer_hash.setdefault((algorithm, ) + hashes, ca)
+
+
+class SnapshotResponder(OCSPResponder):
+    """OCSP responder for all CAs in the snapshot directory `directory`.
+
+    Like :py:class:`~django_ca.views.UnifiedOCSPView`, the CA is selected using the issuer hashes in the
+    request.
+    """
+
+    log = log
+
+    def __init__(self, directory, expires=3600, prefix='/'):
+        self.directory = directory
+        self.expires = expires
+        self.prefix = prefix
+        self._snapshot = None
+        self._ca = None
+
+    def get_snapshot(self):
+        """Get the current snapshot, loading it if it has changed since the last call.
+
+        If a new snapshot cannot be loaded, the previous snapshot continues to be used.
+        """
+        path = os.path.realpath(os.path.join(self.directory, CURRENT))
+        if self._snapshot is None or self._snapshot.path != path:
+            try:
+                self._snapshot = Snapshot(path)
+            except Exception as e:
+                if self._snapshot is None:
+                    raise
+                log.exception(e)
+        return self._snapshot
+
+    def get_scope(self):
+        return None  # both end-entity certificates and intermediate CAs are answered
+
+    def get_issuer(self, cert_ids):
+        try:
+            snapshot = self.get_snapshot()
+        except Exception as e:
+            log.exception(e)
+            return None
+
+        issuers = set()
+        for cert_id in cert_ids:
+            key = (cert_id['hash_algorithm']['algorithm'].native, cert_id['issuer_name_hash'].native,
+                   cert_id['issuer_key_hash'].native)
+            if key not in snapshot.by_issuer_hash:
+                log.warning('OCSP request for certificate issued by an unknown CA received.')
+                return None
+            issuers.add(snapshot.by_issuer_hash[key])
+
+        if len(issuers) > 1:
+            log.warning('OCSP request for certificates issued by different CAs received.')
+            return None
+
+        self._ca = issuers.pop()
+        return self._ca
+
+    def get_certs(self, ca, serials):
+        certs = {}
+        for serial in serials:
+            for index in ca.indexes:
+                status = index.get(int(serial, 16))
+                if status is not None:
+                    certs[serial] = status
+                    break
+        return certs
+
+    def get_cached_response(self, ca, serial):
+        return None
+
+    def get_responder_key(self):
+        return self._ca.responder_key
+
+    def get_responder_cert(self):
+        return self._ca.responder_cert
+
+    def http_response(self, data, status=200):
+        return status, {'Content-Type': 'application/ocsp-response'}, data
+
+    def handle_request(self, method, path, body):
+        """Handle an HTTP request and return a tuple of status code, headers and body.
+
+        GET requests contain the base64 encoded OCSP request in the `path` (after the configured prefix), POST
+        requests in the body.
+        """
+        if not path.startswith(self.prefix):
+            return 404, {}, b''
+
+        if method == 'GET':
+            try:
+                data = base64.b64decode(unquote(path[len(self.prefix):]), validate=True)
+            except (binascii.Error, ValueError):
+                return self.malformed_request()
+        elif method == 'POST':
+            data = body
+        else:
+            return 405, {'Allow': 'GET, POST'}, b''
+
+        try:
+            status, headers, content = self.process_ocsp_request(data)
+        except Exception as e:
+            log.exception(e)
+            return self.fail()
+
+        # Successful responses to GET requests may be cached by HTTP caches (see RFC 5019)
+        ocsp_response = asn1_ocsp.OCSPResponse.load(content)
+        if method == 'GET' and ocsp_response['response_status'].native == 'successful':
+            single_response = ocsp_response.response_data['responses'][0]
+            this_update = single_response['this_update'].native.timestamp()
+            next_update = single_response['next_update'].native.timestamp()
+            headers['Last-Modified'] = formatdate(this_update, usegmt=True)
+            headers['Expires'] = formatdate(next_update, usegmt=True)
+            headers['Cache-Control'] = 'max-age=%d, public, no-transform, must-revalidate' % max(
+                next_update - time.time(), 0)
+        return status, headers, content
+
+    async def handle_connection(self, reader, writer):
+        """Handle a HTTP/1.1 connection, used as callback for :py:func:`asyncio.start_server`."""
+
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, version = request_line.decode('latin1').split()
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _sep, value = line.decode('latin1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length', 0))
+                if length > MAX_REQUEST_SIZE:
+                    status, response_headers, content = 413, {}, b''
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length)
+                    status, response_headers, content = self.handle_request(method, path, body)
+                    keep_alive = version == 'HTTP/1.1' and headers.get('connection') != 'close'
+
+                response_headers['Content-Length'] = str(len(content))
+                response_headers['Connection'] = 'keep-alive' if keep_alive else 'close'
+                head = ['HTTP/1.1 %s %s' % (status, STATUS_REASONS.get(status, ''))]
+                head += ['%s: %s' % (name, value) for name, value in response_headers.items()]
+                writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin1') + content)
+                await writer.drain()
+
+                if not keep_alive:
+                    break
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass  # malformed request or the client went away
+        finally:
+            writer.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Standalone OCSP responder serving a snapshot exported with '
+                                                 '"manage.py export_ocsp_snapshot".')
+    parser.add_argument('directory', help='The directory the snapshot was exported to.')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on (default: %(default)s).')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on (default: %(default)s).')
+    parser.add_argument('--expires', type=int, default=3600, metavar='SECONDS',
+                        help='Time in seconds that responses remain valid (default: %(default)s).')
+    parser.add_argument('--prefix', default='/', help='URL path of the responder (default: %(default)s).')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    responder = SnapshotResponder(args.directory, expires=args.expires, prefix=args.prefix)
+    responder.get_snapshot()  # fail early if there is no valid snapshot
+
+    loop = asyncio.get_event_loop()
+    server = loop.run_until_complete(asyncio.start_server(responder.handle_connection, args.host, args.port))
+    log.info('Serving OCSP on %s:%s', args.host, args.port)
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:  # pragma: no cover
+        pass
+    finally:
+        server.close()
+        loop.run_until_complete(server.wait_closed())
+        loop.close()
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
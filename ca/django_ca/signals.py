@@ -69,6 +69,19 @@ cert : :py:class:`~django_ca.models.Certificate`
     The certificate that was just issued.
 """
 
+post_issue_certs = django.dispatch.Signal(providing_args=['certs'])
+"""Called after many certificates were issued with
+:py:meth:`~django_ca.managers.CertificateManager.create_certs`.
+
+Note that :py:data:`post_issue_cert` is also called for every certificate.
+
+Parameters
+----------
+
+certs : list of :py:class:`~django_ca.models.Certificate`
+    The certificates that were just issued.
+"""
+
 pre_revoke_cert = django.dispatch.Signal(providing_args=['cert', 'reason'])
 """Called before a certificate is revoked.
 
@@ -0,0 +1,278 @@
+# This file is part of django-ca (https://github.com/mathiasertl/django-ca).
+#
+# django-ca is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# django-ca is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with django-ca.  If not,
+# see <http://www.gnu.org/licenses/>.
+
+"""Compact, memory-mapped index of certificate statuses used by OCSP responders.
+
+An index consists of two files: A sorted base file with one fixed-size record per certificate that is
+searched with a binary search and a journal that records issued and revoked certificates since the base
+file was last built. Both files carry a *generation* in their header, so readers can cheaply detect that the
+index was rebuilt.
+
+This module intentionally does not use Django, so that it can also be used outside of a Django project.
+"""
+
+import calendar
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # e.g. on Windows, only one process may write to the index
+
+BASE_MAGIC = b'DCAIDX01'
+JOURNAL_MAGIC = b'DCAJRN01'
+
+# magic, generation, number of records
+HEADER = struct.Struct('>8sQQ8x')
+
+# serial, revocation timestamp, revoked, reason code
+RECORD = struct.Struct('>20sqBB2x')
+
+# Reason codes as defined in RFC 5280, section 5.3.1 (code 7 is not used).
+REASON_CODES = {
+    'unspecified': 0,
+    'key_compromise': 1,
+    'ca_compromise': 2,
+    'affiliation_changed': 3,
+    'superseded': 4,
+    'cessation_of_operation': 5,
+    'certificate_hold': 6,
+    'remove_from_crl': 8,
+    'privilege_withdrawn': 9,
+    'aa_compromise': 10,
+}
+REASON_NAMES = {v: k for k, v in REASON_CODES.items()}
+
+
+class Status(namedtuple('Status', ['revoked', 'revoked_reason', 'revocation_time'])):
+    """Status of a certificate as stored in the index.
+
+    The interface mirrors the revocation related attributes of :py:class:`~django_ca.models.Certificate`, so
+    instances can be passed to :py:func:`django_ca.ocsp.get_response`.
+    """
+
+    def get_revocation_time(self):
+        return self.revocation_time
+
+
+def _pack(serial, revocation_time=None, reason=None):
+    if revocation_time is None:
+        return RECORD.pack(serial.to_bytes(20, 'big'), 0, 0, 0)
+
+    timestamp = calendar.timegm(revocation_time.utctimetuple())
+    return RECORD.pack(serial.to_bytes(20, 'big'), timestamp, 1, REASON_CODES.get(reason, 0))
+
+
+def _unpack(record):
+    _serial, timestamp, revoked, reason = RECORD.unpack(record)
+    if not revoked:
+        return Status(False, '', None)
+    return Status(True, REASON_NAMES.get(reason, 'unspecified'), datetime.utcfromtimestamp(timestamp))
+
+
+class StatusIndex:
+    """Status index stored at `path` (the journal is stored at ``path + ".journal"``).
+
+    Writers use :py:meth:`build` to write a new index and :py:meth:`update` to add single certificates to the
+    journal. Readers use :py:meth:`get`, which maps the base file into memory and reloads it (and the journal)
+    only if it changed on disk. Instances are thread-safe.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.journal_path = '%s.journal' % path
+        self.lock_path = '%s.lock' % path
+
+        self._lock = threading.Lock()
+        self._stat = None
+        self._mmap = None
+        self._count = 0
+        self._generation = None
+        self._journal = {}
+        self._journal_offset = 0
+
+    @contextmanager
+    def _write_lock(self):
+        with open(self.lock_path, 'ab') as stream:
+            if fcntl is not None:
+                fcntl.flock(stream, fcntl.LOCK_EX)
+            yield
+
+    def _write(self, path, data):
+        tmp_path = '%s.tmp' % path
+        with open(tmp_path, 'wb') as stream:
+            stream.write(data)
+        os.replace(tmp_path, path)
+
+    def build(self, entries):
+        """Replace the index with the given entries.
+
+        `entries` is an iterable of ``(serial, revocation_time, reason)`` tuples, where `serial` is an
+        ``int``, `revocation_time` is a naive datetime in UTC (or ``None`` if the certificate is not revoked)
+        and `reason` is the name of a :py:class:`~django_ca.constants.ReasonFlags` member. Serials that are
+        too large to be stored are skipped.
+
+        `entries` is consumed while holding the write lock, so that :py:meth:`update` cannot add a status to
+        the journal between reading entries and truncating the journal. If `entries` is a (lazy) database
+        query, any status added to the journal before is thus also included in the query results.
+        """
+        with self._write_lock():
+            records = []
+            for serial, revocation_time, reason in entries:
+                try:
+                    records.append(_pack(serial, revocation_time, reason))
+                except OverflowError:
+                    continue  # not a valid serial, so we do not have to return a status for it
+
+            # Records start with the big-endian serial, so sorting records sorts them by serial.
+            records.sort()
+            generation = int(time.time() * 1000000)
+
+            self._write(self.path, HEADER.pack(BASE_MAGIC, generation, len(records)) + b''.join(records))
+            self._write(self.journal_path, HEADER.pack(JOURNAL_MAGIC, generation, 0))
+
+    def update(self, serial, revocation_time=None, reason=None):
+        """Add or update the status of a single certificate.
+
+        Returns ``False`` if the index was never built, in which case nothing is written.
+        """
+        try:
+            record = _pack(serial, revocation_time, reason)
+        except OverflowError:
+            return False
+
+        with self._write_lock():
+            if not os.path.exists(self.journal_path):
+                return False
+
+            with open(self.journal_path, 'ab') as stream:
+                stream.write(record)
+        return True
+
+    def _reset(self):
+        if self._mmap is not None:
+            self._mmap.close()
+        self._stat = self._mmap = self._generation = None
+        self._count = self._journal_offset = 0
+        self._journal = {}
+
+    def _refresh(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._reset()
+            return False
+
+        if self._stat != (stat.st_ino, stat.st_mtime_ns, stat.st_size):
+            self._reset()
+            with open(self.path, 'rb') as stream:
+                self._mmap = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, self._generation, self._count = HEADER.unpack_from(self._mmap)
+            if magic != BASE_MAGIC:
+                self._reset()
+                return False
+            self._stat = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+        try:
+            size = os.stat(self.journal_path).st_size
+        except FileNotFoundError:
+            size = 0
+
+        if self._journal_offset == 0:
+            if size < HEADER.size:
+                return True
+
+            with open(self.journal_path, 'rb') as stream:
+                magic, generation, _count = HEADER.unpack(stream.read(HEADER.size))
+            if magic != JOURNAL_MAGIC or generation != self._generation:
+                return True  # journal of a different generation, the index is currently being rebuilt
+            self._journal_offset = HEADER.size
+
+        # only read complete records, the rest is read once it is fully written
+        length = (size - self._journal_offset) // RECORD.size * RECORD.size
+        if length > 0:
+            with open(self.journal_path, 'rb') as stream:
+                stream.seek(self._journal_offset)
+                data = stream.read(length)
+
+            for pos in range(0, len(data), RECORD.size):
+                self._journal[data[pos:pos + 20]] = data[pos:pos + RECORD.size]
+            self._journal_offset += len(data)
+
+        return True
+
+    def _search(self, key):
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            pos = HEADER.size + middle * RECORD.size
+            current = self._mmap[pos:pos + 20]
+            if current < key:
+                low = middle + 1
+            elif current > key:
+                high = middle
+            else:
+                return self._mmap[pos:pos + RECORD.size]
+
+    def get(self, serial):
+        """Get the :py:class:`Status` for the given serial (an ``int``).
+
+        Returns ``None`` if the index does not exist or the serial is not in the index.
+        """
+        try:
+            key = serial.to_bytes(20, 'big')
+        except OverflowError:
+            return None
+
+        with self._lock:
+            if self._refresh() is False:
+                return None
+
+            record = self._journal.get(key)
+            if record is None:
+                record = self._search(key)
+
+        if record is not None:
+            return _unpack(record)
+
+
+_indexes = {}
+
+
+def get_index_path(directory, serial, scope='user'):
+    """Get the path of the index for the CA with the given serial in `directory`.
+
+    `scope` is ``"user"`` for the index of end-entity certificates and ``"ca"`` for the index of intermediate
+    CAs.
+    """
+    return os.path.join(directory, '%s.%s.idx' % (serial.replace(':', ''), scope))
+
+
+def get_status_index(directory, serial, scope='user'):
+    """Get the (per-process) :py:class:`StatusIndex` for the CA with the given serial.
+
+    `scope` is ``"user"`` for the index of end-entity certificates and ``"ca"`` for the index of intermediate
+    CAs.
+    """
+    path = get_index_path(directory, serial, scope=scope)
+    index = _indexes.get(path)
+    if index is None:
+        index = _indexes.setdefault(path, StatusIndex(path))
+    return index
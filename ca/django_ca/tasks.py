@@ -13,6 +13,8 @@
 
 from . import ca_settings
 from .models import CertificateAuthority
+from .utils import key_pool
+from .utils import validate_key_parameters
 
 try:
     from celery import shared_task
@@ -59,7 +61,45 @@ def generate_ocsp_key(serial, **kwargs):
 
 @shared_task
 def generate_ocsp_keys(**kwargs):
+    cas = list(CertificateAuthority.objects.usable())
+
+    if ca_settings.CA_KEY_POOL_SIZE:
+        # Generate private keys for all CAs in parallel, using the same parameters as generate_ocsp_key()
+        pool_params = {}
+        for ca in cas:
+            key_size, key_type, ecc_curve = ca.get_ocsp_key_parameters(
+                password=kwargs.get('password'), key_size=kwargs.get('key_size'),
+                key_type=kwargs.get('key_type'), ecc_curve=kwargs.get('ecc_curve'))
+            curve_name = type(ecc_curve).__name__ if key_type == 'ECC' else None
+            params, count = pool_params.get((key_size, key_type, curve_name),
+                                            ((key_size, key_type, ecc_curve), 0))
+            pool_params[(key_size, key_type, curve_name)] = params, count + 1
+
+        for params, count in pool_params.values():
+            key_pool.fill(*params, count=count, wait=True)
+
     keys = []
-    for serial in CertificateAuthority.objects.usable().values_list('serial', flat=True):
-        keys.append(generate_ocsp_key(serial, **kwargs))
+    for ca in cas:
+        keys.append(generate_ocsp_key(ca.serial, **kwargs))
     return keys
+
+
+@shared_task
+def fill_key_pool(key_size=None, key_type='RSA', ecc_curve=None, count=None):
+    key_size, key_type, ecc_curve = validate_key_parameters(key_size, key_type, ecc_curve)
+    key_pool.fill(key_size, key_type, ecc_curve, count=count, wait=True)
+
+
+@shared_task
+def cache_ocsp_response(serial, **kwargs):
+    ca = CertificateAuthority.objects.get(serial=serial)
+    ca.cache_ocsp_responses(**kwargs)
+
+
+@shared_task
+def cache_ocsp_responses(serials=None, **kwargs):
+    if not serials:
+        serials = CertificateAuthority.objects.usable().values_list('serial', flat=True)
+
+    for serial in serials:
+        run_task(cache_ocsp_response, serial, **kwargs)
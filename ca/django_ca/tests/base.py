@@ -72,6 +72,7 @@ from ..extensions import SubjectKeyIdentifier
 from ..models import Certificate
 from ..models import CertificateAuthority
 from ..models import X509CertMixin
+from ..ocsp import responder_cache
 from ..signals import post_create_ca
 from ..signals import post_issue_cert
 from ..signals import post_revoke_cert
@@ -385,6 +386,7 @@ class DjangoCATestCaseMixin:
     def tearDown(self):
         super().tearDown()
         cache.clear()
+        responder_cache.clear()
 
     def tmpcadir(self, **kwargs):
         """Context manager to use a temporary CA dir."""
@@ -823,6 +825,12 @@ class DjangoCATestCaseMixin:
         with patch('celery.app.task.Task.apply_async') as mock:
             yield mock
 
+    @contextmanager
+    def on_commit(self):
+        # Tests run in a transaction that is never committed, so run on_commit() callbacks immediately
+        with patch('django.db.transaction.on_commit', side_effect=lambda func: func()) as mock:
+            yield mock
+
 
 class DjangoCATestCase(DjangoCATestCaseMixin, TestCase):
     pass
@@ -0,0 +1,67 @@
+# This file is part of django-ca (https://github.com/mathiasertl/django-ca).
+#
+# django-ca is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# django-ca is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with django-ca.  If not,
+# see <http://www.gnu.org/licenses/>
+
+import os
+import tempfile
+
+from ..status_index import Status
+from ..status_index import get_status_index
+from .base import DjangoCAWithCertTestCase
+from .base import override_settings
+
+
+class BuildOCSPIndexTestCase(DjangoCAWithCertTestCase):
+    def setUp(self):
+        super(BuildOCSPIndexTestCase, self).setUp()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.index_dir = os.path.join(self.tmpdir.name, 'index')  # does not exist yet
+
+    def tearDown(self):
+        super(BuildOCSPIndexTestCase, self).tearDown()
+        self.tmpdir.cleanup()
+
+    def test_basic(self):
+        cert = self.certs['child-cert']
+        cert.revoke()
+
+        with self.settings(CA_OCSP_INDEX_DIR=self.index_dir):
+            stdout, stderr = self.cmd('build_ocsp_index')
+        self.assertEqual(stdout, '')
+        self.assertEqual(stderr, '')
+
+        index = get_status_index(self.index_dir, self.cas['child'].serial)
+        revocation_time = cert.get_revocation_time().replace(microsecond=0)
+        self.assertEqual(index.get(cert.x509.serial_number), Status(True, 'unspecified', revocation_time))
+
+        # child CAs are in the "ca" index of their parent
+        index = get_status_index(self.index_dir, self.cas['root'].serial, scope='ca')
+        self.assertEqual(index.get(self.cas['child'].x509.serial_number), Status(False, '', None))
+
+        for name, ca in self.cas.items():
+            self.assertTrue(os.path.exists(os.path.join(self.index_dir, '%s.user.idx' % ca.serial)))
+
+    def test_serial(self):
+        ca = self.cas['child']
+        with self.settings(CA_OCSP_INDEX_DIR=self.index_dir):
+            stdout, stderr = self.cmd('build_ocsp_index', ca.serial)
+        self.assertEqual(stdout, '')
+        self.assertEqual(stderr, '')
+        self.assertCountEqual(os.listdir(self.index_dir), [
+            '%s.%s.idx%s' % (ca.serial, scope, ext)
+            for scope in ['user', 'ca'] for ext in ['', '.journal', '.lock']
+        ])
+
+    @override_settings(CA_OCSP_INDEX_DIR=None)
+    def test_not_configured(self):
+        with self.assertCommandError(r'^CA_OCSP_INDEX_DIR is not configured\.$'):
+            self.cmd('build_ocsp_index')
@@ -0,0 +1,52 @@
+# This file is part of django-ca (https://github.com/mathiasertl/django-ca).
+#
+# django-ca is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# django-ca is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with django-ca.  If not,
+# see <http://www.gnu.org/licenses/>
+
+from datetime import datetime
+from datetime import timedelta
+
+from django.core.cache import cache
+
+from freezegun import freeze_time
+
+from .base import DjangoCAWithGeneratedCAsTestCase
+from .base import override_tmpcadir
+from .base import timestamps
+
+
+@freeze_time(timestamps['everything_valid'])
+class CacheOCSPResponsesTestCase(DjangoCAWithGeneratedCAsTestCase):
+    @override_tmpcadir(CA_DEFAULT_KEY_SIZE=1024)
+    def test_basic(self):
+        for ca in self.cas.values():
+            ca.generate_ocsp_key()
+
+        stdout, stderr = self.cmd('cache_ocsp_responses')
+        self.assertEqual(stdout, '')
+        self.assertEqual(stderr, '')
+
+        for ca in self.cas.values():
+            if ca.parent is not None:
+                responder_serial, next_update, response = cache.get(ca.ocsp_response_cache_key)
+                self.assertEqual(next_update, datetime.utcnow() + timedelta(seconds=86400))
+
+    @override_tmpcadir(CA_DEFAULT_KEY_SIZE=1024)
+    def test_serial(self):
+        ca = self.cas['root']
+        ca.generate_ocsp_key()
+
+        stdout, stderr = self.cmd('cache_ocsp_responses', ca.serial, expires=3600)
+        self.assertEqual(stdout, '')
+        self.assertEqual(stderr, '')
+
+        responder_serial, next_update, response = cache.get(self.cas['child'].ocsp_response_cache_key)
+        self.assertEqual(next_update, datetime.utcnow() + timedelta(seconds=3600))
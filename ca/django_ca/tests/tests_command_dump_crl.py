@@ -156,6 +156,27 @@ class DumpCRLTestCase(DjangoCAWithCertTestCase):
         self.assertEqual(crl[0].extensions[0].oid, CRLEntryExtensionOID.INVALIDITY_DATE)
         self.assertEqual(crl[0].extensions[0].value.invalidity_date, stamp.replace(tzinfo=None))
 
+    @freeze_time(timestamps['everything_valid'])
+    @override_tmpcadir()
+    def test_delta(self):
+        with self.assertCommandError(r'^Cannot generate a delta CRL before a complete CRL'):
+            self.cmd('dump_crl', ca=self.ca, scope='user', delta=True, stdout=BytesIO(), stderr=BytesIO())
+
+        # A complete CRL written to a file is not published, so delta CRLs cannot refer to it
+        self.cmd('dump_crl', ca=self.ca, scope='user', stdout=BytesIO(), stderr=BytesIO())
+        with self.assertCommandError(r'^Cannot generate a delta CRL before a complete CRL'):
+            self.cmd('dump_crl', ca=self.ca, scope='user', delta=True, stdout=BytesIO(), stderr=BytesIO())
+
+        self.ca.cache_crls()
+        stdout, stderr = self.cmd('dump_crl', ca=self.ca, scope='user', delta=True,
+                                  stdout=BytesIO(), stderr=BytesIO())
+        self.assertEqual(stderr, b'')
+
+        crl = x509.load_pem_x509_crl(stdout, default_backend())
+        self.assertEqual(list(crl), [])
+        self.assertEqual(crl.extensions.get_extension_for_class(x509.DeltaCRLIndicator).value.crl_number, 1)
+        self.assertEqual(crl.extensions.get_extension_for_class(x509.CRLNumber).value.crl_number, 2)
+
     @override_tmpcadir()
     def test_ca_crl(self):
         ca = self.cas['root']
@@ -0,0 +1,100 @@
+# This file is part of django-ca (https://github.com/mathiasertl/django-ca).
+#
+# django-ca is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# django-ca is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with django-ca.  If not,
+# see <http://www.gnu.org/licenses/>.
+
+
+import json
+import os
+import tempfile
+
+from freezegun import freeze_time
+
+from ..responder import CURRENT
+from ..responder import MANIFEST
+from ..status_index import Status
+from ..status_index import StatusIndex
+from ..status_index import get_index_path
+from .base import DjangoCAWithCertTestCase
+from .base import override_settings
+from .base import override_tmpcadir
+from .base import timestamps
+
+
+@freeze_time(timestamps['everything_valid'])
+@override_settings(CA_DEFAULT_KEY_SIZE=1024)
+class ExportOCSPSnapshotTestCase(DjangoCAWithCertTestCase):
+    def setUp(self):
+        super(ExportOCSPSnapshotTestCase, self).setUp()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'snapshot')  # does not exist yet
+
+    def tearDown(self):
+        super(ExportOCSPSnapshotTestCase, self).tearDown()
+        self.tmpdir.cleanup()
+
+    @override_tmpcadir()
+    def test_basic(self):
+        ca = self.cas['child']
+        cert = self.certs['child-cert']
+        ca.generate_ocsp_key()
+        cert.revoke()
+
+        stdout, stderr = self.cmd('export_ocsp_snapshot', self.path, ca.serial)
+        self.assertEqual(stdout, '')
+        self.assertEqual(stderr, '')
+
+        current = os.path.join(self.path, CURRENT)
+        self.assertTrue(os.path.islink(current))
+        with open(os.path.join(current, MANIFEST)) as stream:
+            self.assertEqual(json.load(stream), {'version': 1, 'cas': [ca.serial]})
+
+        self.assertTrue(os.path.exists(os.path.join(current, '%s.pem' % ca.serial)))
+        self.assertTrue(os.path.exists(os.path.join(current, '%s.responder.pem' % ca.serial)))
+        key_path = os.path.join(current, '%s.responder.key' % ca.serial)
+        self.assertEqual(os.stat(key_path).st_mode & 0o777, 0o600)
+
+        index = StatusIndex(get_index_path(current, ca.serial))
+        revocation_time = cert.get_revocation_time().replace(microsecond=0)
+        self.assertEqual(index.get(cert.x509.serial_number), Status(True, 'unspecified', revocation_time))
+
+    @override_tmpcadir()
+    def test_skip_cas_without_key(self):
+        self.cas['child'].generate_ocsp_key()
+        stdout, stderr = self.cmd('export_ocsp_snapshot', self.path)
+        self.assertEqual(stdout, '')
+        self.assertEqual(stderr.splitlines(), [
+            '%s: OCSP responder key not found, skipping.' % ca.serial
+            for ca in self.cas.values() if ca.name != 'child'
+        ])
+
+        with open(os.path.join(self.path, CURRENT, MANIFEST)) as stream:
+            self.assertEqual(json.load(stream)['cas'], [self.cas['child'].serial])
+
+    @override_tmpcadir()
+    def test_old_snapshots(self):
+        ca = self.cas['child']
+        ca.generate_ocsp_key()
+
+        snapshots = []
+        for i in range(3):
+            self.cmd('export_ocsp_snapshot', self.path, ca.serial)
+            snapshots.append(os.readlink(os.path.join(self.path, CURRENT)))
+
+        # Only the current and the previous snapshot are kept
+        self.assertEqual(len(set(snapshots)), 3)
+        self.assertCountEqual(os.listdir(self.path), [CURRENT] + snapshots[1:])
+
+    @override_tmpcadir()
+    def test_no_keys(self):
+        with self.assertCommandError(r'^No CA with an OCSP responder key found\.$'):
+            self.cmd('export_ocsp_snapshot', self.path)
+        self.assertEqual(os.listdir(self.path), [])
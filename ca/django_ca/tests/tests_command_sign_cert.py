@@ -11,16 +11,20 @@
 # You should have received a copy of the GNU General Public License along with django-ca.  If not,
 # see <http://www.gnu.org/licenses/>
 
+import json
 import os
 import stat
+import tarfile
 import unittest
 from datetime import datetime
 from datetime import timedelta
+from io import BytesIO
 from io import StringIO
 
 from cryptography.hazmat.primitives.serialization import Encoding
 
 from django.core.files.storage import FileSystemStorage
+from django.db import DatabaseError
 
 from freezegun import freeze_time
 
@@ -440,6 +444,128 @@ class SignCertTestCase(DjangoCAWithGeneratedCAsTestCase):
         self.assertFalse(pre.called)
         self.assertFalse(post.called)
 
+    @override_tmpcadir()
+    def test_batch_json(self):
+        csr = certs['root-cert']['csr']
+        child_csr = certs['child-cert']['csr']
+        stdin = StringIO('\n'.join([
+            json.dumps({'name': 'first', 'csr': csr['pem'], 'subject': '/CN=example.com'}),
+            json.dumps({'csr': child_csr['pem'], 'alt': ['example.net']}),
+            '',
+            json.dumps({'name': 'bogus', 'csr': 'bogus'}),
+            'no json',
+        ]))
+        stdout = StringIO()
+        stderr = StringIO()
+
+        with self.assertCommandError(r'^2 of 4 CSRs could not be signed\.$'), \
+                self.assertSignal(pre_issue_cert) as pre, self.assertSignal(post_issue_cert) as post:
+            self.cmd('sign_cert', ca=self.ca, batch='json', stdin=stdin, stdout=stdout, stderr=stderr)
+        self.assertEqual(pre.call_count, 2)
+        self.assertEqual(post.call_count, 2)
+        self.assertEqual(stderr.getvalue().count('\n'), 2)
+        self.assertTrue(stderr.getvalue().startswith('bogus: '))
+        self.assertIn('\nline 5: ', stderr.getvalue())
+
+        lines = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        self.assertEqual([line['name'] for line in lines], ['first', 'line 2'])
+
+        first = Certificate.objects.get(serial=lines[0]['serial'])
+        self.assertEqual(lines[0]['pub'], first.pub)
+        self.assertSignature([self.ca], first)
+        subject = Subject(csr['parsed'].subject)
+        subject['CN'] = 'example.com'
+        self.assertSubject(first.x509, subject)
+
+        second = Certificate.objects.get(serial=lines[1]['serial'])
+        self.assertEqual(lines[1]['pub'], second.pub)
+        self.assertSubject(second.x509, Subject(child_csr['parsed'].subject))
+        self.assertIn('DNS:example.net', second.subject_alternative_name)
+
+    @override_tmpcadir()
+    def test_batch_dir(self):
+        csr_dir = os.path.join(ca_settings.CA_DIR, 'csrs')
+        os.mkdir(csr_dir)
+        os.mkdir(os.path.join(csr_dir, 'subdir'))
+        for name in ['root-cert', 'child-cert']:
+            with open(os.path.join(csr_dir, '%s.csr' % name), 'w') as stream:
+                stream.write(certs[name]['csr']['pem'])
+
+        with self.assertSignal(pre_issue_cert) as pre, self.assertSignal(post_issue_cert) as post:
+            stdout, stderr = self.cmd('sign_cert', ca=self.ca, batch='dir', csr=csr_dir,
+                                      watch=['user@example.com'], subject=Subject([('C', 'AT')]))
+        self.assertEqual(stderr, '')
+        self.assertEqual(pre.call_count, 2)
+        self.assertEqual(post.call_count, 2)
+
+        lines = [json.loads(line) for line in stdout.splitlines()]
+        self.assertEqual([line['name'] for line in lines], ['child-cert.csr', 'root-cert.csr'])
+        for line, name in zip(lines, ['child-cert', 'root-cert']):
+            cert = Certificate.objects.get(serial=line['serial'])
+            self.assertSignature([self.ca], cert)
+            subject = Subject(certs[name]['csr']['parsed'].subject)
+            subject['C'] = 'AT'
+            self.assertSubject(cert.x509, subject)
+            self.assertEqual([w.mail for w in cert.watchers.all()], ['user@example.com'])
+
+        # An unreadable file does not prevent signing other CSRs
+        def side_effect(path, *args, **kwargs):
+            if path.endswith('root-cert.csr'):
+                raise PermissionError(13, 'Permission denied')
+            return open(path, *args, **kwargs)
+
+        stdout = StringIO()
+        stderr = StringIO()
+        open_path = 'django_ca.management.commands.sign_cert.open'
+        with self.assertCommandError(r'^1 of 2 CSRs could not be signed\.$'), \
+                self.patch(open_path, side_effect=side_effect, create=True):
+            self.cmd('sign_cert', ca=self.ca, batch='dir', csr=csr_dir, stdout=stdout, stderr=stderr)
+        self.assertEqual(stderr.getvalue(), 'root-cert.csr: [Errno 13] Permission denied\n')
+        lines = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        self.assertEqual([line['name'] for line in lines], ['child-cert.csr'])
+
+        # Reading a directory requires --csr
+        with self.assertCommandError(r'^--csr is required when reading CSRs from a directory\.$'):
+            self.cmd('sign_cert', ca=self.ca, batch='dir')
+
+    @override_tmpcadir()
+    def test_batch_tar(self):
+        tar_stream = BytesIO()
+        with tarfile.open(fileobj=tar_stream, mode='w:gz') as tar:
+            for name, data in [('root-cert.der', certs['root-cert']['csr']['der']), ('bogus.der', b'bogus')]:
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tar.addfile(info, BytesIO(data))
+        tar_stream.seek(0)
+        stdout = StringIO()
+        stderr = StringIO()
+
+        with self.assertCommandError(r'^1 of 2 CSRs could not be signed\.$'), \
+                self.assertSignal(pre_issue_cert) as pre, self.assertSignal(post_issue_cert) as post:
+            self.cmd('sign_cert', ca=self.ca, batch='tar', csr_format=Encoding.DER, stdin=tar_stream,
+                     stdout=stdout, stderr=stderr, workers=2)
+        self.assertEqual(pre.call_count, 1)
+        self.assertEqual(post.call_count, 1)
+        self.assertTrue(stderr.getvalue().startswith('bogus.der: '))
+
+        # Certificates that cannot be saved are reported, other certificates are still saved
+        tar_stream.seek(0)
+        stdout = StringIO()
+        stderr = StringIO()
+        with self.assertCommandError(r'^2 of 2 CSRs could not be signed\.$'), \
+                self.patch('django_ca.managers.CertificateManager.bulk_create', side_effect=DatabaseError), \
+                self.patch_object(Certificate, 'save', side_effect=DatabaseError('save')):
+            self.cmd('sign_cert', ca=self.ca, batch='tar', csr_format=Encoding.DER, stdin=tar_stream,
+                     stdout=stdout, stderr=stderr)
+        self.assertIn('root-cert.der: save\n', stderr.getvalue())
+        self.assertEqual(stdout.getvalue(), '')
+
+        lines = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        self.assertEqual([line['name'] for line in lines], ['root-cert.der'])
+        cert = Certificate.objects.get(serial=lines[0]['serial'])
+        self.assertSignature([self.ca], cert)
+        self.assertSubject(cert.x509, Subject(certs['root-cert']['csr']['parsed'].subject))
+
     @override_tmpcadir()
     @freeze_time(timestamps['everything_valid'])
     def test_unusable_ca(self):
@@ -11,6 +11,10 @@
 # You should have received a copy of the GNU General Public License along with django-ca.  If not,
 # see <http://www.gnu.org/licenses/>.
 
+import threading
+
+from django.db import DatabaseError
+
 from .. import ca_settings
 from ..extensions import AuthorityKeyIdentifier
 from ..extensions import BasicConstraints
@@ -22,6 +26,9 @@ from ..extensions import TLSFeature
 from ..models import Certificate
 from ..models import CertificateAuthority
 from ..profiles import profiles
+from ..signals import post_issue_cert
+from ..signals import post_issue_certs
+from ..signals import pre_issue_cert
 from ..subject import Subject
 from .base import DjangoCATestCase
 from .base import DjangoCAWithGeneratedCAsTestCase
@@ -135,3 +142,110 @@ class CreateCertTestCase(DjangoCAWithGeneratedCAsTestCase):
         with self.assertRaisesRegex(KeyError, r"^'webserver'$"):
             Certificate.objects.create_cert(ca, csr, subject=subject, add_crl_url=False, add_ocsp_url=False,
                                             add_issuer_url=False)
+
+
+@override_settings(CA_DEFAULT_SUBJECT={})
+class CreateCertsTestCase(DjangoCAWithGeneratedCAsTestCase):
+    @override_tmpcadir(CA_PROFILES={ca_settings.CA_DEFAULT_PROFILE: {'extensions': {}}})
+    def test_basic(self):
+        ca = self.cas['root']
+        csr = certs['root-cert']['csr']['pem']
+        items = [(csr, '/CN=host%s.example.com' % i, None) for i in range(10)]
+        items.append((csr, '/CN=example.com', {SubjectAlternativeName.key: {'value': ['DNS:example.net']}}))
+
+        with self.assertSignal(post_issue_cert) as post, self.assertSignal(post_issue_certs) as post_many:
+            issued = Certificate.objects.create_certs(ca, items, workers=4)
+
+        self.assertEqual(len(issued), 11)
+        self.assertEqual(post.call_count, 11)
+        post_many.assert_called_once_with(certs=issued, signal=post_issue_certs, sender=Certificate)
+
+        for i, cert in enumerate(issued[:10]):
+            self.assertEqual(Certificate.objects.get(pk=cert.pk), cert)
+            self.assertEqual(cert.subject, Subject('/CN=host%s.example.com' % i))
+            self.assertEqual(cert.ca, ca)
+            self.assertEqual(cert.profile, ca_settings.CA_DEFAULT_PROFILE)
+            self.assertExtensions(cert, [
+                SubjectAlternativeName({'value': ['DNS:host%s.example.com' % i]}),
+            ])
+
+        self.assertExtensions(issued[10], [
+            SubjectAlternativeName({'value': ['DNS:example.net', 'DNS:example.com']}),
+        ])
+
+    @override_tmpcadir()
+    def test_pre_issue_cert(self):
+        ca = self.cas['root']
+        csr = certs['root-cert']['csr']['pem']
+        items = [(csr, '/CN=host%s.example.com' % i, None) for i in range(10)]
+        threads = set()
+
+        # Receivers are called in the calling thread, and before any certificate is signed
+        with self.assertSignal(pre_issue_cert) as pre, \
+                self.patch('cryptography.x509.CertificateBuilder.sign', side_effect=Exception('signed')):
+            pre.side_effect = lambda **kwargs: threads.add(threading.current_thread())
+            with self.assertRaisesRegex(Exception, r'^signed$'):
+                Certificate.objects.create_certs(ca, items, workers=4)
+        self.assertEqual(pre.call_count, 10)
+        self.assertEqual(threads, {threading.current_thread()})
+
+    @override_tmpcadir()
+    def test_error(self):
+        ca = self.cas['root']
+        csr = certs['root-cert']['csr']['pem']
+        items = [(csr, '/CN=example.com', None), (csr, None, None)]
+
+        count = Certificate.objects.count()
+        msg = r"^Must name at least a CN or a subjectAlternativeName\.$"
+        with self.assertSignal(post_issue_cert) as post, self.assertRaisesRegex(ValueError, msg):
+            Certificate.objects.create_certs(ca, items)
+        post.assert_not_called()
+        self.assertEqual(Certificate.objects.count(), count)
+
+    @override_tmpcadir()
+    def test_return_exceptions(self):
+        ca = self.cas['root']
+        csr = certs['root-cert']['csr']['pem']
+        items = [(csr, '/CN=example.com', None), (csr, None, None), (csr, '/CN=example.net', None)]
+
+        count = Certificate.objects.count()
+        with self.assertSignal(post_issue_cert) as post, self.assertSignal(post_issue_certs) as post_many:
+            issued = Certificate.objects.create_certs(ca, items, return_exceptions=True)
+        self.assertEqual(len(issued), 3)
+        self.assertEqual(str(issued[1]), 'Must name at least a CN or a subjectAlternativeName.')
+        self.assertEqual([c.subject for c in issued[::2]],
+                         [Subject('/CN=example.com'), Subject('/CN=example.net')])
+        self.assertEqual(post.call_count, 2)
+        post_many.assert_called_once_with(certs=issued[::2], signal=post_issue_certs, sender=Certificate)
+        self.assertEqual(Certificate.objects.count(), count + 2)
+
+    @override_tmpcadir()
+    def test_return_exceptions_save(self):
+        ca = self.cas['root']
+        csr = certs['root-cert']['csr']['pem']
+        items = [(csr, '/CN=example.com', None), (csr, '/CN=fail.example.com', None),
+                 (csr, '/CN=example.net', None)]
+        bulk_create = 'django_ca.managers.CertificateManager.bulk_create'
+        save = Certificate.save
+
+        def side_effect(cert, *args, **kwargs):
+            if cert.subject == Subject('/CN=fail.example.com'):
+                raise DatabaseError('save')
+            save(cert, *args, **kwargs)
+
+        # If saving all certificates fails, certificates are saved one by one
+        count = Certificate.objects.count()
+        with self.patch(bulk_create, side_effect=DatabaseError('bulk')), \
+                self.patch_object(Certificate, 'save', autospec=True, side_effect=side_effect), \
+                self.assertSignal(post_issue_cert) as post:
+            issued = Certificate.objects.create_certs(ca, items, return_exceptions=True)
+        self.assertEqual(str(issued[1]), 'save')
+        self.assertEqual(post.call_count, 2)
+        self.assertEqual(Certificate.objects.count(), count + 2)
+        for cert in issued[::2]:
+            self.assertEqual(Certificate.objects.get(pk=cert.pk), cert)
+
+        # Without return_exceptions, the exception is raised
+        with self.patch(bulk_create, side_effect=DatabaseError('bulk')), \
+                self.assertRaisesRegex(DatabaseError, r'^bulk$'):
+            Certificate.objects.create_certs(ca, items)
@@ -19,12 +19,17 @@ from datetime import datetime
 from datetime import timedelta
 
 from cryptography import x509
+from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.serialization import Encoding
+from cryptography.x509 import ocsp
+from cryptography.x509.oid import ExtensionOID
 
 from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
 from freezegun import freeze_time
@@ -35,9 +40,18 @@ from ..extensions import KEY_TO_EXTENSION
 from ..extensions import PrecertificateSignedCertificateTimestamps
 from ..extensions import SubjectAlternativeName
 from ..models import Certificate
+from ..models import CertificateAuthority
+from ..models import CRLNumber
+from ..models import CRLPublication
 from ..models import Watcher
+from ..ocsp import get_response
 from ..subject import Subject
+from ..utils import ca_storage
 from ..utils import get_crl_cache_key
+from ..utils import int_to_hex
+from ..utils import key_cache
+from ..utils import read_file
+from .base import DjangoCAWithCATestCase
 from .base import DjangoCAWithCertTestCase
 from .base import certs
 from .base import override_settings
@@ -120,6 +134,26 @@ class CertificateAuthorityTests(DjangoCAWithCertTestCase):
             # NOTE: assertLogs() fails if there are *no* log messages, so we cannot test that
             self.assertTrue(ca.key_exists)
 
+    @override_tmpcadir(CA_KEY_CACHE_TIMEOUT=60)
+    def test_key_cache(self):
+        key_cache.clear()
+        ca = self.cas['pwd']
+        password = certs['pwd']['password']
+        key = ca.key(password)
+
+        # A new instance of the same CA uses the cached key
+        with mock.patch('django_ca.models.read_file') as patched:
+            self.assertIs(CertificateAuthority.objects.get(pk=ca.pk).key(password), key)
+        patched.assert_not_called()
+
+        # ... but not with a wrong password
+        with self.assertRaises(ValueError):
+            CertificateAuthority.objects.get(pk=ca.pk).key(b'wrong')
+
+        # Saving the CA clears the cache
+        ca.save()
+        self.assertEqual(key_cache._entries, {})
+
     def test_pathlen(self):
         for name, ca in self.cas.items():
             self.assertEqual(ca.pathlen, certs[name].get('pathlen'))
@@ -251,6 +285,50 @@ class CertificateAuthorityTests(DjangoCAWithCertTestCase):
         crl = ca.get_crl().public_bytes(Encoding.PEM)  # test with no counter
         self.assertCRL(crl, idp=idp, crl_number=0)
 
+    @override_tmpcadir()
+    @freeze_time('2019-04-14 12:26:00')
+    def test_delta_crl(self):
+        ca = self.cas['root']
+        idp = self.get_idp(full_name=self.get_idp_full_name(ca))
+        freshest_crl = x509.Extension(
+            oid=ExtensionOID.FRESHEST_CRL, critical=False, value=x509.FreshestCRL([x509.DistributionPoint(
+                full_name=[x509.UniformResourceIdentifier('http://localhost/delta')], relative_name=None,
+                reasons=None, crl_issuer=None)]))
+        delta_indicator = x509.Extension(oid=ExtensionOID.DELTA_CRL_INDICATOR, critical=True,
+                                         value=x509.DeltaCRLIndicator(0))
+
+        self.assertIsNone(ca.get_base_crl())
+        with self.assertRaisesRegex(ValueError, r'^Cannot generate a delta CRL before a complete CRL'):
+            ca.get_crl(delta=True)
+
+        # revoke a CA that will be in the complete CRL
+        child = self.cas['child']
+        with freeze_time('2019-04-14 12:00:00'):
+            child.revoke()
+
+        crl = ca.get_crl(freshest_crl=['http://localhost/delta'], publish=True)
+        self.assertEqual([e.serial_number for e in crl], [child.x509.serial_number])
+        self.assertEqual(crl.extensions.get_extension_for_oid(ExtensionOID.FRESHEST_CRL), freshest_crl)
+        self.assertEqual(crl.extensions.get_extension_for_class(x509.CRLNumber).value.crl_number, 0)
+        self.assertEqual(ca.get_base_crl(), (0, timezone.now()))
+        self.assertIsNone(ca.get_base_crl(scope='user'))
+
+        with freeze_time('2019-04-14 12:36:00'):
+            # CRL numbers of complete and delta CRLs use the same sequence
+            crl = ca.get_crl(delta=True).public_bytes(Encoding.PEM)
+            self.assertCRL(crl, idp=idp, signer=ca, crl_number=1, extensions=[delta_indicator])
+
+            # only certificates revoked since the complete CRL are in the delta CRL
+            cert = self.certs['root-cert']
+            cert.revoke()
+            crl = ca.get_crl(delta=True).public_bytes(Encoding.PEM)
+            self.assertCRL(crl, idp=idp, signer=ca, crl_number=2, certs=[cert],
+                           extensions=[delta_indicator])
+
+        # delta CRLs and complete CRLs that are not published do not change the base CRL
+        ca.get_crl()
+        self.assertEqual(ca.get_base_crl()[0], 0)
+
     @override_tmpcadir()
     @freeze_time(timestamps['everything_valid'])
     def test_no_auth_key_identifier(self):
@@ -346,6 +424,225 @@ class CertificateAuthorityTests(DjangoCAWithCertTestCase):
             self.assertIsNone(cache.get(der_user_key))
             self.assertIsNone(cache.get(pem_user_key))
 
+    @override_tmpcadir()
+    def test_cache_crls_force(self):
+        ca = self.cas['child']
+        der_user_key = get_crl_cache_key(ca.serial, hashes.SHA512, Encoding.DER, 'user')
+        pem_user_key = get_crl_cache_key(ca.serial, hashes.SHA512, Encoding.PEM, 'user')
+        der_ca_key = get_crl_cache_key(ca.serial, hashes.SHA512, Encoding.DER, 'ca')
+
+        ca.cache_crls(scopes=['user'])
+        self.assertIsNone(cache.get(der_ca_key))
+        der_crl = cache.get(der_user_key)
+        crl = x509.load_der_x509_crl(der_crl, default_backend())
+        self.assertEqual(crl.extensions.get_extension_for_class(x509.CRLNumber).value.crl_number, 0)
+
+        # CRLs are already cached, so nothing happens without force
+        ca.cache_crls(scopes=['user'])
+        self.assertEqual(cache.get(der_user_key), der_crl)
+
+        # All encodings are replaced with the new CRL
+        ca.cache_crls(scopes=['user'], force=True)
+        crl = x509.load_der_x509_crl(cache.get(der_user_key), default_backend())
+        self.assertEqual(crl.extensions.get_extension_for_class(x509.CRLNumber).value.crl_number, 1)
+        pem_crl = x509.load_pem_x509_crl(cache.get(pem_user_key), default_backend())
+        self.assertEqual(pem_crl, crl)
+
+    @override_tmpcadir()
+    @freeze_time(timestamps['everything_valid'])
+    def test_partitioned_crls(self):
+        ca = self.cas['child']
+        ca.crl_url = 'http://localhost/crl/{partition}/'
+        ca.save()
+        cert = self.certs['child-cert']
+        crl_profiles = self.crl_profiles
+        crl_profiles['user']['partitions'] = 4
+
+        with self.settings(CA_CRL_PROFILES=crl_profiles):
+            self.assertEqual(ca.get_crl_partitions(), 4)
+            self.assertEqual(ca.get_crl_partitions(scope='ca'), 1)
+            self.assertIsNone(ca.get_crl_partition(cert.serial, scope='ca'))
+            partition = ca.get_crl_partition(cert.serial)
+            self.assertIn(partition, range(4))
+
+            cert.revoke()
+            for i in range(4):
+                crl = ca.get_crl(scope='user', partition=i)
+                idp = crl.extensions.get_extension_for_class(x509.IssuingDistributionPoint).value
+                url = 'http://localhost/crl/%s/' % i
+                self.assertEqual(idp.full_name, [x509.UniformResourceIdentifier(url)])
+                self.assertEqual(crl.extensions.get_extension_for_class(x509.CRLNumber).value.crl_number, 0)
+                if i == partition:
+                    self.assertEqual([e.serial_number for e in crl], [cert.x509.serial_number])
+                else:
+                    self.assertEqual(list(crl), [])
+
+            with self.assertRaisesRegex(ValueError, r'^4: Partition must be between 0 and 3\.$'):
+                ca.get_crl(scope='user', partition=4)
+
+            # only the given partition is generated
+            ca.cache_crls(scopes=['user'], partitions=[partition])
+            for i in range(4):
+                cache_key = get_crl_cache_key(ca.serial, hashes.SHA512, Encoding.DER, 'user', partition=i)
+                if i == partition:
+                    self.assertIsInstance(cache.get(cache_key), bytes)
+                else:
+                    self.assertIsNone(cache.get(cache_key))
+            self.assertIsNone(cache.get(get_crl_cache_key(ca.serial, hashes.SHA512, Encoding.DER, 'user')))
+
+            # new certificates refer to their partition
+            csr = certs['child-cert']['csr']['pem']
+            new_cert = Certificate.objects.create_cert(ca, csr, subject='/CN=example.com')
+            partition = ca.get_crl_partition(new_cert.serial)
+            self.assertEqual(new_cert.crl_distribution_points.value[0].full_name,
+                             [x509.UniformResourceIdentifier('http://localhost/crl/%s/' % partition)])
+
+    @override_tmpcadir(CA_DEFAULT_KEY_SIZE=1024)
+    def test_cache_ocsp_responses(self):
+        root = self.cas['root']
+        child = self.cas['child']
+        cert = self.certs['child-cert']
+
+        with freeze_time(timestamps['everything_valid']) as frozen:
+            root.generate_ocsp_key()
+            child.generate_ocsp_key()
+            responder_cert = x509.load_pem_x509_certificate(read_file('ocsp/%s.pem' % child.serial),
+                                                            default_backend())
+
+            child.cache_ocsp_responses(expires=3600)
+            responder_serial, next_update, der = cache.get(cert.ocsp_response_cache_key)
+            self.assertEqual(responder_serial, responder_cert.serial_number)
+            self.assertEqual(next_update, datetime.utcnow() + timedelta(seconds=3600))
+
+            response = ocsp.load_der_ocsp_response(der)
+            self.assertEqual(int_to_hex(response.serial_number), cert.serial)
+            self.assertEqual(response.certificate_status, ocsp.OCSPCertStatus.GOOD)
+
+            # responses for child CAs are cached by the parent
+            root.cache_ocsp_responses()
+            self.assertIsNotNone(cache.get(child.ocsp_response_cache_key))
+            self.assertIsNone(root.ocsp_response_cache_key)
+
+            # Responses are not signed again as long as they are still fresh
+            with self.patch('django_ca.models.get_response') as mock:
+                child.cache_ocsp_responses(expires=3600)
+            mock.assert_not_called()
+
+            frozen.tick(timedelta(seconds=1900))
+            child.cache_ocsp_responses(expires=3600)
+            responder_serial, next_update, der = cache.get(cert.ocsp_response_cache_key)
+            self.assertEqual(next_update, datetime.utcnow() + timedelta(seconds=3600))
+
+            # A certificate revoked while responses are signed does not keep its response
+            cache.delete(cert.ocsp_response_cache_key)
+
+            def revoke(*args, **kwargs):
+                Certificate.objects.filter(pk=cert.pk).update(revoked=True)
+                return get_response(*args, **kwargs)
+
+            with self.patch('django_ca.models.get_response', side_effect=revoke):
+                child.cache_ocsp_responses(expires=3600)
+            self.assertIsNone(cache.get(cert.ocsp_response_cache_key))
+            Certificate.objects.filter(pk=cert.pk).update(revoked=False)
+
+            # revoking a certificate removes the cached response once the revocation is committed
+            child.cache_ocsp_responses(expires=3600)
+            self.assertIsNotNone(cache.get(cert.ocsp_response_cache_key))
+            with self.on_commit():
+                cert.revoke()
+            self.assertIsNone(cache.get(cert.ocsp_response_cache_key))
+
+
+class CRLNumberTests(DjangoCAWithCATestCase):
+    def test_increment(self):
+        ca = self.cas['child']
+        self.assertEqual(CRLNumber.increment(ca, 'user'), 0)
+        self.assertEqual(CRLNumber.increment(ca, 'user'), 1)
+        self.assertEqual(CRLNumber.increment(ca, 'ca'), 0)
+        self.assertEqual(CRLNumber.increment(self.cas['root'], 'user'), 0)
+        self.assertEqual(CRLNumber.objects.get(ca=ca, scope='user').number, 2)
+
+    @override_tmpcadir()
+    def test_get_crl(self):
+        # Generating a CRL does not write to the CA
+        ca = self.cas['child']
+        with CaptureQueriesContext(connection) as context:
+            crl = ca.get_crl(scope='user')
+        self.assertEqual(crl.extensions.get_extension_for_class(x509.CRLNumber).value.crl_number, 0)
+        for query in context.captured_queries:
+            self.assertFalse(query['sql'].startswith('UPDATE "django_ca_certificateauthority"'))
+
+    def test_set_base(self):
+        ca = self.cas['child']
+        now = timezone.now()
+        CRLNumber.increment(ca, 'user')
+        CRLNumber.set_base(ca, 'user', 3, now)
+        self.assertEqual(ca.get_base_crl(scope='user'), (3, now))
+
+        # An older CRL does not replace the base CRL
+        CRLNumber.set_base(ca, 'user', 2, now + timedelta(seconds=10))
+        self.assertEqual(ca.get_base_crl(scope='user'), (3, now))
+
+
+class CRLPublicationTests(DjangoCAWithCATestCase):
+    @override_tmpcadir()
+    @freeze_time(timestamps['everything_valid'])
+    def test_get_crl(self):
+        ca = self.cas['child']
+        crl = ca.get_crl(scope='user', expires=600, publish=True)
+
+        publication = CRLPublication.objects.get(ca=ca)
+        self.assertEqual(publication.scope, 'user')
+        self.assertFalse(publication.delta)
+        self.assertEqual(publication.number, 0)
+        self.assertEqual(publication.algorithm, 'sha512')
+        self.assertEqual(publication.last_update, timezone.now())
+        self.assertEqual(publication.next_update, timezone.now() + timedelta(seconds=600))
+        self.assertEqual(publication.path, 'crl/%s/user-0.der' % ca.serial)
+        self.assertEqual(publication.full_name, '\n'.join('URI:%s' % url for url in ca.get_crl_urls()))
+        self.assertEqual(publication.relative_name, '')
+        self.assertEqual(publication.freshest_crl, '')
+        self.assertEqual(publication.read(), crl.public_bytes(Encoding.DER))
+
+        # CRLs are not stored by default
+        ca.get_crl(scope='user', expires=60, delta=True)
+        ca.get_crl(scope='ca')
+        self.assertEqual(CRLPublication.objects.filter(ca=ca).count(), 1)
+
+        # A new CRL supersedes the previous one
+        crl = ca.get_crl(scope='user', expires=600, publish=True)
+        publication = CRLPublication.objects.get(ca=ca)
+        self.assertEqual(publication.number, 2)
+        self.assertEqual(publication.read(), crl.public_bytes(Encoding.DER))
+        self.assertFalse(ca_storage.exists('crl/%s/user-0.der' % ca.serial))
+
+        # CRLs for other scopes, algorithms or extensions are not superseded
+        ca.get_crl(scope='ca', publish=True)
+        ca.get_crl(scope='user', algorithm='SHA256', publish=True)
+        ca.get_crl(scope='user', freshest_crl=['http://localhost/delta'], publish=True)
+        self.assertEqual(CRLPublication.objects.filter(ca=ca).count(), 4)
+        self.assertEqual(CRLPublication.objects.get(ca=ca, scope='user', algorithm='sha512').freshest_crl, '')
+
+    @override_tmpcadir()
+    @freeze_time(timestamps['everything_valid'])
+    def test_cache_crls(self):
+        ca = self.cas['child']
+        ca.cache_crls()
+        self.assertEqual(list(CRLPublication.objects.filter(ca=ca).order_by('scope').values_list(
+            'scope', 'delta', 'number')), [('ca', False, 0), ('user', False, 0)])
+
+        # CRLs are only stored again if they are generated again
+        ca.cache_crls()
+        self.assertEqual(CRLPublication.objects.filter(ca=ca).count(), 2)
+        ca.cache_crls(force=True)
+        self.assertEqual(list(CRLPublication.objects.filter(ca=ca).order_by('scope').values_list(
+            'scope', 'number')), [('ca', 1), ('user', 1)])
+
+        # delta CRLs are not stored
+        with self.settings(CA_DELTA_CRL_EXPIRES=3600):
+            ca.cache_crls(force=True)
+        self.assertFalse(CRLPublication.objects.filter(delta=True).exists())
+
 
 class CertificateTests(DjangoCAWithCertTestCase):
     def assertExtension(self, cert, name, key, cls):
@@ -14,6 +14,8 @@
 import doctest
 from datetime import timedelta
 
+from cryptography import x509
+
 from .. import ca_settings
 from ..extensions import AuthorityInformationAccess
 from ..extensions import BasicConstraints
@@ -404,6 +406,86 @@ class ProfileTestCase(DjangoCATestCase):
             self.create_cert(profile, ca, csr, subject=Subject({'CN': cn}))
         self.assertEqual(pre.call_count, 0)
 
+    @override_tmpcadir()
+    def test_template(self):
+        ca = self.load_ca(name='root', x509=certs['root']['pub']['parsed'])
+        csr = certs['child-cert']['csr']['parsed']
+        subject = Subject({'CN': 'example.com'})
+        crldp = CRLDistributionPoints({'value': [{'full_name': ['http://crl.example.com']}]})
+        profile = Profile('example', subject=Subject(), extensions={CRLDistributionPoints.key: crldp},
+                          add_ocsp_url=False, add_issuer_url=False, add_issuer_alternative_name=False)
+
+        template = profile.get_template(ca)
+        self.assertIs(profile.get_template(ca), template)
+        self.assertIsNot(profile.get_template(ca, add_crl_url=False), template)
+        self.assertEqual(template.extensions[CRLDistributionPoints.key], CRLDistributionPoints({'value': [
+            {'full_name': ['http://crl.example.com']},
+            {'full_name': [ca.crl_url]},
+        ]}))
+        self.assertEqual(crldp, CRLDistributionPoints({'value': [{'full_name': ['http://crl.example.com']}]}))
+
+        cert = self.create_cert(profile, ca, csr, subject=subject)
+        self.assertEqual(cert.extensions, [
+            ca.get_authority_key_identifier_extension(),
+            BasicConstraints({'value': {'ca': False}}),
+            template.extensions[CRLDistributionPoints.key],
+            SubjectAlternativeName({'value': ['DNS:example.com']}),
+            certs['child-cert']['subject_key_identifier'],
+        ])
+
+        # Passed extensions still get values from the CA, but the template is not modified
+        cert = self.create_cert(profile, ca, csr, subject=subject, extensions={
+            CRLDistributionPoints.key: None,
+            SubjectAlternativeName.key: SubjectAlternativeName({'value': ['DNS:example.net']}),
+        })
+        self.assertEqual(cert.extensions, [
+            ca.get_authority_key_identifier_extension(),
+            BasicConstraints({'value': {'ca': False}}),
+            CRLDistributionPoints({'value': [{'full_name': [ca.crl_url]}]}),
+            SubjectAlternativeName({'value': ['DNS:example.net', 'DNS:example.com']}),
+            certs['child-cert']['subject_key_identifier'],
+        ])
+        self.assertIs(profile.get_template(ca), template)
+        self.assertEqual(len(template.extensions[CRLDistributionPoints.key].value), 2)
+        self.assertNotIn(SubjectAlternativeName.key, template.extensions)
+
+        # Receivers of pre_issue_cert never see the extensions of the template
+        with self.assertSignal(pre_issue_cert) as pre:
+            self.create_cert(profile, ca, csr, subject=subject)
+        self.assertEqual(pre.call_count, 1)
+        passed = pre.call_args[1]['extensions'][CRLDistributionPoints.key]
+        self.assertEqual(passed, template.extensions[CRLDistributionPoints.key])
+        self.assertIsNot(passed, template.extensions[CRLDistributionPoints.key])
+
+        # Templates are compiled again if the CA or the profile changes
+        ca.crl_url = 'http://crl.example.org'
+        ca.save()
+        new_template = profile.get_template(ca)
+        self.assertIsNot(new_template, template)
+        self.assertEqual(new_template.extensions[CRLDistributionPoints.key], CRLDistributionPoints({'value': [
+            {'full_name': ['http://crl.example.com']},
+            {'full_name': ['http://crl.example.org']},
+        ]}))
+
+        profile.extensions[OCSPNoCheck.key] = OCSPNoCheck()
+        template = profile.get_template(ca)
+        self.assertIsNot(template, new_template)
+        self.assertIn(OCSPNoCheck.key, template.extensions)
+
+        # ... even if an extension is modified in place
+        profile.extensions[CRLDistributionPoints.key].value[0].full_name = [
+            x509.UniformResourceIdentifier('http://crl.example.net')]
+        new_template = profile.get_template(ca)
+        self.assertIsNot(new_template, template)
+        self.assertEqual(new_template.extensions[CRLDistributionPoints.key], CRLDistributionPoints({'value': [
+            {'full_name': ['http://crl.example.net']},
+            {'full_name': ['http://crl.example.org']},
+        ]}))
+        self.assertIs(profile.get_template(ca), new_template)
+
+        # Templates are not copied with the profile
+        self.assertEqual(profile.copy()._templates, {})
+
     def test_str(self):
         for name in ca_settings.CA_PROFILES:
             self.assertEqual(str(profiles[name]), "<Profile: '%s'>" % name)
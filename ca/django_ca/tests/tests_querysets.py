@@ -16,9 +16,12 @@
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.asymmetric.rsa import RSAPublicKey
 
+from django.utils import timezone
+
 from freezegun import freeze_time
 
 from .. import ca_settings
+from ..constants import ReasonFlags
 from ..extensions import BasicConstraints
 from ..extensions import KeyUsage
 from ..models import Certificate
@@ -178,3 +181,21 @@ class CertificateQuerysetTestCase(DjangoCAWithGeneratedCertsTestCase):
             self.assertQuerySet(Certificate.objects.expired(), *expired)
             self.assertQuerySet(Certificate.objects.not_yet_valid())
             self.assertQuerySet(Certificate.objects.valid(), *valid)
+
+    def test_revocations(self):
+        self.assertEqual(list(Certificate.objects.revocations()), [])
+
+        cert = self.certs['root-cert']
+        cert.revoke(ReasonFlags.key_compromise, compromised=timezone.now())
+        self.certs['child-cert'].revoke()
+
+        def entry(revoked_cert):
+            return revoked_cert.serial_number, revoked_cert.revocation_date, list(revoked_cert.extensions)
+
+        with self.assertNumQueries(1):
+            revocations = [entry(r) for r in Certificate.objects.revocations(chunk_size=1)]
+        self.assertCountEqual(revocations, [
+            entry(cert.get_revocation()),
+            entry(self.certs['child-cert'].get_revocation()),
+        ])
+        self.assertEqual(len(revocations[0][2]) + len(revocations[1][2]), 2)  # reason + invalidity date
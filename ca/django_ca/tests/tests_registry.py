@@ -0,0 +1,99 @@
+# This file is part of django-ca (https://github.com/mathiasertl/django-ca).
+#
+# django-ca is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# django-ca is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with django-ca.  If not,
+# see <http://www.gnu.org/licenses/>.
+
+from cryptography.hazmat.primitives.serialization import Encoding
+
+from django.core.cache import cache
+
+from ..models import CertificateAuthority
+from ..ocsp import get_issuer_hashes
+from ..registry import VERSION_CACHE_KEY
+from ..registry import CARegistry
+from ..registry import ca_registry
+from ..utils import add_colons
+from .base import DjangoCAWithCATestCase
+
+
+class CARegistryTestCase(DjangoCAWithCATestCase):
+    def setUp(self):
+        super(CARegistryTestCase, self).setUp()
+        self.registry = CARegistry()
+
+    def test_get(self):
+        ca = self.cas['child']
+        with self.assertNumQueries(1):
+            entry = self.registry.get(ca.serial)
+            self.assertEqual(entry.ca, ca)
+            self.assertEqual(entry.x509, ca.x509)
+            self.assertEqual(entry.der, ca.x509.public_bytes(Encoding.DER))
+            self.assertEqual(entry.issuer_hashes, get_issuer_hashes(ca.x509))
+            self.assertEqual(entry.authority_key_identifier, ca.get_authority_key_identifier())
+
+            # All CAs are loaded with the first query
+            self.assertEqual(self.registry.get(self.cas['root'].serial).ca, self.cas['root'])
+
+        with self.assertRaises(CertificateAuthority.DoesNotExist):
+            self.registry.get('ABC')
+
+    def test_get_by_serial_or_cn(self):
+        ca = self.cas['child']
+        self.assertEqual(self.registry.get_by_serial_or_cn(ca.serial).ca, ca)
+        self.assertEqual(self.registry.get_by_serial_or_cn(ca.cn).ca, ca)
+        self.assertEqual(self.registry.get_by_serial_or_cn('  %s  ' % ca.serial.lower()).ca, ca)
+
+        self.assertEqual(self.registry.get_by_serial_or_cn(add_colons(ca.serial)).ca, ca)
+        self.assertEqual(self.registry.get_by_serial_or_cn('00%s' % ca.serial).ca, ca)
+        self.assertEqual(self.registry.get_by_serial_or_cn(ca.serial[:-1]).ca, ca)
+
+        with self.assertRaises(CertificateAuthority.DoesNotExist):
+            self.registry.get_by_serial_or_cn('wrong')
+        with self.assertRaises(CertificateAuthority.MultipleObjectsReturned):
+            self.registry.get_by_serial_or_cn('')
+
+    def test_get_entry(self):
+        ca = self.cas['child']
+        entry = self.registry.get(ca.serial)
+        self.assertIs(self.registry.get_entry(entry.ca), entry)
+
+        # Instances not loaded by the registry get a new entry
+        other = self.registry.get_entry(ca)
+        self.assertIsNot(other, entry)
+        self.assertEqual(other.issuer_hashes, entry.issuer_hashes)
+
+    def test_invalidate_on_save(self):
+        ca = self.cas['child']
+        self.assertEqual(self.registry.get(ca.serial).ca.name, 'child')
+
+        with self.assertNumQueries(0):
+            self.registry.get(ca.serial)
+
+        ca.name = 'new-name'
+        ca.save()
+        self.assertEqual(self.registry.get(ca.serial).ca.name, 'new-name')
+
+        ca.delete()
+        with self.assertRaises(CertificateAuthority.DoesNotExist):
+            self.registry.get(ca.serial)
+
+    def test_invalidate_other_process(self):
+        # A different process invalidating the registry is detected via the shared version
+        ca = self.cas['child']
+        entry = self.registry.get(ca.serial)
+        ca_registry.invalidate()
+        self.assertIsNot(self.registry.get(ca.serial), entry)
+
+        # The version is evicted from the cache, so the registry has to be loaded again
+        entry = self.registry.get(ca.serial)
+        cache.delete(VERSION_CACHE_KEY)
+        self.assertIsNot(self.registry.get(ca.serial), entry)
+        self.assertIsNotNone(cache.get(VERSION_CACHE_KEY))
@@ -0,0 +1,205 @@
+# This file is part of django-ca (https://github.com/mathiasertl/django-ca).
+#
+# django-ca is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# django-ca is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with django-ca.  If not,
+# see <http://www.gnu.org/licenses/>.
+
+
+import asyncio
+import base64
+import os
+import tempfile
+
+import asn1crypto.ocsp
+
+from freezegun import freeze_time
+
+from ..ocsp import get_cert_id
+from ..responder import CURRENT
+from ..responder import SnapshotResponder
+from ..responder import main
+from .base import DjangoCAWithCertTestCase
+from .base import override_settings
+from .base import override_tmpcadir
+from .base import timestamps
+
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
+
+@freeze_time(timestamps['everything_valid'])
+@override_settings(CA_DEFAULT_KEY_SIZE=1024)
+class SnapshotResponderTestCase(DjangoCAWithCertTestCase):
+    def setUp(self):
+        super(SnapshotResponderTestCase, self).setUp()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = self.tmpdir.name
+
+    def tearDown(self):
+        super(SnapshotResponderTestCase, self).tearDown()
+        self.tmpdir.cleanup()
+
+    def export(self, *serials):
+        stdout, stderr = self.cmd('export_ocsp_snapshot', self.path, *serials)
+        self.assertEqual(stdout, '')
+        self.assertEqual(stderr, '')
+
+    def request(self, ca, *serials):
+        return asn1crypto.ocsp.OCSPRequest({'tbs_request': {'request_list': [
+            {'req_cert': get_cert_id(ca, serial)} for serial in serials
+        ]}}).dump()
+
+    def assertStatus(self, response, *statuses):
+        status, headers, content = response
+        self.assertEqual(status, 200)
+        self.assertEqual(headers['Content-Type'], 'application/ocsp-response')
+        ocsp_response = asn1crypto.ocsp.OCSPResponse.load(content)
+        self.assertEqual(ocsp_response['response_status'].native, 'successful')
+        responses = ocsp_response.response_data['responses']
+        self.assertEqual([r['cert_status'].name for r in responses], list(statuses))
+        return headers
+
+    def assertFailed(self, response, status='internal_error'):
+        self.assertEqual(response[0], 200)
+        ocsp_response = asn1crypto.ocsp.OCSPResponse.load(response[2])
+        self.assertEqual(ocsp_response['response_status'].native, status)
+
+    @override_tmpcadir()
+    def test_basic(self):
+        ca = self.cas['child']
+        cert = self.certs['child-cert']
+        ca.generate_ocsp_key()
+        self.export(ca.serial)
+
+        responder = SnapshotResponder(self.path)
+        req = self.request(ca, cert.x509.serial_number)
+        self.assertStatus(responder.handle_request('POST', '/', req), 'good')
+        headers = self.assertStatus(
+            responder.handle_request('GET', '/%s' % base64.b64encode(req).decode('utf-8'), b''), 'good')
+        self.assertEqual(headers['Cache-Control'], 'max-age=3600, public, no-transform, must-revalidate')
+        self.assertIn('Expires', headers)
+        self.assertIn('Last-Modified', headers)
+
+        # A new snapshot is loaded automatically
+        cert.revoke()
+        self.export(ca.serial)
+        self.assertStatus(responder.handle_request('POST', '/', req), 'revoked')
+
+    @override_tmpcadir()
+    def test_intermediate_ca(self):
+        root = self.cas['root']
+        root.generate_ocsp_key()
+        self.export(root.serial)
+
+        responder = SnapshotResponder(self.path)
+        req = self.request(root, self.cas['child'].x509.serial_number)
+        self.assertStatus(responder.handle_request('POST', '/', req), 'good')
+
+    @override_tmpcadir()
+    def test_broken_snapshot(self):
+        ca = self.cas['child']
+        ca.generate_ocsp_key()
+        self.export(ca.serial)
+        responder = SnapshotResponder(self.path)
+        req = self.request(ca, self.certs['child-cert'].x509.serial_number)
+        self.assertStatus(responder.handle_request('POST', '/', req), 'good')
+
+        # A snapshot that cannot be loaded is ignored and the old one is still used
+        broken = os.path.join(self.path, 'broken')
+        os.makedirs(broken)
+        os.unlink(os.path.join(self.path, CURRENT))
+        os.symlink('broken', os.path.join(self.path, CURRENT))
+        with self.assertLogs('django_ca.responder', level='ERROR'):
+            self.assertStatus(responder.handle_request('POST', '/', req), 'good')
+
+        # A responder that never loaded a snapshot cannot answer requests
+        with self.assertLogs('django_ca.responder', level='ERROR'):
+            self.assertFailed(SnapshotResponder(self.path).handle_request('POST', '/', req))
+
+    @override_tmpcadir()
+    def test_errors(self):
+        ca = self.cas['child']
+        ca.generate_ocsp_key()
+        self.export(ca.serial)
+        responder = SnapshotResponder(self.path, prefix='/ocsp/')
+
+        self.assertEqual(responder.handle_request('POST', '/wrong/', b''), (404, {}, b''))
+        self.assertEqual(responder.handle_request('PUT', '/ocsp/', b''), (405, {'Allow': 'GET, POST'}, b''))
+        self.assertFailed(responder.handle_request('GET', '/ocsp/%%%', b''), 'malformed_request')
+        self.assertFailed(responder.handle_request('POST', '/ocsp/', b'foobar'), 'malformed_request')
+
+        # Unknown certificate
+        with self.assertLogs('django_ca.responder', level='WARNING') as logcm:
+            self.assertFailed(responder.handle_request('POST', '/ocsp/', self.request(ca, 123)))
+        self.assertEqual(logcm.output, [
+            'WARNING:django_ca.responder:OCSP request for unknown cert received.',
+        ])
+
+        # CA that is not in the snapshot
+        req = self.request(self.cas['root'], ca.x509.serial_number)
+        with self.assertLogs('django_ca.responder', level='WARNING') as logcm:
+            self.assertFailed(responder.handle_request('POST', '/ocsp/', req))
+        self.assertEqual(logcm.output, [
+            'WARNING:django_ca.responder:OCSP request for certificate issued by an unknown CA received.',
+        ])
+
+    @override_tmpcadir()
+    def test_server(self):
+        ca = self.cas['child']
+        ca.generate_ocsp_key()
+        self.export(ca.serial)
+        responder = SnapshotResponder(self.path)
+        req = self.request(ca, self.certs['child-cert'].x509.serial_number)
+
+        async def client(port):
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            head = 'POST / HTTP/1.1\r\nHost: localhost\r\nContent-Length: %s\r\n\r\n' % len(req)
+            writer.write(head.encode('utf-8') + req)
+            writer.write(b'PUT / HTTP/1.1\r\nConnection: close\r\n\r\n')
+
+            responses = []
+            for i in range(2):
+                status_line = await reader.readline()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line == b'\r\n':
+                        break
+                    name, value = line.decode('utf-8').split(': ', 1)
+                    headers[name] = value.strip()
+                content = await reader.readexactly(int(headers['Content-Length']))
+                responses.append((status_line, headers, content))
+            self.assertEqual(await reader.read(), b'')  # server closed the connection
+            writer.close()
+            return responses
+
+        loop = asyncio.new_event_loop()
+        try:
+            server = loop.run_until_complete(
+                asyncio.start_server(responder.handle_connection, '127.0.0.1', 0))
+            port = server.sockets[0].getsockname()[1]
+            responses = loop.run_until_complete(client(port))
+            server.close()
+            loop.run_until_complete(server.wait_closed())
+        finally:
+            loop.close()
+
+        self.assertEqual(responses[0][0], b'HTTP/1.1 200 OK\r\n')
+        self.assertEqual(responses[0][1]['Connection'], 'keep-alive')
+        self.assertStatus((200, responses[0][1], responses[0][2]), 'good')
+        self.assertEqual(responses[1][0], b'HTTP/1.1 405 Method Not Allowed\r\n')
+        self.assertEqual(responses[1][1]['Connection'], 'close')
+
+    def test_main(self):
+        # No snapshot was exported yet
+        with self.assertRaises(FileNotFoundError), mock.patch('logging.basicConfig'):
+            main([self.path])
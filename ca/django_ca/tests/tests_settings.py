@@ -33,6 +33,14 @@ class SettingsTestCase(DjangoCATestCase):
         with self.settings(CA_PROFILES={'client': {'desc': desc}}):
             self.assertEqual(ca_settings.CA_PROFILES['client']['desc'], desc)
 
+    def test_delta_crl_profiles(self):
+        self.assertNotIn('user-delta', ca_settings.CA_CRL_PROFILES)
+
+        with self.settings(CA_DELTA_CRL_EXPIRES=1800):
+            self.assertEqual(ca_settings.CA_CRL_PROFILES['user-delta']['expires'], 1800)
+            self.assertEqual(ca_settings.CA_CRL_PROFILES['ca-delta']['scope'], 'ca')
+            self.assertTrue(ca_settings.CA_CRL_PROFILES['ca-delta']['delta'])
+
     def test_missing_celery(self):
         with mock.patch.dict('sys.modules', celery=None), self.settings(CA_USE_CELERY=None):
             self.assertFalse(ca_settings.CA_USE_CELERY)
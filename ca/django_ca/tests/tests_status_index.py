@@ -0,0 +1,145 @@
+# This file is part of django-ca (https://github.com/mathiasertl/django-ca).
+#
+# django-ca is free software: you can redistribute it and/or modify it under the terms of the GNU
+# General Public License as published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# django-ca is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with django-ca.  If not,
+# see <http://www.gnu.org/licenses/>.
+
+import os
+import tempfile
+import threading
+from datetime import datetime
+
+from django.test import TestCase
+
+from ..status_index import HEADER
+from ..status_index import RECORD
+from ..status_index import Status
+from ..status_index import StatusIndex
+from ..status_index import get_status_index
+
+
+class StatusIndexTestCase(TestCase):
+    def setUp(self):
+        super(StatusIndexTestCase, self).setUp()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'test.idx')
+        self.revoked = datetime(2020, 5, 17, 10, 11, 12)
+
+    def tearDown(self):
+        super(StatusIndexTestCase, self).tearDown()
+        self.tmpdir.cleanup()
+
+    def test_basic(self):
+        index = StatusIndex(self.path)
+        index.build([(3, None, None), (1, self.revoked, 'key_compromise'), (2 ** 100, None, None)])
+        self.assertEqual(os.path.getsize(self.path), HEADER.size + 3 * RECORD.size)
+
+        self.assertEqual(index.get(1), Status(True, 'key_compromise', self.revoked))
+        self.assertEqual(index.get(3), Status(False, '', None))
+        self.assertEqual(index.get(2 ** 100), Status(False, '', None))
+        self.assertIsNone(index.get(2))
+        self.assertIsNone(index.get(4))
+        self.assertIsNone(index.get(2 ** 200))
+
+    def test_empty(self):
+        index = StatusIndex(self.path)
+        index.build([])
+        self.assertIsNone(index.get(1))
+
+    def test_not_built(self):
+        index = StatusIndex(self.path)
+        self.assertIsNone(index.get(1))
+        self.assertFalse(index.update(1))
+        self.assertFalse(os.path.exists(index.journal_path))
+
+    def test_invalid_serial(self):
+        index = StatusIndex(self.path)
+        index.build([(1, None, None), (2 ** 200, None, None)])
+        self.assertEqual(os.path.getsize(self.path), HEADER.size + RECORD.size)
+        self.assertFalse(index.update(2 ** 200))
+
+    def test_update_during_build(self):
+        writer = StatusIndex(self.path)
+        writer.build([])
+        thread = threading.Thread(target=writer.update, args=(2, self.revoked, 'key_compromise'))
+
+        def entries():
+            # An update started while entries are read (e.g. from the database) waits for the build
+            thread.start()
+            thread.join(0.1)
+            self.assertTrue(thread.is_alive())
+            yield 1, None, None
+
+        writer.build(entries())
+        thread.join()
+
+        reader = StatusIndex(self.path)
+        self.assertEqual(reader.get(1), Status(False, '', None))
+        self.assertEqual(reader.get(2), Status(True, 'key_compromise', self.revoked))
+
+    def test_update(self):
+        writer = StatusIndex(self.path)
+        reader = StatusIndex(self.path)  # e.g. in a different process
+        writer.build([(1, None, None)])
+        self.assertEqual(reader.get(1), Status(False, '', None))
+
+        self.assertTrue(writer.update(2))
+        self.assertTrue(writer.update(1, self.revoked, 'superseded'))
+        self.assertEqual(reader.get(1), Status(True, 'superseded', self.revoked))
+        self.assertEqual(reader.get(2), Status(False, '', None))
+
+        # unknown reasons are stored as "unspecified"
+        writer.update(2, self.revoked, 'foo')
+        self.assertEqual(reader.get(2), Status(True, 'unspecified', self.revoked))
+
+    def test_partial_update(self):
+        writer = StatusIndex(self.path)
+        reader = StatusIndex(self.path)
+        writer.build([])
+
+        # simulate a record that is not yet completely written
+        record = RECORD.pack((1).to_bytes(20, 'big'), 0, 0, 0)
+        with open(writer.journal_path, 'ab') as stream:
+            stream.write(record[:10])
+        self.assertIsNone(reader.get(1))
+
+        with open(writer.journal_path, 'ab') as stream:
+            stream.write(record[10:])
+        self.assertEqual(reader.get(1), Status(False, '', None))
+
+    def test_rebuild(self):
+        writer = StatusIndex(self.path)
+        reader = StatusIndex(self.path)
+        writer.build([(1, None, None)])
+        writer.update(2)
+        self.assertEqual(reader.get(2), Status(False, '', None))
+
+        writer.build([(1, self.revoked, 'unspecified'), (3, None, None)])
+        self.assertEqual(reader.get(1), Status(True, 'unspecified', self.revoked))
+        self.assertIsNone(reader.get(2))
+        self.assertEqual(reader.get(3), Status(False, '', None))
+
+        # journal of an older generation is ignored
+        with open(writer.journal_path, 'r+b') as stream:
+            stream.write(HEADER.pack(b'DCAJRN01', 1, 0))
+        writer.update(2)
+        reader = StatusIndex(self.path)
+        self.assertIsNone(reader.get(2))
+
+        # index files are removed
+        os.remove(self.path)
+        self.assertIsNone(reader.get(1))
+
+    def test_get_status_index(self):
+        index = get_status_index(self.tmpdir.name, 'AB:CD')
+        self.assertEqual(index.path, os.path.join(self.tmpdir.name, 'ABCD.user.idx'))
+        self.assertIs(get_status_index(self.tmpdir.name, 'AB:CD'), index)
+        self.assertEqual(get_status_index(self.tmpdir.name, 'AB:CD', scope='ca').path,
+                         os.path.join(self.tmpdir.name, 'ABCD.ca.idx'))
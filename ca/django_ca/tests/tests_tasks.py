@@ -22,11 +22,16 @@ from cryptography.hazmat.primitives.serialization import Encoding
 
 from django.core.cache import cache
 
+from freezegun import freeze_time
+
 from .. import tasks
+from ..models import Certificate
 from ..utils import ca_storage
 from ..utils import get_crl_cache_key
+from .base import DjangoCAWithCertTestCase
 from .base import DjangoCAWithGeneratedCAsTestCase
 from .base import override_tmpcadir
+from .base import timestamps
 
 
 class TestBasic(DjangoCAWithGeneratedCAsTestCase):
@@ -112,3 +117,76 @@ class GenerateOCSPKeysTestCase(DjangoCAWithGeneratedCAsTestCase):
             tasks.generate_ocsp_key(ca.serial)
             self.assertTrue(ca_storage.exists('ocsp/%s.key' % ca.serial))
             self.assertTrue(ca_storage.exists('ocsp/%s.pem' % ca.serial))
+
+    @override_tmpcadir(CA_KEY_POOL_SIZE=10)
+    def test_key_pool(self):
+        with self.patch('django_ca.tasks.key_pool.fill') as fill:
+            tasks.generate_ocsp_keys()
+
+        # The pool is filled with keys of the same type as generated by generate_ocsp_key()
+        counts = {args[1]: kwargs['count'] for args, kwargs in fill.call_args_list}
+        self.assertEqual(counts, {'RSA': len(self.cas) - 1, 'DSA': 1})
+
+
+@freeze_time(timestamps['everything_valid'])
+class CacheOCSPResponsesTestCase(DjangoCAWithGeneratedCAsTestCase):
+    @override_tmpcadir(CA_DEFAULT_KEY_SIZE=1024)
+    def test_single(self):
+        ca = self.cas['root']
+        ca.generate_ocsp_key()
+        tasks.cache_ocsp_response(ca.serial, expires=3600)
+
+        responder_serial, next_update, response = cache.get(self.cas['child'].ocsp_response_cache_key)
+        self.assertIsInstance(response, bytes)
+
+    @override_tmpcadir(CA_DEFAULT_KEY_SIZE=1024)
+    def test_all(self):
+        tasks.generate_ocsp_keys()
+        tasks.cache_ocsp_responses()
+
+        for name, ca in self.cas.items():
+            if ca.parent is not None:
+                responder_serial, next_update, response = cache.get(ca.ocsp_response_cache_key)
+                self.assertIsInstance(response, bytes)
+
+    def test_no_responder_key(self):
+        with self.assertRaises(FileNotFoundError):
+            tasks.cache_ocsp_response(self.cas['root'].serial)
+
+
+class RegenerateCRLsTestCase(DjangoCAWithCertTestCase):
+    def test_revoke(self):
+        ca = self.cas['child']
+        with self.settings(CA_USE_CELERY=True), self.patch('django_ca.tasks.cache_crl') as task, \
+                self.on_commit():
+            self.certs['child-cert'].revoke()
+            task.apply_async.assert_called_once_with((ca.serial, ), {'scopes': ['user'], 'force': True},
+                                                     countdown=60)
+
+            # further revocations within the delay are included in the same CRL
+            for cert in Certificate.objects.filter(ca=ca, revoked=False):
+                cert.revoke()
+            ca.revoke()
+            self.assertEqual(task.apply_async.call_count, 2)
+            task.apply_async.assert_called_with((self.cas['root'].serial, ),
+                                                {'scopes': ['ca'], 'force': True}, countdown=60)
+
+            # revoking a root CA does not schedule anything
+            self.cas['root'].revoke()
+            self.assertEqual(task.apply_async.call_count, 2)
+
+    def test_not_committed(self):
+        # The task is only scheduled once the revocation is committed
+        with self.settings(CA_USE_CELERY=True), self.patch('django_ca.tasks.cache_crl') as task:
+            self.certs['child-cert'].revoke()
+        task.apply_async.assert_not_called()
+
+    def test_disabled(self):
+        with self.settings(CA_USE_CELERY=True, CA_CRL_REGENERATION_DELAY=None), \
+                self.patch('django_ca.tasks.cache_crl') as task:
+            self.certs['child-cert'].revoke()
+        task.apply_async.assert_not_called()
+
+        with self.settings(CA_USE_CELERY=False), self.patch('django_ca.tasks.cache_crl') as task:
+            self.certs['root-cert'].revoke()
+        task.apply_async.assert_not_called()
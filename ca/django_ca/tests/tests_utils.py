@@ -16,12 +16,18 @@
 from __future__ import unicode_literals
 
 import doctest
+import hashlib
 import ipaddress
 import json
 import os
+import time
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from contextlib import contextmanager
 from datetime import datetime
 from datetime import timedelta
+from unittest.mock import Mock
 
 from idna.core import IDNAError
 
@@ -31,6 +37,7 @@ from cryptography.hazmat.primitives.asymmetric import ec
 from cryptography.hazmat.primitives.serialization import Encoding
 from cryptography.x509.oid import NameOID
 
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.test import TestCase
 from django.utils.translation import gettext as _
@@ -42,11 +49,18 @@ from .. import ca_settings
 from .. import utils
 from ..utils import NAME_RE
 from ..utils import GeneralNameList
+from ..utils import KeyCache
+from ..utils import KeyPool
 from ..utils import LazyEncoder
+from ..utils import LocalCache
+from ..utils import format_crl_urls
 from ..utils import format_general_name
 from ..utils import format_name
 from ..utils import format_relative_name
 from ..utils import get_cert_builder
+from ..utils import get_chunked_cache
+from ..utils import get_file_version
+from ..utils import get_serial_partition
 from ..utils import is_power2
 from ..utils import multiline_url_validator
 from ..utils import parse_encoding
@@ -55,6 +69,7 @@ from ..utils import parse_hash_algorithm
 from ..utils import parse_key_curve
 from ..utils import parse_name
 from ..utils import read_file
+from ..utils import set_chunked_cache
 from ..utils import validate_email
 from ..utils import validate_hostname
 from ..utils import validate_key_parameters
@@ -218,6 +233,32 @@ class ReadFileTestCase(DjangoCATestCase):
             os.chmod(path, 0o600)  # make sure we can delete CA_DIR
 
 
+class GetFileVersionTestCase(DjangoCATestCase):
+    @override_tmpcadir()
+    def test_basic(self):
+        name = 'test-data'
+        path = os.path.join(ca_settings.CA_DIR, name)
+        with open(path, 'wb') as stream:
+            stream.write(b'test data')
+
+        version = get_file_version(name)
+        abs_version = get_file_version(path)
+        self.assertIsNotNone(version)
+        self.assertIsNotNone(abs_version)
+        self.assertEqual(get_file_version(name), version)
+        self.assertEqual(get_file_version(path), abs_version)
+
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertNotEqual(get_file_version(name), version)
+        self.assertNotEqual(get_file_version(path), abs_version)
+
+    @override_tmpcadir()
+    def test_file_not_found(self):
+        self.assertIsNone(get_file_version('test-data'))
+        self.assertIsNone(get_file_version(os.path.join(ca_settings.CA_DIR, 'test-data')))
+
+
 class ParseNameTestCase(DjangoCATestCase):
     def assertSubject(self, actual, expected):
         self.assertEqual(parse_name(actual), expected)
@@ -696,6 +737,29 @@ class GetCertBuilderTestCase(DjangoCATestCase):
             get_cert_builder(datetime(2017, 12, 12))
 
 
+class CRLPartitionTestCase(TestCase):
+    def test_get_serial_partition(self):
+        self.assertEqual(get_serial_partition(0, 4), 0)
+        self.assertEqual(get_serial_partition(2 ** 157 - 1, 4), 0)
+        self.assertEqual(get_serial_partition(2 ** 157, 4), 1)
+        self.assertEqual(get_serial_partition(2 ** 159 - 1, 4), 3)
+        self.assertEqual(get_serial_partition('40' + '00' * 19, 4), 2)
+
+        # larger serials are in the last partition
+        self.assertEqual(get_serial_partition(2 ** 160, 4), 3)
+
+        for _i in range(100):
+            self.assertIn(get_serial_partition(x509.random_serial_number(), 3), [0, 1, 2])
+
+    def test_format_crl_urls(self):
+        urls = ['http://example.com/crl/{partition}/', 'http://example.com/crl']
+        self.assertEqual(format_crl_urls(urls), ['http://example.com/crl'])
+        self.assertEqual(format_crl_urls(urls, partition=3),
+                         ['http://example.com/crl/3/', 'http://example.com/crl'])
+        self.assertEqual(format_crl_urls(urls, partition=0),
+                         ['http://example.com/crl/0/', 'http://example.com/crl'])
+
+
 class ValidateKeyParametersTest(TestCase):
     def test_basic(self):
         self.assertEqual(validate_key_parameters(), (ca_settings.CA_DEFAULT_KEY_SIZE, 'RSA', None))
@@ -914,3 +978,260 @@ class GeneralNameListTestCase(DjangoCATestCase):
         l4 = GeneralNameList([self.dns1])
         with self.assertTrue():
             l4[0] = True
+
+
+@override_settings(CA_CACHE_CHUNK_SIZE=10)
+class ChunkedCacheTestCase(TestCase):
+    def setUp(self):
+        super(ChunkedCacheTestCase, self).setUp()
+        cache.clear()
+
+    def test_small(self):
+        set_chunked_cache({'small': b'0123456789'}, 60)
+        self.assertEqual(cache.get('small'), b'0123456789')  # stored unchanged
+        self.assertEqual(cache.get('small_version'), hashlib.sha256(b'0123456789').hexdigest())
+        self.assertEqual(get_chunked_cache('small'), b'0123456789')
+        self.assertIsNone(get_chunked_cache('missing'))
+
+    def test_chunks(self):
+        value = b'0123456789' * 10 + b'abc'
+        set_chunked_cache({'large': value, 'other': value * 2}, 60)
+        manifest = cache.get('large')
+        self.assertEqual(manifest['chunks'], 11)
+
+        self.assertEqual(get_chunked_cache('large'), value)
+        self.assertEqual(get_chunked_cache('other'), value * 2)
+
+    def test_missing_chunk(self):
+        set_chunked_cache({'large': b'0123456789' * 3}, 60)
+        manifest = cache.get('large')
+        cache.delete('large_%s_2' % manifest['sha256'][:16])
+        self.assertIsNone(get_chunked_cache('large'))
+
+    def test_corrupted_chunk(self):
+        set_chunked_cache({'large': b'0123456789' * 3}, 60)
+        manifest = cache.get('large')
+        cache.set('large_%s_2' % manifest['sha256'][:16], b'9876543210')
+        self.assertIsNone(get_chunked_cache('large'))
+
+
+@override_settings(CA_LOCAL_CACHE_SIZE=25)
+class LocalCacheTestCase(DjangoCATestCase):
+    def setUp(self):
+        super(LocalCacheTestCase, self).setUp()
+        cache.clear()
+        self.cache = LocalCache()
+
+    def test_get(self):
+        set_chunked_cache({'key': b'value'}, 60)
+        self.assertEqual(self.cache.get('key'), b'value')
+
+        # The second time, the value is served from memory
+        with self.patch('django_ca.utils.get_chunked_cache') as get:
+            self.assertEqual(self.cache.get('key'), b'value')
+        get.assert_not_called()
+
+        # A new value is retrieved from the shared cache
+        set_chunked_cache({'key': b'new'}, 60)
+        self.assertEqual(self.cache.get('key'), b'new')
+
+        # ... and so is a value that was removed from the shared cache
+        cache.clear()
+        self.assertIsNone(self.cache.get('key'))
+        self.assertIsNone(self.cache.get('missing'))
+
+    def test_max_size(self):
+        set_chunked_cache({'key1': b'0123456789', 'key2': b'0123456789', 'key3': b'0123456789',
+                           'large': b'0123456789' * 3}, 60)
+        self.assertEqual(self.cache.get('key1'), b'0123456789')
+        self.assertEqual(self.cache.get('key2'), b'0123456789')
+        self.assertEqual(self.cache.get('key1'), b'0123456789')  # key1 is now the most recently used key
+        self.assertEqual(self.cache.get('key3'), b'0123456789')
+        self.assertEqual(list(self.cache._entries), ['key1', 'key3'])
+        self.assertEqual(self.cache._size, 20)
+
+        # Values that are too large are not stored
+        self.assertEqual(self.cache.get('large'), b'0123456789' * 3)
+        self.assertEqual(list(self.cache._entries), ['key1', 'key3'])
+
+        self.cache.clear('key1')
+        self.assertEqual(self.cache._size, 10)
+        self.cache.clear()
+        self.assertEqual(self.cache._size, 0)
+
+    @override_settings(CA_LOCAL_CACHE_SIZE=0)
+    def test_disabled(self):
+        set_chunked_cache({'key': b'value'}, 60)
+        self.assertEqual(self.cache.get('key'), b'value')
+        self.assertEqual(self.cache._size, 0)
+
+
+@override_settings(CA_KEY_CACHE_TIMEOUT=60)
+class KeyCacheTestCase(DjangoCATestCase):
+    def setUp(self):
+        super(KeyCacheTestCase, self).setUp()
+        self.cache = KeyCache()
+        self.load = Mock(side_effect=lambda: object())
+
+    @override_tmpcadir()
+    def test_basic(self):
+        path = os.path.join(ca_settings.CA_DIR, 'test.key')
+        with open(path, 'wb') as stream:
+            stream.write(b'key data')
+
+        key = self.cache.get('AB:CD', path, b'password', self.load)
+        self.assertIs(self.cache.get('AB:CD', path, b'password', self.load), key)
+        self.assertEqual(self.load.call_count, 1)
+
+        # A different password loads the key again
+        self.assertIsNot(self.cache.get('AB:CD', path, b'wrong', self.load), key)
+        self.assertIsNot(self.cache.get('AB:CD', path, None, self.load), key)
+        self.assertEqual(self.load.call_count, 3)
+
+        # ... and so does a changed file
+        key = self.cache.get('AB:CD', path, None, self.load)
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertIsNot(self.cache.get('AB:CD', path, None, self.load), key)
+        self.assertEqual(self.load.call_count, 4)  # the first key was already cached
+
+        # ... or when the key has expired
+        key = self.cache.get('AB:CD', path, None, self.load)
+        now = time.monotonic()
+        with self.patch('django_ca.utils.time.monotonic', return_value=now + 61):
+            self.assertIsNot(self.cache.get('AB:CD', path, None, self.load), key)
+        self.assertEqual(self.load.call_count, 5)
+
+        key = self.cache.get('AB:CD', path, None, self.load)
+        self.cache.clear('AB:CD')
+        self.assertIsNot(self.cache.get('AB:CD', path, None, self.load), key)
+        self.assertEqual(self.load.call_count, 6)
+
+        self.cache.clear()
+        self.assertEqual(self.cache._entries, {})
+
+    @override_tmpcadir()
+    def test_file_not_found(self):
+        self.cache.get('AB:CD', 'test.key', None, self.load)
+        self.cache.get('AB:CD', 'test.key', None, self.load)
+        self.assertEqual(self.load.call_count, 2)
+        self.assertEqual(self.cache._entries, {})
+
+    @override_settings(CA_KEY_CACHE_TIMEOUT=None)
+    def test_disabled(self):
+        self.cache.get('AB:CD', 'test.key', None, self.load)
+        self.assertEqual(self.load.call_count, 1)
+        self.assertEqual(self.cache._entries, {})
+
+
+@override_settings(CA_KEY_POOL_SIZE=2)
+class KeyPoolTestCase(DjangoCATestCase):
+    def setUp(self):
+        super(KeyPoolTestCase, self).setUp()
+        self.pool = KeyPool()
+
+    def tearDown(self):
+        super(KeyPoolTestCase, self).tearDown()
+        if self.pool._executor is not None:
+            self.pool._executor.shutdown()
+
+    def test_fill(self):
+        curve = ec.SECP256R1()
+        self.pool.fill(None, 'ECC', curve, wait=True)
+        self.assertEqual(len(self.pool._keys[(None, 'ECC', 'SECP256R1')]), 2)
+        self.assertEqual(self.pool._pending[(None, 'ECC', 'SECP256R1')], 0)
+
+        key = self.pool.get(None, 'ECC', curve)
+        self.assertIsInstance(key, ec.EllipticCurvePrivateKey)
+        self.assertIsInstance(key.curve, ec.SECP256R1)
+
+        # a new key was requested in the background
+        params = (None, 'ECC', 'SECP256R1')
+        self.assertEqual(len(self.pool._keys[params]) + self.pool._pending[params], 2)
+
+        # keys with other parameters are not used
+        self.assertIsNone(self.pool.get(None, 'ECC', ec.SECP384R1()))
+        self.assertIsNone(self.pool.get(1024, 'RSA', None))
+
+        self.pool.clear()
+        self.assertIsNone(self.pool.get(None, 'ECC', curve))
+
+    def test_generate_private_key(self):
+        self.pool.fill(1024, 'RSA', None, wait=True)
+        keys = list(self.pool._keys[(1024, 'RSA', None)])
+        with self.patch('django_ca.utils.key_pool', self.pool):
+            self.assertIs(utils.generate_private_key(1024, 'RSA', None), keys[0])
+
+    @override_settings(CA_KEY_POOL_SIZE=0)
+    def test_disabled(self):
+        self.assertIsNone(self.pool.get(1024, 'RSA', None))
+        self.assertEqual(self.pool._pending, {})
+
+    def test_get_without_fill(self):
+        # Getting a key does not start generating keys with parameters the pool was never filled with
+        self.assertIsNone(self.pool.get(1024, 'RSA', None))
+        self.assertIsNone(self.pool._executor)
+        self.assertEqual(self.pool._pending, {})
+
+    @override_settings(CA_KEY_POOL_SIZE=4)
+    def test_refill_threshold(self):
+        params = (1024, 'RSA', None)
+        self.pool.fill(1024, 'RSA', None, wait=True)
+
+        # Keys are only generated again when half of the keys are used
+        self.assertIsNotNone(self.pool.get(1024, 'RSA', None))
+        self.assertEqual(len(self.pool._keys[params]), 3)
+        self.assertEqual(self.pool._pending[params], 0)
+
+        with self.patch_object(self.pool, 'fill') as fill:
+            self.assertIsNotNone(self.pool.get(1024, 'RSA', None))
+        fill.assert_called_once_with(1024, 'RSA', None)
+
+    def test_failed(self):
+        params = (1024, 'RSA', None)
+        executor = Mock()
+        future = Future()
+        future.set_exception(BrokenProcessPool('broken'))
+        self.pool._executor = executor
+        self.pool._pending[params] = 1
+        self.pool._futures.add(future)
+
+        # Errors are logged and a broken pool is replaced with the next fill()
+        with self.assertLogs('django_ca.utils', 'ERROR'):
+            self.pool._add(executor, params, future)
+        self.assertIsNone(self.pool._executor)
+        self.assertEqual(self.pool._pending[params], 0)
+        self.assertEqual(self.pool._futures, set())
+        self.assertNotIn(params, self.pool._keys)
+
+    def test_fork(self):
+        # A pool inherited from the parent process is not used in a forked process
+        params = (1024, 'RSA', None)
+        inherited = Mock()
+        self.pool._executor = inherited
+        self.pool._pid = os.getpid() + 1
+        self.pool._pending[params] = 2
+
+        self.pool.fill(1024, 'RSA', None, wait=True)
+        inherited.submit.assert_not_called()
+        self.assertIsNot(self.pool._executor, inherited)
+        self.assertEqual(self.pool._pid, os.getpid())
+        self.assertEqual(len(self.pool._keys[params]), 2)
+        self.assertEqual(self.pool._pending[params], 0)
+
+    def test_shutdown(self):
+        params = (1024, 'RSA', None)
+        executor = self.pool._executor = ProcessPoolExecutor(max_workers=1)
+        self.pool._pid = os.getpid()
+        self.pool.fill(1024, 'RSA', None, count=20)
+        futures = list(self.pool._futures)
+        thread = executor._executor_manager_thread
+        self.pool._shutdown()
+        self.assertIsNone(self.pool._executor)
+        thread.join()  # keys that were already being generated are still added
+
+        # Keys that were not generated yet are discarded
+        self.assertTrue(any(f.cancelled() for f in futures))
+        self.assertEqual(self.pool._pending[params], 0)
+        self.assertEqual(self.pool._futures, set())
+        self.assertLess(len(self.pool._keys[params]), 20)
@@ -12,19 +12,26 @@
 # see <http://www.gnu.org/licenses/>.
 
 import copy
+import hashlib
 
 from cryptography import x509
+from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.serialization import Encoding
+from cryptography.x509.oid import ExtensionOID
 
 from django.conf.urls import url
 from django.core.cache import cache
+from django.db import connection
 from django.test import Client
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from freezegun import freeze_time
 
 from .. import ca_settings
+from ..models import CRLPublication
+from ..utils import get_crl_cache_key
 from ..views import CertificateRevocationListView
 from .base import DjangoCAWithCertTestCase
 from .base import DjangoCAWithGeneratedCAsTestCase
@@ -46,6 +53,12 @@ urlpatterns = [
     url(r'^crl/ca/(?P<serial>[0-9A-F:]+)/$', CertificateRevocationListView.as_view(
         scope='ca', type=Encoding.PEM
     ), name='ca_crl'),
+    url(r'^freshest/(?P<serial>[0-9A-F:]+)/$',
+        CertificateRevocationListView.as_view(freshest_crl=['http://localhost/delta']), name='freshest'),
+    url(r'^delta/(?P<serial>[0-9A-F:]+)/$', CertificateRevocationListView.as_view(delta=True, expires=60),
+        name='delta'),
+    url(r'^no-wait/(?P<serial>[0-9A-F:]+)/$', CertificateRevocationListView.as_view(lock_timeout=0),
+        name='no-wait'),
 ]
 
 
@@ -85,6 +98,36 @@ class GenericCRLViewTests(DjangoCAWithCertTestCase):
         self.assertCRL(response.content, encoding=Encoding.DER, expires=600, idp=idp, certs=[cert],
                        crl_number=1)
 
+    @override_tmpcadir()
+    def test_http_caching(self):
+        url = reverse('default', kwargs={'serial': self.ca.serial})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = '"%s"' % hashlib.sha1(response.content).hexdigest()
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response['Last-Modified'], 'Sun, 14 Apr 2019 12:26:00 GMT')
+        self.assertEqual(response['Expires'], 'Sun, 14 Apr 2019 12:36:00 GMT')
+        self.assertEqual(response['Cache-Control'], 'public, no-transform, must-revalidate, max-age=600')
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH='"foo"')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE='Sun, 14 Apr 2019 12:26:00 GMT')
+        self.assertEqual(response.status_code, 304)
+
+        # PEM-encoded CRLs also get cache headers, max-age counts down until the CRL expires
+        with freeze_time('2019-04-14 12:27:00'):
+            response = self.client.get(reverse('ca_crl', kwargs={'serial': self.cas['root'].serial}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Last-Modified'], 'Sun, 14 Apr 2019 12:27:00 GMT')
+        self.assertEqual(response['Cache-Control'], 'public, no-transform, must-revalidate, max-age=600')
+
+        with freeze_time('2019-04-14 12:30:00'):
+            response = self.client.get(reverse('ca_crl', kwargs={'serial': self.cas['root'].serial}))
+        self.assertEqual(response['Last-Modified'], 'Sun, 14 Apr 2019 12:27:00 GMT')
+        self.assertEqual(response['Cache-Control'], 'public, no-transform, must-revalidate, max-age=420')
+
     @override_tmpcadir()
     def test_full_scope(self):
         full_name = 'http://localhost/crl'
@@ -126,6 +169,179 @@ class GenericCRLViewTests(DjangoCAWithCertTestCase):
         self.assertEqual(response['Content-Type'], 'text/plain')
         self.assertCRL(response.content, expires=600, idp=idp, certs=[child], crl_number=1, signer=root)
 
+    @override_tmpcadir()
+    def test_delta(self):
+        idp = self.get_idp(full_name=self.get_idp_full_name(self.ca), only_contains_user_certs=True)
+        url = reverse('delta', kwargs={'serial': self.ca.serial})
+        cache_key = get_crl_cache_key(self.ca.serial, hashes.SHA512(), Encoding.DER, scope='user', delta=True)
+
+        # no complete CRL yet, requests waiting for this request do not wait any longer
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 404)
+        self.assertTrue(cache.get('%s_failed' % cache_key))
+
+        response = self.client.get(reverse('freshest', kwargs={'serial': self.ca.serial}))
+        self.assertEqual(response.status_code, 200)
+        crl = x509.load_der_x509_crl(response.content, default_backend())
+        freshest_crl = crl.extensions.get_extension_for_class(x509.FreshestCRL).value
+        self.assertEqual(freshest_crl[0].full_name,
+                         [x509.UniformResourceIdentifier('http://localhost/delta')])
+
+        # Only published CRLs are used as base CRL
+        self.assertIsNone(self.ca.get_base_crl(scope='user'))
+        self.ca.cache_crls()
+
+        with freeze_time('2019-04-14 12:30:00'):
+            cert = self.certs['child-cert']
+            cert.revoke()
+
+            delta_indicator = x509.Extension(oid=ExtensionOID.DELTA_CRL_INDICATOR, critical=True,
+                                             value=x509.DeltaCRLIndicator(1))
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'application/pkix-crl')
+            self.assertCRL(response.content, encoding=Encoding.DER, expires=60, idp=idp, certs=[cert],
+                           crl_number=2, extensions=[delta_indicator])
+
+    @override_tmpcadir()
+    def test_queries(self):
+        # Certificates issued by the CA must not be loaded, as there may be millions of them
+        self.certs['child-cert'].revoke()
+        self.ca.get_crl(scope='user')  # creates the CRL number counter
+        url = reverse('default', kwargs={'serial': self.ca.serial})
+
+        # Stored CRL, CA, revoked certificates and CRL number (savepoint, update, select, release)
+        with self.assertNumQueries(7), CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        for query in context.captured_queries:
+            self.assertNotIn('"django_ca_certificate"."pub"', query['sql'])
+            self.assertNotIn('"django_ca_certificate"."csr"', query['sql'])
+
+        view = CertificateRevocationListView(kwargs={'serial': self.ca.serial})
+        ca = view.get_object()
+        self.assertFalse(hasattr(ca, '_prefetched_objects_cache'))
+
+    @override_tmpcadir()
+    def test_published_crl(self):
+        root = self.cas['root']
+        url = reverse('default', kwargs={'serial': self.ca.serial})
+        ca_url = reverse('ca_crl', kwargs={'serial': root.serial})
+
+        # CRLs generated by the view are not stored
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertFalse(CRLPublication.objects.exists())
+
+        self.ca.cache_crls()
+        root.cache_crls()
+        publication = CRLPublication.objects.get(ca=self.ca, scope='user')
+        self.assertFalse(publication.delta)
+        self.assertEqual(publication.algorithm, 'sha512')
+        crl = publication.read()
+        ca_crl = x509.load_der_x509_crl(CRLPublication.objects.get(ca=root, scope='ca').read(),
+                                        default_backend()).public_bytes(Encoding.PEM)
+
+        # After the cache was cleared, the stored CRLs are used (PEM encoded CRLs are converted)
+        cache.clear()
+        with self.patch('django_ca.models.CertificateAuthority.get_crl') as get_crl:
+            self.assertEqual(self.client.get(url).content, crl)
+            self.assertEqual(self.client.get(ca_url).content, ca_crl)
+        get_crl.assert_not_called()
+
+        # Stored CRLs with less then half of their lifetime left are not used
+        cache.clear()
+        with freeze_time('2019-04-15 00:27:00'):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.content, crl)
+
+        # Stored CRLs that cannot be read are ignored
+        cache.clear()
+        CRLPublication.objects.update(path='crl/does-not-exist.der')
+        with self.assertLogs('django_ca.views', level='ERROR'):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        # Stored CRLs with different extensions are not used
+        self.ca.cache_crls(force=True)
+        crl = CRLPublication.objects.get(ca=self.ca, scope='user').read()
+        cache.clear()
+        self.assertNotEqual(self.client.get(reverse('freshest', kwargs={'serial': self.ca.serial})).content,
+                            crl)
+        cache.clear()
+        CRLPublication.objects.update(full_name='URI:http://crl.example.net')
+        self.assertNotEqual(self.client.get(url).content, crl)
+
+    @override_tmpcadir(CA_CACHE_CHUNK_SIZE=100)
+    def test_chunked_cache(self):
+        url = reverse('default', kwargs={'serial': self.ca.serial})
+        cache_key = get_crl_cache_key(self.ca.serial, hashes.SHA512(), Encoding.DER, scope='user')
+        crl = self.client.get(url).content
+        self.assertGreater(len(crl), 100)
+        self.assertIsInstance(cache.get(cache_key), dict)
+
+        # The CRL is now served from the cache
+        with self.patch('django_ca.views.CertificateRevocationListView.get_published_crl') as get_crl, \
+                self.patch('django_ca.views.CertificateRevocationListView.generate_crl') as generate_crl:
+            self.assertEqual(self.client.get(url).content, crl)
+        get_crl.assert_not_called()
+        generate_crl.assert_not_called()
+
+    @override_tmpcadir()
+    def test_lock(self):
+        cache_key = get_crl_cache_key(self.ca.serial, hashes.SHA512(), Encoding.DER, scope='user')
+        lock_key = '%s_lock' % cache_key
+        stale_key = '%s_stale' % cache_key
+        url = reverse('default', kwargs={'serial': self.ca.serial})
+
+        # The lock is released after generating a CRL, which is also stored as stale CRL
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(cache.get(lock_key))
+        self.assertEqual(cache.get(stale_key), response.content)
+        stale_crl = response.content
+
+        # Another request is generating a new CRL, so the stale CRL is returned
+        cache.delete_many([cache_key, '%s_version' % cache_key])
+        cache.add(lock_key, True)
+        with self.patch('django_ca.models.CertificateAuthority.get_crl') as get_crl:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, stale_crl)
+        get_crl.assert_not_called()
+
+        # No stale CRL, so we wait for the other request
+        cache.delete_many([stale_key, '%s_version' % stale_key])
+
+        def sleep(seconds):
+            cache.set(cache_key, stale_crl)
+
+        with self.patch('django_ca.models.CertificateAuthority.get_crl') as get_crl, \
+                self.patch('django_ca.views.time.sleep', side_effect=sleep) as sleep_mock:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, stale_crl)
+        get_crl.assert_not_called()
+        sleep_mock.assert_called_once_with(0.1)
+
+        # The other request did not generate a CRL, so we do not wait for it
+        cache.delete_many([cache_key, '%s_version' % cache_key])
+        cache.set('%s_failed' % cache_key, True)
+        with self.patch('django_ca.views.time.sleep') as sleep_mock:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        sleep_mock.assert_not_called()
+        self.assertTrue(cache.get(lock_key))  # not our lock
+
+        # The other request takes too long, so we ask the client to try again later
+        cache.delete_many([cache_key, '%s_version' % cache_key, '%s_failed' % cache_key])
+        with self.patch('django_ca.models.CertificateAuthority.get_crl') as get_crl:
+            response = self.client.get(reverse('no-wait', kwargs={'serial': self.ca.serial}))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '0')
+        get_crl.assert_not_called()
+        self.assertTrue(cache.get(lock_key))  # not our lock
+
     @override_tmpcadir()
     def test_password(self):
         ca = self.cas['pwd']
@@ -12,7 +12,9 @@
 # see <http://www.gnu.org/licenses/>
 
 import base64
+import hashlib
 import os
+import tempfile
 from datetime import timedelta
 
 import asn1crypto
@@ -21,6 +23,7 @@ import ocspbuilder
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.serialization import Encoding
+from cryptography.x509 import ocsp
 from oscrypto import asymmetric
 
 from django.conf import settings
@@ -34,10 +37,14 @@ from freezegun import freeze_time
 from .. import ca_settings
 from ..constants import ReasonFlags
 from ..models import Certificate
+from ..ocsp import get_cert_id
+from ..status_index import get_status_index
 from ..subject import Subject
+from ..utils import add_colons
 from ..utils import ca_storage
 from ..utils import hex_to_bytes
 from ..utils import int_to_hex
+from ..utils import read_file
 from ..views import OCSPView
 from .base import DjangoCAWithCertTestCase
 from .base import certs
@@ -71,7 +78,6 @@ req1_nonce = hex_to_bytes(ocsp_data['nonce']['nonce'])
 req1_asn1_nonce = hex_to_bytes(ocsp_data['nonce']['asn1crypto_nonce'])
 req_no_nonce = _load_req(ocsp_data['no-nonce']['filename'])
 unknown_req = _load_req('unknown-serial')
-multiple_req = _load_req('multiple-serial')
 
 urlpatterns = [
     url(r'^ocsp/$', OCSPView.as_view(
@@ -376,6 +382,109 @@ class OCSPTestView(OCSPViewTestMixin, DjangoCAWithCertTestCase):
         self.assertEqual(response.status_code, 200)
         self.assertOCSP(response, requested=[cert], nonce=req1_nonce, expires=1500)
 
+    @override_tmpcadir()
+    def test_http_caching(self):
+        url = reverse('get', kwargs={'data': base64.b64encode(req1).decode('utf-8')})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = '"%s"' % hashlib.sha1(response.content).hexdigest()
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response['Last-Modified'], 'Sun, 03 Feb 2019 15:43:12 GMT')
+        self.assertEqual(response['Expires'], 'Sun, 03 Feb 2019 15:53:12 GMT')
+        self.assertEqual(response['Cache-Control'], 'public, no-transform, must-revalidate, max-age=600')
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE='Sun, 03 Feb 2019 15:43:12 GMT')
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE='Sun, 03 Feb 2019 15:43:11 GMT')
+        self.assertEqual(response.status_code, 200)
+
+        # POST requests are not cacheable
+        response = self.client.post(reverse('post'), req1, content_type='application/ocsp-request')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+        self.assertNotIn('Cache-Control', response)
+
+        # Unsuccessful responses must not be cached
+        data = base64.b64encode(b'foobar').decode('utf-8')
+        response = self.client.get(reverse('get', kwargs={'data': data}))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+
+    @override_tmpcadir()
+    def test_status_index(self):
+        ca = self.cas['child']
+        cert = self.certs['child-cert']
+        data = base64.b64encode(req1).decode('utf-8')
+
+        with tempfile.TemporaryDirectory() as index_dir, self.settings(CA_OCSP_INDEX_DIR=index_dir):
+            ca.build_ocsp_index()
+
+            # Only CAs are loaded (once) from the database
+            with self.assertNumQueries(1):
+                response = self.client.get(reverse('get', kwargs={'data': data}))
+            self.assertEqual(response.status_code, 200)
+            self.assertOCSP(response, requested=[cert], nonce=req1_nonce)
+
+            # revoking the certificate does not update the index before the revocation is committed
+            index = get_status_index(index_dir, ca.serial)
+            cert.revoke(ReasonFlags.key_compromise)
+            self.assertFalse(index.get(cert.x509.serial_number).revoked)
+
+            # revoking the certificate updates the index
+            with self.on_commit():
+                cert.revoke(ReasonFlags.key_compromise)
+            with self.assertNumQueries(0):
+                response = self.client.get(reverse('get', kwargs={'data': data}))
+            self.assertEqual(response.status_code, 200)
+            self.assertOCSP(response, requested=[cert], nonce=req1_nonce)
+
+            # newly issued certificates are also added to the index
+            with self.on_commit():
+                new = self.create_cert(ca, certs['child-cert']['csr']['parsed'], [('CN', 'new.example.com')])
+            req = asn1crypto.ocsp.OCSPRequest({'tbs_request': {'request_list': [
+                {'req_cert': get_cert_id(ca, new.x509.serial_number)},
+            ]}}).dump()
+            with self.assertNumQueries(0):
+                response = self.client.post(reverse('post'), req, content_type='application/ocsp-request')
+            self.assertEqual(response.status_code, 200)
+            self.assertOCSP(response, requested=[new], expires=1200)
+
+        # Certificates missing from the index are loaded from the database
+        with tempfile.TemporaryDirectory() as index_dir, self.settings(CA_OCSP_INDEX_DIR=index_dir):
+            with self.assertNumQueries(1):
+                response = self.client.get(reverse('get', kwargs={'data': data}))
+            self.assertEqual(response.status_code, 200)
+            self.assertOCSP(response, requested=[cert], nonce=req1_nonce)
+
+    @override_tmpcadir()
+    def test_responder_cache(self):
+        cert = self.certs['child-cert']
+        url = reverse('post')
+
+        with mock.patch('django_ca.views.read_file', side_effect=read_file) as read_mock:
+            response = self.client.post(url, req1, content_type='application/ocsp-request')
+            self.assertOCSP(response, requested=[cert], nonce=req1_nonce, expires=1200)
+            self.assertEqual(read_mock.call_count, 2)  # key and certificate
+
+            # Second request uses the cached key and certificate
+            response = self.client.post(url, req1, content_type='application/ocsp-request')
+            self.assertOCSP(response, requested=[cert], nonce=req1_nonce, expires=1200)
+            self.assertEqual(read_mock.call_count, 2)
+
+            # Update the modification time of the private key, which should cause it to be reloaded
+            path = ca_storage.path(ocsp_profile['key_filename'])
+            stat = os.stat(path)
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+            response = self.client.post(url, req1, content_type='application/ocsp-request')
+            self.assertOCSP(response, requested=[cert], nonce=req1_nonce, expires=1200)
+            self.assertEqual(read_mock.call_count, 3)
+
     @override_tmpcadir()
     def test_loaded_cryptography_cert(self):
         cert = self.certs['child-cert']
@@ -423,11 +532,16 @@ class OCSPTestView(OCSPViewTestMixin, DjangoCAWithCertTestCase):
         self.assertEqual(response.status_code, 200)
         self.assertOCSP(response, requested=[cert], nonce=req1_nonce, expires=1200)
 
+    @override_tmpcadir()
     def test_ca_ocsp(self):
-        data = base64.b64encode(req1).decode('utf-8')
+        data = asn1crypto.ocsp.OCSPRequest({'tbs_request': {'request_list': [
+            {'req_cert': get_cert_id(self.cas['root'], self.cas['child'].x509.serial_number)},
+        ]}}).dump()
+        data = base64.b64encode(data).decode('utf-8')
         response = self.client.get(reverse('get-ca', kwargs={'data': data}))
         self.assertEqual(response.status_code, 200)
-        asn1crypto.ocsp.OCSPResponse.load(response.content)
+        ocsp_response = asn1crypto.ocsp.OCSPResponse.load(response.content)
+        self.assertEqual(ocsp_response['response_status'].native, 'successful')
         #self.assertOCSP(response, requested=[self.cert], nonce=req1_nonce, expires=1200)
 
     def test_bad_ca(self):
@@ -443,7 +557,10 @@ class OCSPTestView(OCSPViewTestMixin, DjangoCAWithCertTestCase):
         self.assertEqual(ocsp_response['response_status'].native, 'internal_error')
 
     def test_unknown(self):
-        data = base64.b64encode(unknown_req).decode('utf-8')
+        data = asn1crypto.ocsp.OCSPRequest({'tbs_request': {'request_list': [
+            {'req_cert': get_cert_id(self.cas['child'], 123)},
+        ]}}).dump()
+        data = base64.b64encode(data).decode('utf-8')
         with self.assertLogs() as cm:
             response = self.client.get(reverse('get', kwargs={'data': data}))
         self.assertEqual(cm.output, [
@@ -453,6 +570,18 @@ class OCSPTestView(OCSPViewTestMixin, DjangoCAWithCertTestCase):
         ocsp_response = asn1crypto.ocsp.OCSPResponse.load(response.content)
         self.assertEqual(ocsp_response['response_status'].native, 'internal_error')
 
+    def test_unknown_issuer(self):
+        # request was created for a different CA
+        data = base64.b64encode(unknown_req).decode('utf-8')
+        with self.assertLogs() as cm:
+            response = self.client.get(reverse('get', kwargs={'data': data}))
+        self.assertEqual(cm.output, [
+            'WARNING:django_ca.views:OCSP request for certificate issued by a different CA received.',
+        ])
+        self.assertEqual(response.status_code, 200)
+        ocsp_response = asn1crypto.ocsp.OCSPResponse.load(response.content)
+        self.assertEqual(ocsp_response['response_status'].native, 'internal_error')
+
     def _test_bad_responder_cert(self):
         # TODO: can't make sense of what this is supposed to test
         data = base64.b64encode(req1).decode('utf-8')
@@ -473,9 +602,53 @@ class OCSPTestView(OCSPViewTestMixin, DjangoCAWithCertTestCase):
         ocsp_response = asn1crypto.ocsp.OCSPResponse.load(response.content)
         self.assertEqual(ocsp_response['response_status'].native, 'malformed_request')
 
+    @override_tmpcadir()
     def test_multiple(self):
-        data = base64.b64encode(multiple_req).decode('utf-8')
-        response = self.client.get(reverse('get', kwargs={'data': data}))
+        ca = self.cas['child']
+        cert = self.certs['child-cert']
+        revoked = self.create_cert(ca, certs['child-cert']['csr']['parsed'], [('CN', 'revoked.example.com')])
+        revoked.revoke(ReasonFlags.key_compromise)
+
+        data = asn1crypto.ocsp.OCSPRequest({'tbs_request': {'request_list': [
+            {'req_cert': get_cert_id(ca, cert.x509.serial_number)},
+            {'req_cert': get_cert_id(ca, revoked.x509.serial_number)},
+        ]}}).dump()
+
+        # one query for the CA and one for all certificates
+        with self.assertNumQueries(2):
+            response = self.client.post(reverse('post'), data, content_type='application/ocsp-request')
+        self.assertEqual(response.status_code, 200)
+        self.assertOCSP(response, requested=[cert, revoked], expires=1200)
+
+        # If only one certificate is unknown, the whole request fails
+        data = asn1crypto.ocsp.OCSPRequest({'tbs_request': {'request_list': [
+            {'req_cert': get_cert_id(ca, cert.x509.serial_number)},
+            {'req_cert': get_cert_id(ca, 123)},
+        ]}}).dump()
+        with self.assertLogs() as cm:
+            response = self.client.post(reverse('post'), data, content_type='application/ocsp-request')
+        self.assertEqual(cm.output, ['WARNING:django_ca.views:OCSP request for unknown cert received.'])
+        ocsp_response = asn1crypto.ocsp.OCSPResponse.load(response.content)
+        self.assertEqual(ocsp_response['response_status'].native, 'internal_error')
+
+    def test_empty_request(self):
+        data = asn1crypto.ocsp.OCSPRequest({'tbs_request': {'request_list': []}}).dump()
+        response = self.client.post(reverse('post'), data, content_type='application/ocsp-request')
+        self.assertEqual(response.status_code, 200)
+        ocsp_response = asn1crypto.ocsp.OCSPResponse.load(response.content)
+        self.assertEqual(ocsp_response['response_status'].native, 'malformed_request')
+
+    def test_critical_extension(self):
+        cert = self.certs['child-cert']
+        data = asn1crypto.ocsp.OCSPRequest({'tbs_request': {
+            'request_list': [{'req_cert': get_cert_id(self.cas['child'], cert.x509.serial_number)}],
+            'request_extensions': [{
+                'extn_id': 'acceptable_responses',
+                'critical': True,
+                'extn_value': ['basic_ocsp_response'],
+            }],
+        }}).dump()
+        response = self.client.post(reverse('post'), data, content_type='application/ocsp-request')
         self.assertEqual(response.status_code, 200)
         ocsp_response = asn1crypto.ocsp.OCSPResponse.load(response.content)
         self.assertEqual(ocsp_response['response_status'].native, 'malformed_request')
@@ -572,6 +745,48 @@ class GenericOCSPViewTestCase(OCSPViewTestMixin, DjangoCAWithCertTestCase):
         # URL config sets expires to 3600
         self.assertOCSP(response, requested=[cert], nonce=req1_nonce, ocsp_cert=ocsp_cert, expires=3600)
 
+    @override_tmpcadir()
+    def test_cached_response(self):
+        ca = self.cas['child']
+        cert = self.certs['child-cert']
+
+        priv_path, cert_path, ocsp_cert = ca.generate_ocsp_key()
+        self.ocsp_private_key = asymmetric.load_private_key(ca_storage.path(priv_path))
+        ca.cache_ocsp_responses(expires=3600)
+
+        builder = ocsp.OCSPRequestBuilder()
+        builder = builder.add_certificate(cert.x509, cert.ca.x509, hashes.SHA1())
+        url = reverse('django_ca:ocsp-cert-get', kwargs={
+            'serial': ca.serial,
+            'data': base64.b64encode(builder.build().public_bytes(Encoding.DER)).decode('utf-8'),
+        })
+
+        # Requests without a nonce are served from the cache
+        with self.patch('django_ca.ocsp.get_response', side_effect=Exception('not cached')):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertOCSP(response, requested=[cert], nonce=None, ocsp_cert=ocsp_cert, expires=3600)
+
+        # Requests with a nonce are always signed
+        nonce_url = reverse('django_ca:ocsp-cert-get', kwargs={
+            'serial': ca.serial,
+            'data': base64.b64encode(req1).decode('utf-8'),
+        })
+        with self.patch('django_ca.ocsp.get_response', side_effect=Exception('not cached')) as mock, \
+                self.assertLogs():
+            response = self.client.get(nonce_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock.call_count, 1)
+        response = self.client.get(nonce_url)
+        self.assertOCSP(response, requested=[cert], nonce=req1_nonce, ocsp_cert=ocsp_cert, expires=3600)
+
+        # Revoking removes the cached response, so the new status is returned right away
+        with self.on_commit():
+            cert.revoke()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertOCSP(response, requested=[cert], nonce=None, ocsp_cert=ocsp_cert, expires=3600)
+
     @override_tmpcadir()
     def test_cert_method_not_allowed(self):
         url = reverse('django_ca:ocsp-cert-post', kwargs={
@@ -586,3 +801,82 @@ class GenericOCSPViewTestCase(OCSPViewTestMixin, DjangoCAWithCertTestCase):
         })
         response = self.client.post(url, req1, content_type='application/ocsp-request')
         self.assertEqual(response.status_code, 405)
+
+    @override_tmpcadir()
+    def test_unified(self):
+        ca = self.cas['child']
+        cert = self.certs['child-cert']
+        priv_path, cert_path, ocsp_cert = ca.generate_ocsp_key()
+        self.ocsp_private_key = asymmetric.load_private_key(ca_storage.path(priv_path))
+
+        # The CA is selected by the issuer hashes in the request
+        url = reverse('django_ca:ocsp-get', kwargs={'data': base64.b64encode(req1).decode('utf-8')})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertOCSP(response, requested=[cert], nonce=req1_nonce, ocsp_cert=ocsp_cert, expires=3600)
+
+        response = self.client.post(reverse('django_ca:ocsp-post'), req1,
+                                    content_type='application/ocsp-request')
+        self.assertEqual(response.status_code, 200)
+        self.assertOCSP(response, requested=[cert], nonce=req1_nonce, ocsp_cert=ocsp_cert, expires=3600)
+
+        # Intermediate CAs are answered by the same URL
+        root = self.cas['root']
+        priv_path, cert_path, ocsp_cert = root.generate_ocsp_key()
+        self.ocsp_private_key = asymmetric.load_private_key(ca_storage.path(priv_path))
+        req = asn1crypto.ocsp.OCSPRequest({'tbs_request': {'request_list': [
+            {'req_cert': get_cert_id(root, ca.x509.serial_number)},
+        ]}}).dump()
+        response = self.client.post(reverse('django_ca:ocsp-post'), req,
+                                    content_type='application/ocsp-request')
+        self.assertEqual(response.status_code, 200)
+        ocsp_response = asn1crypto.ocsp.OCSPResponse.load(response.content)
+        self.assertEqual(ocsp_response['response_status'].native, 'successful')
+        single_response = ocsp_response.response_data['responses'][0]
+        self.assertEqual(single_response['cert_id']['serial_number'].native, ca.x509.serial_number)
+        self.assertEqual(single_response['cert_status'].name, 'good')
+
+    @override_tmpcadir()
+    def test_unified_serial_with_colons(self):
+        # OCSP responder keys are stored without colons in the filename
+        ca = self.cas['child']
+        ca.serial = add_colons(ca.serial)
+        ca.save()
+        priv_path, cert_path, ocsp_cert = ca.generate_ocsp_key()
+        self.ocsp_private_key = asymmetric.load_private_key(ca_storage.path(priv_path))
+
+        response = self.client.post(reverse('django_ca:ocsp-post'), req1,
+                                    content_type='application/ocsp-request')
+        self.assertEqual(response.status_code, 200)
+        self.assertOCSP(response, requested=[self.certs['child-cert']], nonce=req1_nonce, ocsp_cert=ocsp_cert,
+                        expires=3600)
+
+    @override_tmpcadir()
+    def test_unified_unknown_issuer(self):
+        # Certificates issued by an unknown CA
+        req = asn1crypto.ocsp.OCSPRequest({'tbs_request': {'request_list': [
+            {'req_cert': get_cert_id(self.certs['child-cert'], 123)},
+        ]}}).dump()
+        with self.assertLogs() as logcm:
+            response = self.client.post(reverse('django_ca:ocsp-post'), req,
+                                        content_type='application/ocsp-request')
+        self.assertEqual(logcm.output, [
+            'WARNING:django_ca.views:OCSP request for certificate issued by an unknown CA received.',
+        ])
+        self.assertEqual(response.status_code, 200)
+        ocsp_response = asn1crypto.ocsp.OCSPResponse.load(response.content)
+        self.assertEqual(ocsp_response['response_status'].native, 'internal_error')
+
+        # Certificates issued by different CAs cannot be answered in one response
+        req = asn1crypto.ocsp.OCSPRequest({'tbs_request': {'request_list': [
+            {'req_cert': get_cert_id(self.cas['child'], self.certs['child-cert'].x509.serial_number)},
+            {'req_cert': get_cert_id(self.cas['root'], self.certs['root-cert'].x509.serial_number)},
+        ]}}).dump()
+        with self.assertLogs() as logcm:
+            response = self.client.post(reverse('django_ca:ocsp-post'), req,
+                                        content_type='application/ocsp-request')
+        self.assertEqual(logcm.output, [
+            'WARNING:django_ca.views:OCSP request for certificates issued by different CAs received.',
+        ])
+        ocsp_response = asn1crypto.ocsp.OCSPResponse.load(response.content)
+        self.assertEqual(ocsp_response['response_status'].native, 'internal_error')
@@ -16,6 +16,7 @@ from django.conf.urls import url
 from django.urls import path
 from django.urls import register_converter
 
+from . import ca_settings
 from . import converters
 from . import views
 
@@ -35,8 +36,24 @@ urlpatterns = [
          name='ocsp-ca-get'),
     path('crl/<hex:serial>/', views.CertificateRevocationListView.as_view(), name='crl'),
     path('crl/ca/<hex:serial>/', views.CertificateRevocationListView.as_view(scope='ca'), name='ca-crl'),
+    path('crl/<hex:serial>/<int:partition>/', views.CertificateRevocationListView.as_view(),
+         name='crl-partition'),
+    path('crl/ca/<hex:serial>/<int:partition>/', views.CertificateRevocationListView.as_view(scope='ca'),
+         name='ca-crl-partition'),
 ]
 
+if ca_settings.CA_DELTA_CRL_EXPIRES:
+    delta_crl = views.CertificateRevocationListView.as_view(
+        delta=True, expires=ca_settings.CA_DELTA_CRL_EXPIRES)
+    ca_delta_crl = views.CertificateRevocationListView.as_view(
+        scope='ca', delta=True, expires=ca_settings.CA_DELTA_CRL_EXPIRES)
+    urlpatterns += [
+        path('crl/<hex:serial>/delta/', delta_crl, name='crl-delta'),
+        path('crl/ca/<hex:serial>/delta/', ca_delta_crl, name='ca-crl-delta'),
+        path('crl/<hex:serial>/<int:partition>/delta/', delta_crl, name='crl-partition-delta'),
+        path('crl/ca/<hex:serial>/<int:partition>/delta/', ca_delta_crl, name='ca-crl-partition-delta'),
+    ]
+
 
 for name, kwargs in getattr(settings, 'CA_OCSP_URLS', {}).items():
     kwargs.setdefault('ca', name)
@@ -45,3 +62,9 @@ for name, kwargs in getattr(settings, 'CA_OCSP_URLS', {}).items():
         url(r'ocsp/%s/(?P<data>[a-zA-Z0-9=+/]+)$' % name, views.OCSPView.as_view(**kwargs),
             name='ocsp-get-%s' % name)
     ]
+
+# The unified OCSP responder must come last, as the "data" parameter would also match any of the above URLs
+urlpatterns += [
+    path('ocsp/', views.UnifiedOCSPView.as_view(expires=3600), name='ocsp-post'),
+    path('ocsp/<base64:data>', views.UnifiedOCSPView.as_view(expires=3600), name='ocsp-get'),
+]
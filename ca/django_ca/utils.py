@@ -13,16 +13,28 @@
 
 """Central functions to load CA key and cert as PKey/X509 objects."""
 
+import atexit
 import binascii
+import functools
+import hashlib
+import logging
+import multiprocessing
 import os
 import re
 import shlex
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 from datetime import timedelta
 from ipaddress import ip_address
 from ipaddress import ip_network
 
 import idna
+import pytz
 
 from asn1crypto.core import OctetString
 from cryptography import x509
@@ -32,11 +44,16 @@ from cryptography.hazmat.primitives.asymmetric import dsa
 from cryptography.hazmat.primitives.asymmetric import ec
 from cryptography.hazmat.primitives.asymmetric import rsa
 from cryptography.hazmat.primitives.serialization import Encoding
+from cryptography.hazmat.primitives.serialization import NoEncryption
+from cryptography.hazmat.primitives.serialization import PrivateFormat
+from cryptography.hazmat.primitives.serialization import load_pem_private_key
 from cryptography.x509.oid import NameOID
 
+from django.core.cache import cache
 from django.core.files.storage import get_storage_class
 from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import URLValidator
+from django.utils import timezone
 from django.utils.encoding import force_bytes
 from django.utils.encoding import force_text
 from django.utils.functional import Promise
@@ -44,6 +61,8 @@ from django.utils.translation import gettext_lazy as _
 
 from . import ca_settings
 
+log = logging.getLogger(__name__)
+
 # List of possible subject fields, in order
 SUBJECT_FIELDS = ['C', 'ST', 'L', 'O', 'OU', 'CN', 'emailAddress', ]
 
@@ -448,7 +467,9 @@ def generate_private_key(key_size, key_type, ecc_curve):
     """Generate a private key.
 
     This function assumes that you called :py:func:`~django_ca.utils.validate_key_parameters` on the input
-    values and does not do any sanity checks on its own.
+    values and does not do any sanity checks on its own. If :ref:`CA_KEY_POOL_SIZE
+    <settings-ca-key-pool-size>` is set, a pre-generated key from :py:class:`~django_ca.utils.KeyPool` is
+    returned if available.
 
     Parameters
     ----------
@@ -466,6 +487,13 @@ def generate_private_key(key_size, key_type, ecc_curve):
     key
         A private key of the appropriate type.
     """
+    private_key = key_pool.get(key_size, key_type, ecc_curve)
+    if private_key is None:
+        private_key = _generate_private_key(key_size, key_type, ecc_curve)
+    return private_key
+
+
+def _generate_private_key(key_size, key_type, ecc_curve):
     if key_type == 'DSA':
         private_key = dsa.generate_private_key(key_size=key_size, backend=default_backend())
     elif key_type == 'ECC':
@@ -812,6 +840,41 @@ def get_cert_builder(expires, serial=None):
     return builder
 
 
+def get_revoked_certificate(serial, revocation_date, reason='', compromised=None):
+    """Get a :py:class:`~cg:cryptography.x509.RevokedCertificate` used as entry in a CRL.
+
+    Parameters
+    ----------
+
+    serial : int
+        The serial of the revoked certificate.
+    revocation_date : datetime
+        When the certificate was revoked.
+    reason : str, optional
+        The name of the :py:class:`~cg:cryptography.x509.ReasonFlags` member that is the revocation reason.
+    compromised : datetime, optional
+        When the certificate was compromised.
+    """
+    if timezone.is_aware(revocation_date):
+        revocation_date = timezone.make_naive(revocation_date, pytz.utc)
+
+    builder = x509.RevokedCertificateBuilder().serial_number(serial).revocation_date(revocation_date)
+
+    if reason and reason != x509.ReasonFlags.unspecified.name:
+        # RFC 5270, 5.3.1: "reason code CRL entry extension SHOULD be absent instead of using the
+        # unspecified (0) reasonCode value"
+        builder = builder.add_extension(x509.CRLReason(x509.ReasonFlags[reason]), critical=False)
+
+    if compromised:
+        if timezone.is_aware(compromised):
+            compromised = timezone.make_naive(compromised, pytz.utc)
+
+        # RFC 5280, 5.3.2 says that this extension MUST be non-critical
+        builder = builder.add_extension(x509.InvalidityDate(compromised), critical=False)
+
+    return builder.build(default_backend())
+
+
 def read_file(path):
     """Read the file from the given path.
 
@@ -831,6 +894,22 @@ def read_file(path):
         stream.close()
 
 
+def get_file_version(path):
+    """Get a value that changes whenever the file at the given path is changed.
+
+    Like :py:func:`~django_ca.utils.read_file`, absolute paths are read from the local filesystem, relative
+    paths use the storage backend configured using :ref:`CA_FILE_STORAGE <settings-ca-file-storage>`. The
+    function returns ``None`` if the version cannot be determined, e.g. if the file does not exist or the
+    storage backend does not support modification times.
+    """
+    try:
+        if os.path.isabs(path):
+            return os.stat(path).st_mtime_ns
+        return ca_storage.get_modified_time(path)
+    except (NotImplementedError, OSError):
+        return None
+
+
 # Note used currently, but left here for future reference
 #def write_private_file(path, data):
 #    """Function to write binary data to a file that will only be readable to the user."""
@@ -943,8 +1022,409 @@ class GeneralNameList(list):
         list.remove(self, parse_general_name(value))
 
 
-def get_crl_cache_key(serial, algorithm=hashes.SHA512, encoding=Encoding.DER, scope=None):
-    return 'crl_%s_%s_%s_%s' % (serial, algorithm.name, encoding.name, scope)
+def get_crl_cache_key(serial, algorithm=hashes.SHA512, encoding=Encoding.DER, scope=None, delta=False,
+                      partition=None):
+    key = 'crl_%s_%s_%s_%s' % (serial, algorithm.name, encoding.name, scope)
+    if partition is not None:
+        key += '_%s' % partition
+    if delta:
+        key += '_delta'
+    return key
+
+
+def get_crl_counter(scope=None, partition=None):
+    """Get the default counter for CRL numbers for the given scope and partition."""
+    counter = scope or 'all'
+    if partition is not None:
+        counter += '_%s' % partition
+    return counter
+
+
+def get_serial_partition(serial, partitions):
+    """Get the CRL partition of a certificate with the given serial.
+
+    Serials generated by :py:func:`~cg:cryptography.x509.random_serial_number` are evenly distributed below
+    2^159, so this range is split into `partitions` ranges of the same size. Certificates with larger serials
+    (e.g. imported certificates) are in the last partition.
+
+    Parameters
+    ----------
+
+    serial : int or str
+        The serial of the certificate, either as int or as hex string (as stored in the database).
+    partitions : int
+        The number of partitions.
+    """
+    if isinstance(serial, str):
+        serial = int(serial.replace(':', ''), 16)
+    return min((serial * partitions) >> 159, partitions - 1)
+
+
+def format_crl_urls(urls, partition=None):
+    """Replace the ``{partition}`` placeholder in the given CRL URLs.
+
+    If `partition` is ``None``, URLs with a placeholder are skipped.
+    """
+    if partition is None:
+        return [url for url in urls if '{partition}' not in url]
+    return [url.replace('{partition}', str(partition)) for url in urls]
+
+
+def set_chunked_cache(data, timeout):
+    """Store a dictionary of bytes in the cache, splitting large values into chunks.
+
+    Values larger than :ref:`CA_CACHE_CHUNK_SIZE <settings-ca-cache-chunk-size>` are split into chunks that
+    are stored under separate keys. The key itself then stores a manifest with the number of chunks and a
+    SHA-256 hash of the value. Smaller values are stored unchanged. Use :py:func:`get_chunked_cache` to read
+    values.
+
+    The SHA-256 hash of every value is also stored with the ``_version`` suffix, which allows
+    :py:class:`LocalCache` to cheaply check if its copy of a value is still current.
+
+    Note that some cache backends (e.g. memcached) silently fail to store values that are too large, so
+    large CRLs are never cached without chunking.
+    """
+    chunk_size = ca_settings.CA_CACHE_CHUNK_SIZE
+    chunks = {}
+    values = {}
+    for key, value in data.items():
+        digest = hashlib.sha256(value).hexdigest()
+        values['%s_version' % key] = digest
+        if len(value) <= chunk_size:
+            values[key] = value
+            continue
+
+        # The hash is part of the chunk keys, so concurrent writes of different values never mix chunks.
+        count = 0
+        for count, pos in enumerate(range(0, len(value), chunk_size), 1):
+            chunks['%s_%s_%s' % (key, digest[:16], count)] = value[pos:pos + chunk_size]
+        values[key] = {'chunks': count, 'sha256': digest}
+
+    # Chunks are stored first, so that a manifest is never read before its chunks are available.
+    if chunks:
+        cache.set_many(chunks, timeout)
+    cache.set_many(values, timeout)
+
+
+def get_chunked_cache(key):
+    """Get a value stored with :py:func:`set_chunked_cache`.
+
+    All chunks of a large value are retrieved with a single query. Returns ``None`` if the value is not in
+    the cache or if any chunk is missing or does not match the manifest.
+    """
+    value = cache.get(key)
+    if not isinstance(value, dict):
+        return value
+
+    digest = value['sha256']
+    keys = ['%s_%s_%s' % (key, digest[:16], i) for i in range(1, value['chunks'] + 1)]
+    chunks = cache.get_many(keys)
+    if len(chunks) != len(keys):  # some chunks were evicted
+        return None
+
+    value = b''.join(chunks[k] for k in keys)
+    if hashlib.sha256(value).hexdigest() != digest:
+        return None
+    return value
+
+
+class LocalCache:
+    """Process-local LRU cache in front of values stored with :py:func:`set_chunked_cache`.
+
+    Values are served from local memory as long as the version stored in the shared cache matches the
+    version of the local copy, so only the (small) version has to be retrieved from the shared cache. The
+    total size of all values is limited to :ref:`CA_LOCAL_CACHE_SIZE <settings-ca-local-cache-size>` bytes,
+    least recently used values are removed first. Instances are thread-safe.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._size = 0
+
+    def get(self, key):
+        """Get the value for `key`, see :py:func:`get_chunked_cache`."""
+
+        max_size = ca_settings.CA_LOCAL_CACHE_SIZE
+        if not max_size:
+            return get_chunked_cache(key)
+
+        version = cache.get('%s_version' % key)
+        if version is None:  # the value is not in the shared cache (anymore)
+            self.clear(key)
+            return get_chunked_cache(key)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        value = get_chunked_cache(key)
+        if value is None or len(value) > max_size:
+            return value
+
+        # Store the hash of the value we actually received, the value might have changed since we retrieved
+        # the version.
+        version = hashlib.sha256(value).hexdigest()
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._size -= len(entry[1])
+
+            self._entries[key] = (version, value)
+            self._size += len(value)
+            while self._size > max_size:
+                _key, (_version, old_value) = self._entries.popitem(last=False)
+                self._size -= len(old_value)
+        return value
+
+    def clear(self, *keys):
+        """Remove the given keys from the cache, or clear the whole cache if no keys are given."""
+
+        with self._lock:
+            if not keys:
+                self._entries = OrderedDict()
+                self._size = 0
+
+            for key in keys:
+                entry = self._entries.pop(key, None)
+                if entry is not None:
+                    self._size -= len(entry[1])
+
+
+crl_cache = LocalCache()
+
+
+class KeyCache:
+    """Process-wide cache for decrypted private keys of certificate authorities.
+
+    Keys are cached for :ref:`CA_KEY_CACHE_TIMEOUT <settings-ca-key-cache-timeout>` seconds, together with the
+    version of the file they were loaded from (see :py:func:`get_file_version`) and a hash of the password
+    used to load them. A key is loaded again if the file has changed, if the timeout has expired or if a
+    different password is given. Keys are only ever stored in the memory of the current process, never in
+    the cache configured in Django. Instances are thread-safe.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, serial, path, password, load):
+        """Get the private key for the CA with the given `serial`, calling `load` if it is not cached.
+
+        `path` is the path to the private key, used to get the version of the file.
+        """
+        timeout = ca_settings.CA_KEY_CACHE_TIMEOUT
+        if not timeout:
+            return load()
+
+        version = get_file_version(path)
+        if version is None:  # we cannot tell if the file has changed
+            return load()
+
+        version = (path, version)
+        digest = None if password is None else hashlib.sha256(force_bytes(password)).digest()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(serial)
+            if entry is not None and entry[0] == version and entry[1] == digest and entry[2] > now:
+                return entry[3]
+
+        key = load()
+        with self._lock:
+            self._entries[serial] = (version, digest, now + timeout, key)
+        return key
+
+    def clear(self, *serials):
+        """Remove the keys of the given CAs, or clear the whole cache if no serials are given."""
+
+        with self._lock:
+            if not serials:
+                self._entries = {}
+
+            for serial in serials:
+                self._entries.pop(serial, None)
+
+
+key_cache = KeyCache()
+
+
+def _generate_private_key_pem(key_size, key_type, curve_name):
+    # Executed in a worker process of KeyPool. Keys cannot be pickled, so they are returned in PEM format.
+    ecc_curve = getattr(ec, curve_name)() if curve_name else None
+    private_key = _generate_private_key(key_size, key_type, ecc_curve)
+    return private_key.private_bytes(encoding=Encoding.PEM, format=PrivateFormat.PKCS8,
+                                     encryption_algorithm=NoEncryption())
+
+
+class KeyPool:
+    """Process-wide pool of pre-generated private keys.
+
+    The pool is filled explicitly with :py:meth:`fill` (e.g. by the ``fill_key_pool`` task) and keeps up to
+    :ref:`CA_KEY_POOL_SIZE <settings-ca-key-pool-size>` keys for every set of key parameters it was filled
+    with. Keys are generated in the background using a pool of worker processes, so slow key generation (e.g.
+    of large RSA keys) happens in parallel and before the key is needed. When only half of the keys are left,
+    new keys are generated. Keys that are not yet generated when the interpreter exits are discarded. Keys are
+    only ever stored in the memory of the current process. Instances are thread-safe. Keys that cannot be
+    generated are logged and discarded.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = {}
+        self._pending = {}
+        self._futures = set()
+        self._executor = None
+        self._pid = None
+
+    def _get_params(self, key_size, key_type, ecc_curve):
+        curve_name = type(ecc_curve).__name__ if key_type == 'ECC' else None
+        return key_size, key_type, curve_name
+
+    def _create_executor(self):
+        # Forking a process that already runs other threads (e.g. in uWSGI or Celery) is not safe, so worker
+        # processes are started from a new process instead. Python 3.6 and earlier always fork.
+        if sys.version_info < (3, 7):  # pragma: no cover
+            return ProcessPoolExecutor()
+
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('forkserver')
+        else:  # pragma: no cover - e.g. on Windows
+            context = multiprocessing.get_context('spawn')
+        return ProcessPoolExecutor(mp_context=context)
+
+    def _add(self, executor, params, future):
+        with self._lock:
+            self._pending[params] -= 1
+            self._futures.discard(future)
+        if future.cancelled():
+            return
+
+        try:
+            private_key = load_pem_private_key(future.result(), None, default_backend())
+        except Exception as e:
+            log.exception(e)
+
+            # A broken pool (e.g. a killed worker process) cannot be used again, fill() creates a new one
+            if isinstance(e, BrokenProcessPool):
+                with self._lock:
+                    if self._executor is executor:
+                        self._executor = None
+            return
+
+        with self._lock:
+            self._keys.setdefault(params, []).append(private_key)
+
+    def _shutdown(self):
+        # Called when the interpreter exits: Do not wait for keys that are not generated yet.
+        if os.getpid() != self._pid:  # forked processes inherit the hook (and possibly a locked lock)
+            return
+
+        with self._lock:
+            executor, self._executor = self._executor, None
+            futures = list(self._futures)
+
+        for future in futures:
+            future.cancel()
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def get(self, key_size, key_type, ecc_curve):
+        """Get a pre-generated private key, or ``None`` if there is no key with the given parameters.
+
+        If only half of the keys with the given parameters are left in the pool, new keys are generated in
+        the background.
+        """
+        if not ca_settings.CA_KEY_POOL_SIZE:
+            return None
+
+        params = self._get_params(key_size, key_type, ecc_curve)
+        with self._lock:
+            keys = self._keys.get(params)
+            if keys is None:  # the pool was never filled with these parameters
+                return None
+
+            private_key = keys.pop(0) if keys else None
+            refill = len(keys) + self._pending.get(params, 0) <= ca_settings.CA_KEY_POOL_SIZE // 2
+
+        if refill:
+            self.fill(key_size, key_type, ecc_curve)
+        return private_key
+
+    def fill(self, key_size, key_type, ecc_curve, count=None, wait=False):
+        """Generate private keys until there are `count` keys with the given parameters in the pool.
+
+        Parameters
+        ----------
+
+        key_size, key_type, ecc_curve
+            Parameters for the private key, see :py:func:`generate_private_key`.
+        count : int, optional
+            The number of keys in the pool, the default is :ref:`CA_KEY_POOL_SIZE
+            <settings-ca-key-pool-size>`.
+        wait : bool, optional
+            Wait until all keys are generated. By default, keys are generated in the background.
+        """
+        if count is None:
+            count = ca_settings.CA_KEY_POOL_SIZE
+
+        params = self._get_params(key_size, key_type, ecc_curve)
+        with self._lock:
+            keys = self._keys.setdefault(params, [])
+            missing = count - len(keys) - self._pending.get(params, 0)
+            if missing <= 0:
+                return
+
+            if self._executor is not None and self._pid != os.getpid():
+                # This process was forked from the process that created the pool, which cannot be used here
+                self._executor = None
+                self._futures = set()
+                self._pending = {}
+
+            if self._executor is None:
+                self._executor = self._create_executor()
+                self._pid = os.getpid()
+
+                # concurrent.futures waits for all pending work when the interpreter exits, so cancel it
+                # first. Python 3.9+ uses an internal hook that runs before functions registered by atexit.
+                getattr(threading, '_register_atexit', atexit.register)(self._shutdown)
+
+            executor = self._executor
+            futures = []
+            try:
+                for _i in range(missing):
+                    futures.append(executor.submit(_generate_private_key_pem, *params))
+            except BrokenProcessPool as e:
+                log.exception(e)
+                self._executor = None  # a new pool is created with the next call
+
+            self._pending[params] = self._pending.get(params, 0) + len(futures)
+            self._futures.update(futures)
+
+        for future in futures:
+            if wait:
+                self._add(executor, params, future)
+            else:
+                future.add_done_callback(functools.partial(self._add, executor, params))
+
+    def clear(self):
+        """Remove all keys from the pool."""
+
+        with self._lock:
+            self._keys = {}
+
+
+key_pool = KeyPool()
+
+
+def get_ocsp_response_cache_key(ca_serial, serial, scope='user'):
+    """Get the cache key for a pre-generated OCSP response.
+
+    `scope` is ``"user"`` for responses about end-entity certificates and ``"ca"`` for responses about
+    intermediate CAs.
+    """
+    return 'ocsp_%s_%s_%s' % (ca_serial, scope, serial)
 
 
 ca_storage = get_storage_class(ca_settings.CA_FILE_STORAGE)(**ca_settings.CA_FILE_STORAGE_KWARGS)
@@ -13,25 +13,33 @@
 
 import base64
 import binascii
+import hashlib
 import logging
 import os
+import time
 from datetime import datetime
 from datetime import timedelta
 
+from asn1crypto import crl as asn1_crl
+from asn1crypto import ocsp as asn1_ocsp
+from asn1crypto import pem
 from cryptography import x509
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.serialization import Encoding
-from cryptography.x509 import ExtensionNotFound
-from cryptography.x509 import OCSPNonce
 from cryptography.x509 import load_pem_x509_certificate
-from cryptography.x509 import ocsp
 
 from django.core.cache import cache
 from django.http import HttpResponse
+from django.http import HttpResponseNotFound
 from django.http import HttpResponseServerError
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.cache import patch_cache_control
 from django.utils.decorators import method_decorator
+from django.utils.http import http_date
+from django.utils.http import quote_etag
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic.base import View
 from django.views.generic.detail import SingleObjectMixin
@@ -39,21 +47,54 @@ from django.views.generic.detail import SingleObjectMixin
 from . import ca_settings
 from .models import Certificate
 from .models import CertificateAuthority
+from .models import CRLPublication
+from .ocsp import OCSPResponder
+from .ocsp import match_issuer
+from .ocsp import responder_cache
+from .registry import ca_registry
+from .status_index import get_status_index
 from .utils import SERIAL_RE
+from .utils import crl_cache
 from .utils import get_crl_cache_key
-from .utils import int_to_hex
+from .utils import get_crl_counter
+from .utils import get_file_version
+from .utils import get_ocsp_response_cache_key
 from .utils import parse_encoding
 from .utils import read_file
+from .utils import set_chunked_cache
 
 log = logging.getLogger(__name__)
 
 
+def add_cache_headers(request, response, this_update, next_update):
+    """Add HTTP caching headers for an OCSP response or CRL valid from `this_update` until `next_update`.
+
+    Headers are set as described in RFC 5019, section 6.2, with the SHA1 hash of the response as ETag. If the
+    request has matching ``If-None-Match`` or ``If-Modified-Since`` headers, a "304 Not Modified" response is
+    returned instead.
+    """
+    etag = quote_etag(hashlib.sha1(response.content).hexdigest())
+    last_modified = int(this_update.timestamp())
+    expires = int(next_update.timestamp())
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Expires'] = http_date(expires)
+    patch_cache_control(response, public=True, no_transform=True, must_revalidate=True,
+                        max_age=max(expires - int(time.time()), 0))
+    return get_conditional_response(request, etag=etag, last_modified=last_modified, response=response)
+
+
 class CertificateRevocationListView(View, SingleObjectMixin):
-    """Generic view that provides Certificate Revocation Lists (CRLs)."""
+    """Generic view that provides Certificate Revocation Lists (CRLs).
+
+    If the URL includes a ``partition`` parameter, the view serves the CRL for this partition (see
+    :ref:`crl-partitions`).
+    """
 
     slug_field = 'serial'
     slug_url_kwarg = 'serial'
-    queryset = CertificateAuthority.objects.all().prefetch_related('certificate_set')
+    queryset = CertificateAuthority.objects.all()
 
     password = None
     """Password used to load the private key of the certificate authority. If not set, the private key is
@@ -70,6 +111,14 @@ class CertificateRevocationListView(View, SingleObjectMixin):
     expires = 600
     """CRL expires in this many seconds."""
 
+    delta = False
+    """Set to ``True`` to serve delta CRLs that contain only certificates revoked since the last complete CRL
+    for the same scope was generated. If no complete CRL was generated yet, the view returns HTTP 404."""
+
+    freshest_crl = None
+    """List of URLs where delta CRLs can be retrieved. If set, complete CRLs include the Freshest CRL
+    extension."""
+
     digest = hashes.SHA512()
     """Digest used for generating the CRL."""
 
@@ -77,18 +126,121 @@ class CertificateRevocationListView(View, SingleObjectMixin):
     content_type = None
     """Value of the Content-Type header used in the response. For CRLs in PEM format, use ``text/plain``."""
 
-    def get(self, request, serial):
+    lock_timeout = 10
+    """Time in seconds after which the lock held by a request that generates a new CRL expires, e.g. if the
+    request was aborted.
+
+    Only one request at a time generates a new CRL. Other requests receive the previous CRL as long as it is
+    still valid or wait for the new CRL for at most this long. If no CRL is available after this time, they
+    return HTTP 503 with a ``Retry-After`` header. If the other request failed to generate a CRL, they
+    generate one themselves."""
+
+    def generate_crl(self, serial, cache_key, partition=None):
+        """Generate a new CRL and store it in the cache.
+
+        Returns ``None`` if a delta CRL is requested but no complete CRL was generated yet or if the CRL
+        partition does not exist.
+        """
+        ca = self.get_object()
+        if partition is not None and partition >= ca.get_crl_partitions(scope=self.scope):
+            return None
+        if self.delta and ca.get_base_crl(scope=self.scope, partition=partition) is None:
+            return None
+
+        crl = ca.get_crl(expires=self.expires, algorithm=self.digest, password=self.password,
+                         scope=self.scope, delta=self.delta, freshest_crl=self.freshest_crl,
+                         partition=partition)
+        crl = crl.public_bytes(parse_encoding(self.type))
+
+        # The CRL is regenerated when half of its lifetime is left, until then it is the stale CRL served
+        # to requests that arrive while the new CRL is generated.
+        set_chunked_cache({cache_key: crl}, self.expires // 2)
+        set_chunked_cache({'%s_stale' % cache_key: crl}, self.expires)
+        return crl
+
+    def get_published_crl(self, serial, cache_key, partition=None):
+        """Get the newest CRL stored by :py:meth:`~django_ca.models.CertificateAuthority.get_crl` and store it
+        in the cache.
+
+        Returns ``None`` if there is no stored CRL that is valid for at least half of ``expires`` or if stored
+        CRLs have different Issuing Distribution Point or Freshest CRL extensions.
+        """
+        now = timezone.now()
+        names = CRLPublication.get_name_fields(freshest_crl=None if self.delta else self.freshest_crl)
+        publications = CRLPublication.objects.select_related('ca').filter(
+            ca__serial=serial, scope=get_crl_counter(self.scope, partition), delta=self.delta,
+            algorithm=self.digest.name, next_update__gt=now + timedelta(seconds=self.expires / 2),
+            relative_name=names['relative_name'], freshest_crl=names['freshest_crl'],
+        ).order_by('-number')
+
+        # CRLs generated by this view use the CRL URLs of the CA in the Issuing Distribution Point extension
+        for publication in publications:
+            full_name = [x509.UniformResourceIdentifier(url)
+                         for url in publication.ca.get_crl_urls(partition=partition)]
+            if publication.full_name == CRLPublication.get_name_fields(full_name=full_name)['full_name']:
+                break
+        else:
+            return None
+
+        try:
+            crl = publication.read()
+        except Exception as e:
+            log.exception(e)
+            return None
+
+        if parse_encoding(self.type) != Encoding.DER:
+            crl = x509.load_der_x509_crl(crl, default_backend()).public_bytes(parse_encoding(self.type))
+
+        # Cache the CRL until half of ``expires`` is left (but at most half of ``expires``), so that newer
+        # CRLs are picked up.
+        remaining = (publication.next_update - now).total_seconds()
+        set_chunked_cache({cache_key: crl}, int(min(remaining - self.expires / 2, self.expires / 2)))
+        set_chunked_cache({'%s_stale' % cache_key: crl}, int(remaining))
+        return crl
+
+    def get(self, request, serial, partition=None):
         encoding = parse_encoding(request.GET.get('encoding', self.type))
-        cache_key = get_crl_cache_key(serial, algorithm=self.digest, encoding=encoding, scope=self.scope)
+        cache_key = get_crl_cache_key(serial, algorithm=self.digest, encoding=encoding, scope=self.scope,
+                                      delta=self.delta, partition=partition)
 
-        crl = cache.get(cache_key)
+        crl = crl_cache.get(cache_key)
         if crl is None:
-            ca = self.get_object()
-            encoding = parse_encoding(self.type)
-            crl = ca.get_crl(expires=self.expires, algorithm=self.digest, password=self.password,
-                             scope=self.scope)
-            crl = crl.public_bytes(encoding)
-            cache.set(cache_key, crl, self.expires)
+            crl = self.get_published_crl(serial, cache_key, partition=partition)
+
+        if crl is None:
+            lock_key = '%s_lock' % cache_key
+            failed_key = '%s_failed' % cache_key
+
+            # cache.add() is atomic, so only one request at a time generates a new CRL
+            if cache.add(lock_key, True, self.lock_timeout):
+                try:
+                    crl = self.generate_crl(serial, cache_key, partition=partition)
+                finally:
+                    if crl is None:  # requests waiting for this CRL should not wait any longer
+                        cache.set(failed_key, True, self.lock_timeout)
+                    cache.delete(lock_key)
+            else:
+                crl = crl_cache.get('%s_stale' % cache_key)
+
+                # wait for the other request if there is no CRL that is still valid
+                failed = False
+                for _i in range(int(self.lock_timeout * 10)):
+                    failed = cache.get(failed_key)
+                    if crl is not None or failed:
+                        break
+                    time.sleep(0.1)
+                    crl = crl_cache.get(cache_key)
+
+                if crl is None and failed:
+                    crl = self.generate_crl(serial, cache_key, partition=partition)
+                elif crl is None:
+                    # Generating large CRLs takes a long time, so do not generate it in every waiting request
+                    response = HttpResponse('CRL is being generated.', status=503, content_type='text/plain')
+                    response['Retry-After'] = int(self.lock_timeout)
+                    return response
+
+            if crl is None:
+                return HttpResponseNotFound('CRL not found.', content_type='text/plain')
 
         content_type = self.content_type
         if content_type is None:
@@ -100,7 +252,13 @@ class CertificateRevocationListView(View, SingleObjectMixin):
                 # DER/PEM are all known encoding types, so this shouldn't happen
                 return HttpResponseServerError()
 
-        return HttpResponse(crl, content_type=content_type)
+        response = HttpResponse(crl, content_type=content_type)
+
+        if pem.detect(crl):
+            crl = pem.unarmor(crl)[2]
+        tbs_cert_list = asn1_crl.CertificateList.load(crl)['tbs_cert_list']
+        return add_cache_headers(request, response, tbs_cert_list['this_update'].native,
+                                 tbs_cert_list['next_update'].native)
 
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -113,6 +271,10 @@ class OCSPBaseView(View):
 
     Note that providing the responder key or certificate using an absolute path is deprecated for the Django
     file storage API. Please see :ref:`update-file-storage` for more information.
+
+    The responder key and certificate are loaded only once per process. They are loaded again if the
+    modification time of the file they were loaded from changes, so a new key is used as soon as it is
+    written.
     """
 
     ca = None
@@ -147,11 +309,20 @@ class OCSPBaseView(View):
             return self.malformed_request()
 
         try:
-            return self.process_ocsp_request(data)
+            response = self.process_ocsp_request(data)
         except Exception as e:
             log.exception(e)
             return self.fail()
 
+        # Successful responses to GET requests may be cached by HTTP caches (see RFC 5019)
+        ocsp_response = asn1_ocsp.OCSPResponse.load(response.content)
+        if ocsp_response['response_status'].native != 'successful':
+            return response
+
+        single_response = ocsp_response.response_data['responses'][0]
+        return add_cache_headers(request, response, single_response['this_update'].native,
+                                 single_response['next_update'].native)
+
     def post(self, request):
         try:
             return self.process_ocsp_request(request.body)
@@ -181,113 +352,112 @@ class OCSPBaseView(View):
         return read_file(self.responder_cert)
 
     def get_ca(self):
-        return CertificateAuthority.objects.get_by_serial_or_cn(self.ca)
-
-    def get_cert(self, ca, serial):
-        if self.ca_ocsp is True:
-            return CertificateAuthority.objects.filter(parent=ca).get(serial=serial)
-        else:
-            return Certificate.objects.filter(ca=ca).get(serial=serial)
+        return ca_registry.get_by_serial_or_cn(self.ca).ca
+
+    def get_scope(self):
+        return 'ca' if self.ca_ocsp is True else 'user'
+
+    def get_certs(self, ca, serials, scope=None):
+        """Get a dictionary of certificates (or CAs, if ``ca_ocsp=True`` or ``scope="ca"``) issued by `ca`
+        with the given serials.
+
+        Statuses are read from the OCSP status index if :ref:`CA_OCSP_INDEX_DIR <settings-ca-ocsp-index-dir>`
+        is set. Any certificates not found there are loaded from the database using a single query.
+        """
+        if scope is None:
+            scope = self.get_scope()
+        certs = {}
+        if ca_settings.CA_OCSP_INDEX_DIR:
+            index = get_status_index(ca_settings.CA_OCSP_INDEX_DIR, ca.serial, scope=scope)
+            for serial in serials:
+                status = index.get(int(serial.replace(':', ''), 16))
+                if status is not None:
+                    certs[serial] = status
+
+        missing = [serial for serial in serials if serial not in certs]
+        if missing:
+            if scope == 'ca':
+                qs = CertificateAuthority.objects.filter(parent=ca)
+            else:
+                qs = Certificate.objects.filter(ca=ca)
+            certs.update({cert.serial: cert for cert in qs.filter(serial__in=missing)})
+        return certs
+
+    def get_cached_response(self, ca, serial, scope=None):
+        """Get a response pre-generated by :py:meth:`CertificateAuthority.cache_ocsp_responses
+        <django_ca.models.CertificateAuthority.cache_ocsp_responses>`, or ``None`` if there is none."""
+
+        if scope is None:
+            scope = self.get_scope()
+        cached = cache.get(get_ocsp_response_cache_key(ca.serial, serial, scope=scope))
+        if cached is None:
+            return None
+
+        responder_serial, next_update, response = cached
+        if next_update <= datetime.utcnow():
+            return None
+
+        # Responses signed by a different responder (e.g. before the key was renewed) are not used
+        try:
+            responder_cert = self.get_responder_cert()
+        except Exception:
+            return None  # the error is logged when the view tries to sign a new response
+        if responder_serial != responder_cert.serial_number:
+            return None
+        return response
 
     def http_response(self, data, status=200):
         return HttpResponse(data, status=status, content_type='application/ocsp-response')
 
 
-class OCSPView(OCSPBaseView):
+class OCSPView(OCSPResponder, OCSPBaseView):
     """View providing OCSP functionality.
 
-    Depending on the cryptography version used, this view might use either cryptography or oscrypto."""
-
-    def fail(self, status=ocsp.OCSPResponseStatus.INTERNAL_ERROR):
-        return self.http_response(
-            ocsp.OCSPResponseBuilder.build_unsuccessful(status).public_bytes(Encoding.DER)
-        )
+    Requests may contain multiple certificates, all of them are answered in a single signed response."""
 
-    def malformed_request(self):
-        return self.fail(ocsp.OCSPResponseStatus.MALFORMED_REQUEST)
+    log = log
 
     def get_responder_key(self):
-        key = self.get_responder_key_data()
-        return serialization.load_pem_private_key(key, None, default_backend())
+        def load():
+            key = self.get_responder_key_data()
+            return serialization.load_pem_private_key(key, None, default_backend())
+
+        return responder_cache.get(self.responder_key, get_file_version(self.responder_key), load)
 
     def get_responder_cert(self):
         # User configured a loaded certificate
         if isinstance(self.responder_cert, x509.Certificate):
             return self.responder_cert
 
-        responder_cert = self.get_responder_cert_data()
-        return load_pem_x509_certificate(responder_cert, default_backend())
+        def load():
+            responder_cert = self.get_responder_cert_data()
+            return load_pem_x509_certificate(responder_cert, default_backend())
 
-    def process_ocsp_request(self, data):
-        try:
-            ocsp_req = ocsp.load_der_ocsp_request(data)  # NOQA
-        except Exception as e:
-            log.exception(e)
-            return self.malformed_request()
+        if self.responder_cert.startswith('-----BEGIN CERTIFICATE-----\n') or \
+                SERIAL_RE.match(self.responder_cert):
+            version = 0  # full PEMs and certificates stored in the database never change
+        else:
+            version = get_file_version(self.responder_cert)
+
+        return responder_cache.get(self.responder_cert, version, load)
 
-        # Fail if there are any critical extensions that we do not understand
-        for ext in ocsp_req.extensions:
-            if ext.critical and not isinstance(ext.value, OCSPNonce):  # pragma: no cover
-                # It seems impossible to get cryptography to create such a request, so it's not tested
-                return self.malformed_request()
+    def get_issuer(self, cert_ids):
+        """Get the CA that issued the certificates identified by `cert_ids`.
 
-        # Get CA and certificate
+        Returns ``None`` if the CA cannot be found or if any of the certificates was issued by a different CA.
+        """
         try:
             ca = self.get_ca()
         except CertificateAuthority.DoesNotExist:
             log.error('%s: Certificate Authority could not be found.', self.ca)
-            return self.fail()
-
-        try:
-            cert = self.get_cert(ca, int_to_hex(ocsp_req.serial_number))
-        except Certificate.DoesNotExist:
-            log.warning('OCSP request for unknown cert received.')
-            return self.fail()
-        except CertificateAuthority.DoesNotExist:
-            log.warning('OCSP request for unknown CA received.')
-            return self.fail()
-
-        # get key/cert for OCSP responder
-        try:
-            responder_key = self.get_responder_key()
-            responder_cert = self.get_responder_cert()
-        except Exception:
-            log.error('Could not read responder key/cert.')
-            return self.fail()
-
-        # get the certificate status
-        if cert.revoked:
-            status = ocsp.OCSPCertStatus.REVOKED
-        else:
-            status = ocsp.OCSPCertStatus.GOOD
-
-        now = datetime.utcnow()
-        builder = ocsp.OCSPResponseBuilder()
-        expires = datetime.utcnow() + timedelta(seconds=self.expires)
-        builder = builder.add_response(
-            cert=cert.x509, issuer=ca.x509, algorithm=hashes.SHA1(),
-            cert_status=status,
-            this_update=now,
-            next_update=expires,
-            revocation_time=cert.get_revocation_time(),
-            revocation_reason=cert.get_revocation_reason()
-        ).responder_id(
-            ocsp.OCSPResponderEncoding.HASH, responder_cert
-        )
-
-        # Add the responder cert to the response, necessary because we (so far) always use delegate
-        # certificates
-        builder = builder.certificates([responder_cert])
-
-        # Add OCSP nonce if present
-        try:
-            nonce = ocsp_req.extensions.get_extension_for_class(OCSPNonce)
-            builder = builder.add_extension(nonce.value, critical=nonce.critical)
-        except ExtensionNotFound:
-            pass
+            return None
 
-        response = builder.sign(responder_key, hashes.SHA256())
-        return self.http_response(response.public_bytes(Encoding.DER))
+        # Only answer requests for certificates issued by this CA
+        issuer_hashes = ca_registry.get_entry(ca).issuer_hashes
+        if not all(match_issuer(cert_id, issuer_hashes) for cert_id in cert_ids):
+            log.warning('OCSP request for certificate issued by a different CA received.')
+            return None
+        return ca
 
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -297,21 +467,70 @@ class GenericOCSPView(OCSPView):
             return self.http_method_not_allowed(request, serial, **kwargs)
         elif request.method == 'POST' and 'data' in kwargs:
             return self.http_method_not_allowed(request, serial, **kwargs)
-        self.ca = CertificateAuthority.objects.get(serial=serial)
+        self.ca = ca_registry.get(serial).ca
+        self.responder_key = 'ocsp/%s.key' % self.ca.serial.replace(':', '')
+        self.responder_cert = 'ocsp/%s.pem' % self.ca.serial.replace(':', '')
         return super(GenericOCSPView, self).dispatch(request, **kwargs)
 
     def get_ca(self):
         return self.ca
 
-    def get_responder_key_data(self):
-        return read_file('ocsp/%s.key' % self.ca.serial.replace(':', ''))
 
-    def get_responder_cert_data(self):
-        return read_file('ocsp/%s.pem' % self.ca.serial.replace(':', ''))
+@method_decorator(csrf_exempt, name='dispatch')
+class UnifiedOCSPView(OCSPView):
+    """OCSP responder for all certificate authorities.
+
+    The CA is selected using the issuer name and key hashes in the request, so a single URL can be used for
+    any number of CAs. Like with :py:class:`GenericOCSPView`, responses are signed with the responder key and
+    certificate generated by :py:meth:`CertificateAuthority.generate_ocsp_key
+    <django_ca.models.CertificateAuthority.generate_ocsp_key>`. Requests may contain certificates and
+    intermediate CAs, but all of them have to be issued by the same CA.
+    """
+
+    def get_scope(self):
+        return None  # both end-entity certificates and intermediate CAs are answered
+
+    def get_issuer(self, cert_ids):
+        issuers = set()
+        for cert_id in cert_ids:
+            try:
+                issuers.add(ca_registry.get_by_issuer_hash(
+                    cert_id['hash_algorithm']['algorithm'].native, cert_id['issuer_name_hash'].native,
+                    cert_id['issuer_key_hash'].native))
+            except CertificateAuthority.DoesNotExist:
+                log.warning('OCSP request for certificate issued by an unknown CA received.')
+                return None
+
+        if len(issuers) > 1:
+            log.warning('OCSP request for certificates issued by different CAs received.')
+            return None
+
+        entry = issuers.pop()
+        self.responder_key = 'ocsp/%s.key' % entry.ca.serial.replace(':', '')
+        self.responder_cert = 'ocsp/%s.pem' % entry.ca.serial.replace(':', '')
+        return entry.ca
+
+    def get_certs(self, ca, serials, scope=None):
+        if scope is not None:
+            return super().get_certs(ca, serials, scope=scope)
+
+        certs = super().get_certs(ca, serials, scope='user')
+        missing = [serial for serial in serials if serial not in certs]
+        if missing:
+            certs.update(super().get_certs(ca, missing, scope='ca'))
+        return certs
+
+    def get_cached_response(self, ca, serial, scope=None):
+        if scope is not None:
+            return super().get_cached_response(ca, serial, scope=scope)
+
+        response = super().get_cached_response(ca, serial, scope='user')
+        if response is None:
+            response = super().get_cached_response(ca, serial, scope='ca')
+        return response
 
 
 class GenericCAIssuersView(View):
     def get(self, request, serial):
-        ca = CertificateAuthority.objects.get(serial=serial)
-        data = ca.x509.public_bytes(encoding=Encoding.DER)
+        data = ca_registry.get(serial).der
         return HttpResponse(data, content_type='application/pkix-cert')
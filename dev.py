@@ -73,6 +73,33 @@ collectstatic_parser = commands.add_parser('collectstatic', help="Collect and re
 collectstatic_parser.add_argument('--install-dir', metavar='PATH',
                                   help="Assume modules were installed to PATH.")
 
+bench_parser = commands.add_parser('bench', help="Benchmark OCSP and CRL views.")
+bench_parser.add_argument('--certs', type=int, default=1000, metavar='N',
+                          help="Number of certificates issued by every CA (default: %(default)s).")
+bench_parser.add_argument('--revoked', type=int, default=10, metavar='PERCENT',
+                          help="Percentage of revoked certificates (default: %(default)s%%).")
+bench_parser.add_argument('--requests', type=int, default=500, metavar='N',
+                          help="Number of requests for every view (default: %(default)s).")
+bench_parser.add_argument('--key-type', dest='key_types', action='append', choices=['RSA', 'ECC'],
+                          help="Key type of the CA, may be given multiple times (default: RSA and ECC).")
+bench_parser.add_argument('--cache', dest='caches', action='append', choices=['locmem', 'dummy'],
+                          help="Cache backend, may be given multiple times (default: locmem and dummy).")
+bench_parser.add_argument('-o', '--output', metavar='FILE', help="Also write results as JSON to FILE.")
+
+bench_crl_parser = commands.add_parser('bench-crl', help="Benchmark generating large CRLs.")
+bench_crl_parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000], metavar='N',
+                              help="Numbers of revoked certificates (default: %(default)s).")
+bench_crl_parser.add_argument('-o', '--output', metavar='FILE', help="Also write results as JSON to FILE.")
+
+bench_profile_parser = commands.add_parser('bench-profile',
+                                           help="Benchmark creating certificates from profiles.")
+bench_profile_parser.add_argument('--certs', type=int, default=1000, metavar='N',
+                                  help="Number of certificates to create (default: %(default)s).")
+bench_profile_parser.add_argument('--profile', default='webserver',
+                                  help="Profile to use (default: %(default)s).")
+bench_profile_parser.add_argument('-o', '--output', metavar='FILE',
+                                  help="Also write results as JSON to FILE.")
+
 commands.add_parser('clean', help="Remove generated files.")
 args = parser.parse_args()
 
@@ -149,6 +176,48 @@ def test(suites):
     call_command('test', *suites)
 
 
+def setup_bench(stack):
+    """Set up an in-memory database and a temporary CA_DIR for benchmarks."""
+
+    import tempfile
+    from unittest.mock import patch
+
+    setup_django()
+
+    from django.db import connection
+    from django.test.utils import override_settings
+    from django.test.utils import setup_test_environment
+
+    from django_ca.utils import ca_storage
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+
+    ca_dir = tempfile.mkdtemp()
+    stack.callback(shutil.rmtree, ca_dir)
+    stack.enter_context(override_settings(CA_DIR=ca_dir))
+    stack.enter_context(patch.object(ca_storage, 'location', ca_dir))
+    stack.enter_context(patch.object(ca_storage, '_location', ca_dir))
+
+
+def bench_info(**options):
+    """Get information about the environment a benchmark was run in, used in JSON output."""
+
+    import platform
+    from datetime import datetime
+
+    import django_ca
+
+    return {
+        'django_ca': django_ca.__version__,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'cryptography': cryptography.__version__,
+        'date': datetime.utcnow().isoformat(),
+        'options': options,
+    }
+
+
 def exclude_versions(cov, sw, this_version, version, version_str):
     if version == this_version:
         cov.exclude(r'pragma: only %s>%s' % (sw, version_str))
@@ -1059,6 +1128,239 @@ elif args.command == 'collectstatic':
     for location in locations:
         print('rm -r "%s"' % location)
         shutil.rmtree(location)
+elif args.command == 'bench':
+    import contextlib
+    import math
+    import random
+    import time
+    from base64 import b64encode
+
+    stack = contextlib.ExitStack()
+    setup_bench(stack)
+
+    import asn1crypto.ocsp
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.x509.oid import NameOID
+
+    from django.test import Client
+    from django.test.utils import override_settings
+    from django.urls import reverse
+
+    from django_ca.models import Certificate
+    from django_ca.models import CertificateAuthority
+    from django_ca.ocsp import get_cert_id
+    from django_ca.subject import Subject
+
+    key_types = args.key_types or ['RSA', 'ECC']
+    caches = args.caches or ['locmem', 'dummy']
+    cache_backends = {
+        'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+        'dummy': 'django.core.cache.backends.dummy.DummyCache',
+    }
+
+    def percentile(values, percent):  # values must be sorted
+        return values[max(int(math.ceil(len(values) * percent / 100)) - 1, 0)]
+
+    def measure(client, method, requests):
+        """Send all requests (tuples of url and data) and return throughput and latencies."""
+
+        getattr(client, method)(*requests[0])  # warm up (e.g. load responder keys)
+        latencies = []
+        start = time.perf_counter()
+        for request in requests:
+            request_start = time.perf_counter()
+            response = getattr(client, method)(*request)
+            latencies.append(time.perf_counter() - request_start)
+            if response.status_code != 200:
+                abort('%s %s: HTTP status %s' % (method.upper(), request[0], response.status_code))
+        total = time.perf_counter() - start
+
+        latencies.sort()
+        return {
+            'requests': len(requests),
+            'throughput': len(requests) / total,
+            'p50': percentile(latencies, 50) * 1000,
+            'p95': percentile(latencies, 95) * 1000,
+            'p99': percentile(latencies, 99) * 1000,
+        }
+
+    def ocsp_request(ca, cert, nonce=False):
+        request = {'tbs_request': {'request_list': [{'req_cert': get_cert_id(ca, cert.x509.serial_number)}]}}
+        if nonce:
+            nonce_ext = {'extn_id': 'nonce', 'extn_value': os.urandom(16)}
+            request['tbs_request']['request_extensions'] = [nonce_ext]
+        return asn1crypto.ocsp.OCSPRequest(request).dump()
+
+    results = []
+
+    with stack:
+        for key_type in key_types:
+            print('Creating %s CA with %s certificates...' % (key_type, args.certs), end='', flush=True)
+            ca = CertificateAuthority.objects.init(
+                name='bench-%s' % key_type.lower(), key_type=key_type,
+                subject=Subject('/CN=bench-%s.example.com' % key_type.lower()))
+            ca.generate_ocsp_key(key_type=key_type)
+
+            if key_type == 'RSA':
+                private_key = rsa.generate_private_key(65537, 2048, default_backend())
+            else:
+                private_key = ec.generate_private_key(ec.SECP256R1(), default_backend())
+            csr = x509.CertificateSigningRequestBuilder().subject_name(x509.Name([
+                x509.NameAttribute(NameOID.COMMON_NAME, 'bench.example.com'),
+            ])).sign(private_key, hashes.SHA256(), default_backend())
+
+            certs = [Certificate.objects.create_cert(ca, csr, subject=Subject('/CN=%s.example.com' % i))
+                     for i in range(args.certs)]
+            for cert in certs[:int(args.certs * args.revoked / 100)]:
+                cert.revoke()
+            ok()
+
+            sample = [random.choice(certs) for i in range(args.requests)]
+            post_url = reverse('django_ca:ocsp-cert-post', kwargs={'serial': ca.serial})
+            crl_url = reverse('django_ca:crl', kwargs={'serial': ca.serial})
+
+            for cache_name in caches:
+                with override_settings(CACHES={'default': {'BACKEND': cache_backends[cache_name]}}):
+                    # Requests without a nonce may use pre-generated responses (if the cache stores them)
+                    ca.cache_ocsp_responses(expires=3600)
+
+                    client = Client()
+                    get_requests = [(reverse('django_ca:ocsp-cert-get', kwargs={
+                        'serial': ca.serial,
+                        'data': b64encode(ocsp_request(ca, cert)).decode('utf-8'),
+                    }), ) for cert in sample]
+                    post_requests = [
+                        (post_url, ocsp_request(ca, cert, nonce=True), 'application/ocsp-request')
+                        for cert in sample
+                    ]
+                    crl_requests = [(crl_url, ) for cert in sample]
+
+                    for view, method, requests in [('ocsp-get', 'get', get_requests),
+                                                   ('ocsp-post-nonce', 'post', post_requests),
+                                                   ('crl', 'get', crl_requests)]:
+                        result = measure(client, method, requests)
+                        result.update({'key_type': key_type, 'cache': cache_name, 'view': view})
+                        results.append(result)
+                        print('%-4s %-7s %-16s %9.1f req/s   p50: %7.2fms   p95: %7.2fms   p99: %7.2fms' % (
+                            key_type, cache_name, view, result['throughput'], result['p50'], result['p95'],
+                            result['p99']))
+
+    if args.output:
+        data = bench_info(certs=args.certs, revoked=args.revoked, requests=args.requests)
+        data['results'] = results
+        with open(args.output, 'w') as stream:
+            json.dump(data, stream, indent=4)
+
+elif args.command == 'bench-crl':
+    import contextlib
+    import time
+    from datetime import timedelta
+
+    stack = contextlib.ExitStack()
+    setup_bench(stack)
+
+    from cryptography.hazmat.primitives.serialization import Encoding
+
+    from django.utils import timezone
+
+    from django_ca.models import Certificate
+    from django_ca.models import CertificateAuthority
+    from django_ca.subject import Subject
+
+    results = []
+    with stack:
+        ca = CertificateAuthority.objects.init(name='bench', subject=Subject('/CN=bench.example.com'))
+        now = timezone.now()
+        count = 0
+
+        for size in sorted(args.sizes):
+            print('Creating %s revoked certificates...' % size, end='', flush=True)
+            for start in range(count + 1, size + 1, 10000):
+                serials = range(start, min(start + 10000, size + 1))
+                Certificate.objects.bulk_create([
+                    Certificate(ca=ca, serial='%X' % serial, cn='%s.example.com' % serial, pub='',
+                                valid_from=now, expires=now + timedelta(days=365), revoked=True,
+                                revoked_date=now, revoked_reason='key_compromise')
+                    for serial in serials])
+            count = size
+            ok()
+
+            start = time.perf_counter()
+            crl = ca.get_crl(scope='user').public_bytes(Encoding.DER)
+            duration = time.perf_counter() - start
+
+            results.append({'revoked': size, 'seconds': duration, 'crl_size': len(crl)})
+            print('%8d revoked certificates: %8.2fs (%5.1fµs per entry, %d bytes)' % (
+                size, duration, duration / size * 1000000, len(crl)))
+
+    if args.output:
+        data = bench_info(sizes=args.sizes)
+        data['results'] = results
+        with open(args.output, 'w') as stream:
+            json.dump(data, stream, indent=4)
+
+elif args.command == 'bench-profile':
+    import contextlib
+    import time
+    from unittest.mock import patch
+
+    stack = contextlib.ExitStack()
+    setup_bench(stack)
+
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    from django_ca import ca_settings
+    from django_ca.models import CertificateAuthority
+    from django_ca.profiles import Profile
+    from django_ca.subject import Subject
+
+    results = []
+    with stack:
+        ca = CertificateAuthority.objects.init(
+            name='bench', key_type='ECC', subject=Subject('/CN=bench.example.com'),
+            crl_url='http://crl.example.com', ocsp_url='http://ocsp.example.com',
+            issuer_url='http://issuer.example.com', issuer_alt_name='https://example.com')
+        private_key = ec.generate_private_key(ec.SECP256R1(), default_backend())
+        csr = x509.CertificateSigningRequestBuilder().subject_name(x509.Name([
+            x509.NameAttribute(NameOID.COMMON_NAME, 'bench.example.com'),
+        ])).sign(private_key, hashes.SHA256(), default_backend())
+        ca.key(None)  # load the private key before measuring
+
+        def create_certs(get_profile):
+            subjects = [Subject('/CN=%s.example.com' % i) for i in range(args.certs)]
+            start = time.perf_counter()
+            for cert_subject in subjects:
+                get_profile().create_cert(ca, csr, subject=cert_subject)
+            return (time.perf_counter() - start) / args.certs
+
+        def fresh_profile():
+            return Profile(args.profile, **ca_settings.CA_PROFILES[args.profile])
+
+        cached = fresh_profile()
+        cached.create_cert(ca, csr, subject=Subject('/CN=warmup.example.com'))  # compile the template
+
+        # Signing dominates the time to create a certificate, so measure once with and once without it
+        for sign in [True, False]:
+            with contextlib.ExitStack() as sign_stack:
+                if sign is False:
+                    sign_stack.enter_context(patch.object(x509.CertificateBuilder, 'sign'))
+
+                for mode, get_profile in [('uncompiled', fresh_profile), ('compiled', lambda: cached)]:
+                    duration = create_certs(get_profile)
+                    results.append({'mode': mode, 'sign': sign, 'seconds_per_cert': duration})
+                    print('%-10s %-12s %8.1fµs per certificate' % (
+                        mode, 'signed' if sign else 'not signed', duration * 1000000))
+
+    if args.output:
+        data = bench_info(certs=args.certs, profile=args.profile)
+        data['results'] = results
+        with open(args.output, 'w') as stream:
+            json.dump(data, stream, indent=4)
+
 elif args.command == 'clean':
     base = os.path.dirname(os.path.abspath(__file__))
 